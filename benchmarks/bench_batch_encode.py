@@ -0,0 +1,108 @@
+import os
+import sys
+import tempfile
+from array import array
+from random import Random
+from time import perf_counter
+
+import png
+
+sys.path.append(".")
+
+from vpypng import PNGBatchEncoder
+
+COUNT = 300
+DISTINCT_IMAGES = 16
+REPEATS = 3
+
+# (name, width, height, color type, channels)
+IMAGE_KINDS = [
+    ("64x64 RGBA icon", 64, 64, 6, 4),
+    ("256x256 RGB tile", 256, 256, 2, 3),
+]
+
+
+def make_images(width, height, color_type, channels):
+    # Flat areas with a little noise, like icons and map tiles. A few distinct images
+    # are repeated, generating every one of them would take longer than encoding.
+    generator = Random(1)
+    distinct = []
+
+    for _ in range(DISTINCT_IMAGES):
+        base = generator.randrange(256)
+        pixels = array(
+            "B",
+            [
+                (base + (x // 8) * 16 + generator.randrange(4)) & 0xFF
+                for y in range(height)
+                for x in range(width * channels)
+            ],
+        )
+        distinct.append(
+            {
+                "width": width,
+                "height": height,
+                "bit_depth": 8,
+                "color_type": color_type,
+                "pixels": pixels,
+            }
+        )
+
+    return [distinct[number % DISTINCT_IMAGES] for number in range(COUNT)]
+
+
+def write_pypng(images, directory):
+    for number, image in enumerate(images):
+        with open(os.path.join(directory, "{}.png".format(number)), "wb") as pngfile:
+            png.Writer(
+                image["width"],
+                image["height"],
+                greyscale=False,
+                alpha=image["color_type"] == 6,
+            ).write_array(pngfile, image["pixels"])
+
+
+def write_batch(images, directory):
+    PNGBatchEncoder().write_batch(
+        (os.path.join(directory, "{}.png".format(number)), image)
+        for number, image in enumerate(images)
+    )
+
+
+def encode_batch(images, directory):
+    for _ in PNGBatchEncoder().encode_batch(images):
+        pass
+
+
+def images_per_second(function, images):
+    times = []
+
+    for _ in range(REPEATS):
+        with tempfile.TemporaryDirectory() as directory:
+            start = perf_counter()
+            function(images, directory)
+            times.append(perf_counter() - start)
+
+    return len(images) / min(times)
+
+
+def main():
+    print("{:<20} {:<30} {:>12}".format("images", "encoder", "images/s"))
+
+    for name, width, height, color_type, channels in IMAGE_KINDS:
+        images = make_images(width, height, color_type, channels)
+
+        for encoder, function in [
+            ("pypng, one file each", write_pypng),
+            ("PNGBatchEncoder.write_batch", write_batch),
+            ("PNGBatchEncoder.encode_batch", encode_batch),
+        ]:
+            print(
+                "{:<20} {:<30} {:>12.0f}".format(
+                    name, encoder, images_per_second(function, images)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import glob
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+
+sys.path.append(".")
+
+from vpypng import PNGDecoder
+
+INSTANCES = 10000
+
+
+def bytes_per_instance(image_bytes, metadata_only):
+    # Decoder debug output is not part of what we want to measure
+    with redirect_stdout(StringIO()):
+        tracemalloc.start()
+        images = [
+            PNGDecoder.decode(BytesIO(image_bytes), metadata_only=metadata_only)
+            for _ in range(INSTANCES)
+        ]
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    del images
+    return allocated / INSTANCES
+
+
+def main():
+    print("{:<45} {:>12} {:>12}".format("image", "PNGImage", "PNGImageInfo"))
+
+    for image_path in sorted(glob.glob("./tests/testimages/good_*.png")):
+        with open(image_path, "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        print(
+            "{:<45} {:>12.0f} {:>12.0f}".format(
+                image_path.split("/")[-1],
+                bytes_per_instance(image_bytes, metadata_only=False),
+                bytes_per_instance(image_bytes, metadata_only=True),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
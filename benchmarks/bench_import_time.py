@@ -0,0 +1,80 @@
+import json
+import subprocess
+import sys
+
+sys.path.append(".")
+
+REPEATS = 7
+
+# (statement, limit in milliseconds) for the cumulative import time reported by
+# python -X importtime. The limits are loose on purpose, they catch a heavy module
+# being imported eagerly again rather than small changes.
+STATEMENTS = [
+    ("import vpypng", 15),
+    ("from vpypng import PNGDecodeException", 15),
+    ("from vpypng import PNGDecoder", 80),
+    ("import vpypng.cli", 150),
+]
+
+
+def import_time_ms(statement):
+    # Best of several fresh interpreters, each one reports every module it imports
+    times = []
+
+    for _ in range(REPEATS):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        total = 0
+
+        for line in result.stderr.splitlines():
+            fields = line.split("|")
+
+            # Top level imports have no indentation before the module name
+            if len(fields) == 3 and fields[2].startswith(" vpypng"):
+                if not fields[2].startswith("  "):
+                    total += int(fields[1])
+
+        times.append(total / 1000)
+
+    return min(times)
+
+
+def loaded_modules(statement):
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            statement + "; import json, sys; print(json.dumps(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    failed = False
+    print("{:<45} {:>10} {:>10}".format("statement", "ms", "limit"))
+
+    for statement, limit in STATEMENTS:
+        milliseconds = import_time_ms(statement)
+        failed = failed or milliseconds > limit
+        print("{:<45} {:>10.2f} {:>10}".format(statement, milliseconds, limit))
+
+    modules = [
+        module
+        for module in loaded_modules("import vpypng")
+        if module.startswith("vpypng")
+    ]
+    print("modules loaded by import vpypng: {}".format(", ".join(modules)))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import os
+import sys
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from random import Random
+from time import perf_counter
+from zlib import crc32
+
+sys.path.append(".")
+
+from vpypng import PNGDecoder
+from vpypng.restarts import BlockInflater, encode_image_data, restart_chunk_data
+
+WIDTH = 1024
+HEIGHT = 1024
+CHANNELS = 3
+RESTART_ROWS = 64
+REPEATS = 3
+IDAT_SIZE = 65536
+
+
+def make_chunk(chunk_type, chunk_data):
+    return (
+        len(chunk_data).to_bytes(4, "big")
+        + chunk_type
+        + chunk_data
+        + crc32(chunk_type + chunk_data).to_bytes(4, "big")
+    )
+
+
+def make_image():
+    # A noisy gradient. encode_image_data picks a real filter for every row, so
+    # decoding spends its time unfiltering them like it would on a photo.
+    generator = Random(1)
+    rows = [
+        bytes(
+            (x // CHANNELS + y + generator.randrange(8)) & 0xFF
+            for x in range(WIDTH * CHANNELS)
+        )
+        for y in range(HEIGHT)
+    ]
+    stream, restart_points = encode_image_data(rows, CHANNELS, RESTART_ROWS)
+    header = make_chunk(
+        b"IHDR",
+        WIDTH.to_bytes(4, "big") + HEIGHT.to_bytes(4, "big") + bytes([8, 2, 0, 0, 0]),
+    )
+    image_data = make_chunk(b"IDAT", stream) + make_chunk(b"IEND", b"")
+    signature = b"\x89PNG\r\n\x1a\n"
+
+    sequential = signature + header + image_data
+    with_restarts = (
+        signature
+        + header
+        + make_chunk(b"vpRS", restart_chunk_data(restart_points))
+        + image_data
+    )
+    return sequential, with_restarts, stream, restart_points
+
+
+def decode(image_bytes):
+    with redirect_stdout(StringIO()):
+        PNGDecoder.decode(BytesIO(image_bytes))
+
+
+def inflate_blocks(stream, restart_points, workers):
+    # The stream arrives in IDAT sized pieces, as it does in the decoder
+    inflater = BlockInflater(
+        restart_points, HEIGHT, WIDTH * CHANNELS, CHANNELS, workers
+    )
+
+    for start in range(0, len(stream), IDAT_SIZE):
+        for _ in inflater.decode(stream[start : start + IDAT_SIZE]):
+            pass
+
+    for _ in inflater.flush():
+        pass
+
+
+def best_time(function):
+    times = []
+
+    for _ in range(REPEATS):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    sequential, with_restarts, stream, restart_points = make_image()
+    print(
+        "{}x{} RGB, filtered rows, {} blocks, {} cores".format(
+            WIDTH, HEIGHT, len(restart_points) + 1, os.cpu_count()
+        )
+    )
+
+    for name, function in [
+        ("decoder, sequential", lambda: decode(sequential)),
+        ("decoder, restart points", lambda: decode(with_restarts)),
+    ]:
+        print("{:<30} {:>8.3f} s".format(name, best_time(function)))
+
+    for workers in [1, 2, 4, 8]:
+        print(
+            "{:<30} {:>8.3f} s".format(
+                "BlockInflater, {} threads".format(workers),
+                best_time(lambda: inflate_blocks(stream, restart_points, workers)),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
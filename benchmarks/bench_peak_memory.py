@@ -0,0 +1,272 @@
+import resource
+import sys
+
+
+def peak_rss():
+    # On Linux ru_maxrss carries the parent's peak over fork and exec, which hid every
+    # mode below the benchmark's own peak. VmHWM only covers this process image.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Taken before anything else is imported, so the RSS peaks include the imports
+STARTUP_RSS = peak_rss()
+
+import json
+import os
+import subprocess
+import tempfile
+import tracemalloc
+import zlib
+from contextlib import redirect_stdout
+from io import StringIO
+from random import Random
+from struct import pack
+
+import png
+
+sys.path.append(".")
+
+from vpypng import PNGChunkIndex, PNGDecoder, PNGVerifier
+from vpypng.PNGRowDecoder import PNGRowDecoder
+from vpypng.restarts import restart_chunk_data
+
+WIDTH = 4096
+HEIGHT = 2048
+# The vpRS copy of the image, next to it, and the rows between its restart points
+RESTART_IMAGE = "restarts.png"
+RESTART_ROWS = 256
+MIB = 1 << 20
+
+# mode: (k, constant in MiB) for the limit peak <= k * output size + constant. Traced
+# memory is what Python allocates. A full decode only holds the pixels and one IDAT
+# chunk at a time.
+TRACED_LIMITS = {
+    "full decode": (1.2, 8),
+    # Also holds the blocks in flight, see in_flight_bytes
+    "restart points decode": (1.2, 8),
+    "row iteration": (4, 4),
+    "probe": (0, 1),
+    "metadata scan": (0, 1),
+    "verify": (0, 4),
+}
+# RSS also counts the interpreter's and vpypng's imports, measured on their own in an
+# "imports" run, and memory the allocator holds on to beyond what is traced. The RSS
+# limit is the traced limit plus both.
+RSS_ALLOCATOR_SLACK_MIB = 4
+
+
+def make_rows(width, height):
+    # Mostly noise, so the image data is about as large as the pixels and buffering
+    # all of it shows up in the peaks
+    generator = Random(1)
+    row_bytes = 3 * width
+
+    for y in range(height):
+        yield generator.getrandbits(8 * row_bytes).to_bytes(row_bytes, "little")
+
+
+def make_image(path):
+    with open(path, "wb") as pngfile:
+        png.Writer(WIDTH, HEIGHT, greyscale=False).write(
+            pngfile, make_rows(WIDTH, HEIGHT)
+        )
+
+
+def make_restart_image(path):
+    # The same pixels with unfiltered rows and a full flush every RESTART_ROWS rows,
+    # which is all the vpRS chunk needs
+    compressor = zlib.compressobj(6)
+    stream = bytearray()
+    restart_points = []
+
+    for y, row in enumerate(make_rows(WIDTH, HEIGHT)):
+        if y % RESTART_ROWS == 0 and y > 0:
+            stream += compressor.flush(zlib.Z_FULL_FLUSH)
+            restart_points.append((len(stream), y))
+        stream += compressor.compress(b"\x00" + row)
+
+    stream += compressor.flush()
+
+    with open(path, "wb") as pngfile:
+        pngfile.write(b"\x89PNG\r\n\x1a\n")
+        pngfile.write(
+            make_chunk(b"IHDR", pack(">IIBBBBB", WIDTH, HEIGHT, 8, 2, 0, 0, 0))
+        )
+        pngfile.write(make_chunk(b"vpRS", restart_chunk_data(restart_points)))
+        for start in range(0, len(stream), 1 << 16):
+            pngfile.write(make_chunk(b"IDAT", stream[start : start + (1 << 16)]))
+        pngfile.write(make_chunk(b"IEND", b""))
+
+
+def make_chunk(chunk_type, chunk_data):
+    return (
+        pack(">I", len(chunk_data))
+        + chunk_type
+        + chunk_data
+        + pack(">I", zlib.crc32(chunk_type + chunk_data))
+    )
+
+
+def in_flight_bytes(mode):
+    # Up to two blocks per worker are inflating at once, each held both compressed
+    # and inflated; noise barely compresses
+    if mode != "restart points decode":
+        return 0
+
+    workers = min(HEIGHT // RESTART_ROWS, os.cpu_count() or 1)
+    return 2 * workers * 2 * RESTART_ROWS * (3 * WIDTH + 1)
+
+
+# Each mode returns the size of what it produces, which the limits scale with
+def full_decode(path):
+    with open(path, "rb") as pngfile:
+        image = PNGDecoder.decode(pngfile)
+
+    return image["pixels"].nbytes
+
+
+def row_iteration(path):
+    index = PNGChunkIndex.build(path)
+    ihdr = index.ihdr
+    row_decoder = PNGRowDecoder(
+        ihdr["width"], ihdr["height"], ihdr["bit_depth"], ihdr["color_type"]
+    )
+
+    with open(path, "rb") as pngfile:
+        for chunk_type, offset, length, _ in index.chunks:
+            if chunk_type == b"IDAT":
+                pngfile.seek(offset + 8)
+                for _ in row_decoder.decode(pngfile.read(length)):
+                    pass
+
+    for _ in row_decoder.flush():
+        pass
+
+    return row_decoder.row_bytes
+
+
+def restart_points_decode(path):
+    return full_decode(os.path.join(os.path.dirname(path), RESTART_IMAGE))
+
+
+def probe(path):
+    PNGChunkIndex.build(path)
+    return 0
+
+
+def metadata_scan(path):
+    with open(path, "rb") as pngfile:
+        PNGDecoder.decode(pngfile, metadata_only=True)
+
+    return 0
+
+
+def verify(path):
+    if not PNGVerifier.verify(path)["ok"]:
+        raise AssertionError("Benchmark image did not verify")
+
+    return 0
+
+
+def imports(path):
+    return 0
+
+
+MODES = {
+    "full decode": full_decode,
+    "restart points decode": restart_points_decode,
+    "row iteration": row_iteration,
+    "probe": probe,
+    "metadata scan": metadata_scan,
+    "verify": verify,
+    "imports": imports,
+}
+
+
+def measure(mode, path, traced):
+    # Runs in a fresh process, peak RSS can't be reset within one
+    function = MODES[mode]
+
+    with redirect_stdout(StringIO()):
+        if traced:
+            tracemalloc.start()
+            output_size = function(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            output_size = function(path)
+            peak = peak_rss() - STARTUP_RSS
+
+    return {"output_size": output_size, "peak": peak}
+
+
+def measure_in_subprocess(mode, path, traced):
+    result = subprocess.run(
+        [sys.executable, __file__, "--measure", mode, path, str(int(traced))],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    failed = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.png")
+        make_image(path)
+        make_restart_image(os.path.join(directory, RESTART_IMAGE))
+        print(
+            "{}x{} RGB, {:.1f} MiB file, sizes in MiB".format(
+                WIDTH, HEIGHT, os.path.getsize(path) / MIB
+            )
+        )
+        imports_rss = measure_in_subprocess("imports", path, False)["peak"]
+        print("imports RSS {:.1f} MiB".format(imports_rss / MIB))
+        print(
+            "{:<22} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+                "mode", "output", "traced", "limit", "RSS", "limit"
+            )
+        )
+
+        for mode, (k, constant) in TRACED_LIMITS.items():
+            traced = measure_in_subprocess(mode, path, True)
+            rss = measure_in_subprocess(mode, path, False)
+            output_size = traced["output_size"]
+            limit = k * output_size + constant * MIB + in_flight_bytes(mode)
+            rss_limit = limit + imports_rss + RSS_ALLOCATOR_SLACK_MIB * MIB
+            mode_failed = traced["peak"] > limit or rss["peak"] > rss_limit
+            failed = failed or mode_failed
+
+            print(
+                "{:<22} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}{}".format(
+                    mode,
+                    output_size / MIB,
+                    traced["peak"] / MIB,
+                    limit / MIB,
+                    rss["peak"] / MIB,
+                    rss_limit / MIB,
+                    "  FAILED" if mode_failed else "",
+                )
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        mode, path, traced = sys.argv[2:5]
+        print(json.dumps(measure(mode, path, traced == "1")))
+    else:
+        sys.exit(main())
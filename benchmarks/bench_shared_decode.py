@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from time import perf_counter
+
+import png
+
+sys.path.append(".")
+
+from vpypng import PNGDecoder, PNGSharedPixels
+
+WIDTH = 2048
+HEIGHT = 2048
+COUNT = 8
+JOBS = 4
+
+
+def make_image(path):
+    # Noisy rows, so decoding has real work to do
+    generator = Random(1)
+    rows = (
+        generator.getrandbits(8 * 3 * WIDTH).to_bytes(3 * WIDTH, "little")
+        for _ in range(HEIGHT)
+    )
+
+    with open(path, "wb") as pngfile:
+        png.Writer(WIDTH, HEIGHT, greyscale=False).write(pngfile, rows)
+
+
+def peak_rss():
+    # Peak RSS of this process alone, VmHWM isn't inherited over fork and exec
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+    return 0
+
+
+def decode_pixels(path):
+    with open(path, "rb") as pngfile:
+        return PNGDecoder.decode(pngfile)["pixels"].tobytes()
+
+
+def pickled(paths):
+    # Every result is pickled in the worker and unpickled here
+    with ProcessPoolExecutor(max_workers=JOBS) as executor:
+        return sum(len(pixels) for pixels in executor.map(decode_pixels, paths))
+
+
+def shared(paths):
+    total = 0
+
+    for handle in PNGSharedPixels.decode_files(paths, JOBS):
+        with handle:
+            total += handle.pixels.nbytes
+
+    return total
+
+
+PATHS = {"pickled pixels": pickled, "shared memory": shared}
+
+
+def measure(name, path):
+    # Runs in a fresh process, so each path gets its own peak RSS. Standard output is
+    # pointed at /dev/null at the descriptor level, which the workers inherit, and
+    # the result goes to the original descriptor.
+    result_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    start = perf_counter()
+    PATHS[name]([path] * COUNT)
+    seconds = perf_counter() - start
+    sys.stdout.flush()
+
+    os.write(
+        result_fd,
+        json.dumps({"seconds": seconds, "peak_rss": peak_rss()}).encode("ascii"),
+    )
+
+
+def measure_in_subprocess(name, path):
+    result = subprocess.run(
+        [sys.executable, __file__, "--measure", name, path],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.png")
+        make_image(path)
+        print(
+            "{} decodes of {}x{} RGB on {} processes".format(COUNT, WIDTH, HEIGHT, JOBS)
+        )
+        print("{:<20} {:>10} {:>16}".format("path", "seconds", "parent peak MiB"))
+
+        for name in PATHS:
+            result = measure_in_subprocess(name, path)
+            print(
+                "{:<20} {:>10.3f} {:>16.1f}".format(
+                    name, result["seconds"], result["peak_rss"] / (1 << 20)
+                )
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(*sys.argv[2:4])
+    else:
+        main()
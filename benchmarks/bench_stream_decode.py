@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from time import perf_counter
+
+import png
+
+sys.path.append(".")
+
+from vpypng import PNGDecoder
+
+WIDTH = 1024
+HEIGHT = 1024
+# Small IDAT chunks, so reading chunk headers and CRCs dominates over inflating
+CHUNK_LIMIT = 1024
+REPEATS = 3
+
+
+def make_image():
+    rows = [bytes((x * y + y) % 256 for x in range(WIDTH * 3)) for y in range(HEIGHT)]
+    pngfile = BytesIO()
+    png.Writer(WIDTH, HEIGHT, greyscale=False, chunk_limit=CHUNK_LIMIT).write(
+        pngfile, rows
+    )
+    return pngfile.getvalue()
+
+
+def decode_from_pipe(image_bytes, buffering):
+    read_end, write_end = os.pipe()
+    writer = threading.Thread(target=_write_all, args=(write_end, image_bytes))
+    writer.start()
+
+    with open(read_end, "rb", buffering=buffering) as pipe:
+        PNGDecoder.decode(pipe)
+
+    writer.join()
+
+
+def _write_all(write_end, data):
+    with open(write_end, "wb") as pipe:
+        pipe.write(data)
+
+
+def best_time(function):
+    times = []
+
+    for _ in range(REPEATS):
+        start = perf_counter()
+        # The decoder's debug output would be timed too
+        with redirect_stdout(StringIO()):
+            function()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    image_bytes = make_image()
+    print("{}x{} RGB, {} bytes".format(WIDTH, HEIGHT, len(image_bytes)))
+
+    for name, function in [
+        ("BytesIO", lambda: PNGDecoder.decode(BytesIO(image_bytes))),
+        ("pipe, buffered", lambda: decode_from_pipe(image_bytes, -1)),
+        ("pipe, unbuffered", lambda: decode_from_pipe(image_bytes, 0)),
+    ]:
+        print("{:<30} {:>8.3f} s".format(name, best_time(function)))
+
+
+if __name__ == "__main__":
+    main()
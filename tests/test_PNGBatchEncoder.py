@@ -0,0 +1,108 @@
+from array import array
+from io import BytesIO
+from sys import byteorder
+
+import png
+import pytest
+
+from vpypng import PNGBatchEncoder, PNGDecoder
+
+
+class CountingWriter(BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+def make_image(width, height, bit_depth=8, color_type=6, palette=None):
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    samples = [
+        (x * 7 + y * 13 + channel) % (2**bit_depth)
+        for y in range(height)
+        for x in range(width)
+        for channel in range(channels)
+    ]
+    pixels = array("H" if bit_depth == 16 else "B", samples)
+    return {
+        "width": width,
+        "height": height,
+        "bit_depth": bit_depth,
+        "color_type": color_type,
+        "palette": palette,
+        "pixels": pixels,
+    }, samples
+
+
+class TestPngBatchEncoder:
+    @pytest.mark.parametrize(
+        "bit_depth, color_type",
+        [(8, 6), (8, 2), (16, 6), (16, 0), (1, 0), (4, 0), (8, 4), (2, 3)],
+    )
+    @pytest.mark.parametrize("filter_type", [0, 1, 2, 3, 4])
+    def test_encoder_round_trip(self, bit_depth, color_type, filter_type):
+        palette = [(i, 255 - i, i // 2) for i in range(4)] if color_type == 3 else None
+        image, samples = make_image(13, 7, bit_depth, color_type, palette)
+
+        image_bytes = PNGBatchEncoder(filter_type=filter_type).encode(image)
+        width, height, rows, info = png.Reader(bytes=image_bytes).read()
+
+        assert (width, height, info["bitdepth"]) == (13, 7, bit_depth)
+        assert [value for row in rows for value in row] == samples
+        if palette:
+            assert [entry[:3] for entry in info["palette"]] == palette
+
+    def test_encoder_decodes_own_output(self):
+        image, _ = make_image(16, 16)
+        image_bytes = PNGBatchEncoder().encode(image)
+
+        decoded = PNGDecoder.decode(BytesIO(image_bytes))
+
+        assert decoded["pixels"].tobytes() == image["pixels"].tobytes()
+
+    def test_encoder_reuses_buffers_for_different_sizes(self):
+        encoder = PNGBatchEncoder()
+        images = [make_image(size, size)[0] for size in [300, 4, 1, 64]]
+
+        for image, image_bytes in zip(images, encoder.encode_batch(images)):
+            assert image_bytes == PNGBatchEncoder().encode(image)
+            _, _, rows, _ = png.Reader(bytes=image_bytes).read()
+            assert array("B", bytes(b for row in rows for b in row)) == image["pixels"]
+
+    def test_encoder_writes_once_per_file(self, tmp_path):
+        encoder = PNGBatchEncoder()
+        image, _ = make_image(8, 8)
+        files = [CountingWriter() for _ in range(3)]
+
+        count = encoder.write_batch(
+            [(pngfile, image) for pngfile in files] + [(tmp_path / "icon.png", image)]
+        )
+
+        assert count == 4
+        assert all(pngfile.writes == 1 for pngfile in files)
+        assert files[0].getvalue() == (tmp_path / "icon.png").read_bytes()
+
+    def test_encoder_pixel_buffer_input(self):
+        image, _ = make_image(5, 3, 16, 2)
+        decoded = PNGDecoder.decode(BytesIO(PNGBatchEncoder().encode(image)))
+
+        assert PNGBatchEncoder().encode(decoded) == PNGBatchEncoder().encode(image)
+        if byteorder == "little":
+            assert decoded["pixels"].tobytes() == image["pixels"].tobytes()
+
+    def test_encoder_bad_input(self):
+        image, _ = make_image(4, 4)
+
+        with pytest.raises(ValueError):
+            PNGBatchEncoder(level=10)
+        with pytest.raises(ValueError):
+            PNGBatchEncoder(filter_type=5)
+        with pytest.raises(ValueError):
+            PNGBatchEncoder().encode(dict(image, width=5))
+        with pytest.raises(ValueError):
+            PNGBatchEncoder().encode(dict(image, bit_depth=4))
+        with pytest.raises(ValueError):
+            PNGBatchEncoder().encode(dict(image, color_type=3, bit_depth=8))
@@ -2,7 +2,7 @@ from pathlib import Path
 
 import pytest
 
-from vpypng import PNGCodec, PNGImage
+from vpypng import DecodedImageCache, PNGCodec, PNGImage
 
 
 class TestPngCodecDecode:
@@ -74,3 +74,61 @@ class TestPngCodecDecode:
             decoded_image = PNGCodec.decode(pngfile.read())
             assert decoded_image is not None
             assert isinstance(decoded_image, PNGImage)
+
+
+class TestDecodedImageCache:
+    def test_cache_hits_input_is_path(self):
+        cache = DecodedImageCache()
+        image_path = "tests/testimages/good_ztxt.png"
+
+        decoded_image = cache.decode(image_path)
+
+        assert cache.decode(Path(image_path)) is decoded_image
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert cache.current_bytes == decoded_image["pixels"].nbytes
+
+    def test_cache_hits_input_is_bytes(self):
+        cache = DecodedImageCache()
+
+        with open("tests/testimages/good_ztxt.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        decoded_image = cache.decode(image_bytes)
+
+        assert cache.decode(bytes(image_bytes)) is decoded_image
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_cache_input_is_path_rewritten(self, tmp_path):
+        cache = DecodedImageCache()
+        image_path = tmp_path / "image.png"
+        image_path.write_bytes(Path("tests/testimages/good_ztxt.png").read_bytes())
+
+        decoded_image = cache.decode(image_path)
+        image_path.write_bytes(
+            Path("tests/testimages/good_gama_1.00000.png").read_bytes()
+        )
+
+        assert cache.decode(image_path) is not decoded_image
+        assert cache.misses == 2
+
+    def test_cache_evicts_by_bytes(self):
+        image_paths = [
+            "tests/testimages/good_ztxt.png",
+            "tests/testimages/good_gama_1.00000.png",
+        ]
+        sizes = [
+            PNGCodec.decode(image_path)["pixels"].nbytes for image_path in image_paths
+        ]
+        cache = DecodedImageCache(max_bytes=max(sizes))
+
+        for image_path in image_paths:
+            cache.decode(image_path)
+
+        assert len(cache) == 1
+        assert cache.evictions == 1
+        assert cache.current_bytes == sizes[1]
+
+        cache.resize(0)
+
+        assert len(cache) == 0
+        assert cache.stats()["evictions"] == 2
@@ -1,10 +1,140 @@
 import glob
+import os
+from hashlib import blake2b, sha256
+from io import BytesIO, RawIOBase
 from pathlib import Path
+from struct import pack
+from zlib import compress, crc32, decompress
 
 import png
 import pytest
 
-from vpypng import PNGCodec, PNGDecodeException, PNGDecoder
+from vpypng import (
+    APNGDecoder,
+    PNGChunkIndex,
+    PNGCodec,
+    PNGDecodeException,
+    PNGDecoder,
+    PNGImageInfo,
+)
+from vpypng.pixelstats import STATISTICS
+from vpypng.restarts import encode_image_data, restart_chunk_data
+
+
+def insert_chunk(image_path, chunk_type, chunk_data, before=b"IEND"):
+    with open(image_path, "rb") as pngfile:
+        image_bytes = bytearray(pngfile.read())
+
+    position = image_bytes.index(before) - 4
+    image_bytes[position:position] = (
+        len(chunk_data).to_bytes(4, "big")
+        + chunk_type
+        + chunk_data
+        + crc32(chunk_type + chunk_data).to_bytes(4, "big")
+    )
+    return bytes(image_bytes)
+
+
+def make_chunk(chunk_type, chunk_data):
+    return (
+        len(chunk_data).to_bytes(4, "big")
+        + chunk_type
+        + chunk_data
+        + crc32(chunk_type + chunk_data).to_bytes(4, "big")
+    )
+
+
+def make_apng(width, height, frames):
+    # frames are (x_offset, y_offset, width, height, dispose_op, blend_op, rows) with
+    # 8 bit RGBA rows, the first frame is stored in IDAT and is the default image
+    image_bytes = bytearray(b"\x89PNG\r\n\x1a\n")
+    image_bytes += make_chunk(
+        b"IHDR",
+        width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, 6, 0, 0, 0]),
+    )
+    image_bytes += make_chunk(b"acTL", len(frames).to_bytes(4, "big") + bytes(4))
+    sequence_number = 0
+
+    for index, (x, y, w, h, dispose_op, blend_op, rows) in enumerate(frames):
+        image_bytes += make_chunk(
+            b"fcTL",
+            b"".join(
+                value.to_bytes(4, "big") for value in (sequence_number, w, h, x, y)
+            )
+            + bytes([0, 1, 0, 10, dispose_op, blend_op]),
+        )
+        sequence_number += 1
+        data = compress(b"".join(b"\x00" + bytes(row) for row in rows))
+
+        if index == 0:
+            image_bytes += make_chunk(b"IDAT", data)
+        else:
+            image_bytes += make_chunk(
+                b"fdAT", sequence_number.to_bytes(4, "big") + data
+            )
+            sequence_number += 1
+
+    image_bytes += make_chunk(b"IEND", b"")
+    return bytes(image_bytes)
+
+
+class TrickleStream(RawIOBase):
+    # Non seekable stream that returns at most a few bytes per read, like a slow pipe
+    def __init__(self, data, read_size=7):
+        self.data = BytesIO(data)
+        self.read_size = read_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.data.read(min(len(buffer), self.read_size))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def reference_mode_pixels(pixels, bit_depth, mode, palette=None, key=None):
+    # Per pixel reference for the mode option, pixels being tuples of source samples
+    channels, bits = mode.rstrip("0123456789"), int(mode.lstrip("LARGB"))
+    maximum, source_maximum = (1 << bits) - 1, (1 << bit_depth) - 1
+    samples = []
+
+    for pixel in pixels:
+        if palette is not None:
+            color = palette[pixel[0]]
+            rgba = [value * maximum // 255 for value in color]
+            rgba += [] if len(color) == 4 else [maximum]
+        else:
+            if bit_depth < 8:
+                scaled = [value * maximum // source_maximum for value in pixel]
+            elif bit_depth == 16 and bits == 8:
+                scaled = [value >> 8 for value in pixel]
+            else:
+                scaled = [value * maximum // source_maximum for value in pixel]
+
+            if len(pixel) in [1, 2]:
+                scaled = scaled[:1] * 3 + scaled[1:]
+            if len(scaled) == 3:
+                scaled.append(0 if tuple(pixel) == key else maximum)
+            rgba = scaled
+
+        red, green, blue, alpha = rgba
+        grey = (19595 * red + 38470 * green + 7471 * blue + 32768) >> 16
+        values = {"L": grey, "R": red, "G": green, "B": blue, "A": alpha}
+        samples.extend(values[channel] for channel in channels)
+
+    return samples
+
+
+class CountingBytesIO(BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
 
 
 class TestPngDecoder:
@@ -978,3 +1108,990 @@ class TestPngDecoder:
 
                 assert decoded_image["splt"] is not None
                 assert all([len(splt_item) == 3 for splt_item in decoded_image["splt"]])
+
+    def test_decoder_splt_wrong_length_input_str(self):
+        decoded_image = PNGCodec.decode("./tests/testimages/bad_splt_wrong-length.png")
+
+        assert decoded_image["splt"] is None
+
+    def test_decoder_ztxt_deferred_inflate_input_str(self):
+        decoded_image = PNGCodec.decode("./tests/testimages/good_ztxt.png")
+        ztxt_data = decoded_image["ztxt_data"]
+
+        assert not ztxt_data.is_inflated("Description")
+        assert isinstance(ztxt_data["Description"], str)
+        assert ztxt_data.is_inflated("Description")
+        assert ztxt_data["Description"] is ztxt_data["Description"]
+
+    def test_decoder_itxt_deferred_inflate_bad_data(self):
+        image_bytes = insert_chunk(
+            "./tests/testimages/good_itxt.png",
+            b"iTXt",
+            b"Title\x00\x01\x00\x00\x00x\xda\x07",
+        )
+
+        decoded_image = PNGCodec.decode(image_bytes)
+
+        assert decoded_image["itxt_data"][-1]["keyword"] == "Title"
+        with pytest.raises(PNGDecodeException):
+            decoded_image["itxt_data"][-1]["text_data"]
+
+    def test_decoder_iccp_profile_is_shared(self):
+        profile = bytes(range(256)) * 16
+        image_bytes = insert_chunk(
+            "./tests/testimages/good_normal_one-black-pixel.png",
+            b"iCCP",
+            b"Profile\x00\x00" + compress(profile),
+            before=b"IDAT",
+        )
+
+        first_image = PNGCodec.decode(image_bytes)
+        second_image = PNGCodec.decode(image_bytes)
+
+        assert first_image["iccp"]["profile_name"] == "Profile"
+        assert first_image["iccp"]["profile_info"] == profile
+        assert (
+            first_image["iccp"]["profile_info"] is second_image["iccp"]["profile_info"]
+        )
+
+    def test_decoder_metadata_only_input_file(self):
+        GOOD_IMAGES_PATHS = glob.glob("./tests/testimages/good_*.png")
+        for good_image_path in GOOD_IMAGES_PATHS:
+            with open(good_image_path, "rb") as pngfile:
+                decoded_image = PNGDecoder.decode(pngfile, metadata_only=True)
+                full_image = PNGCodec.decode(good_image_path)
+
+                assert isinstance(decoded_image, PNGImageInfo)
+                assert not hasattr(decoded_image, "__dict__")
+                assert "idat" not in PNGImageInfo.FIELDS
+                for key in ["width", "height", "bit_depth", "palette", "histogram"]:
+                    assert decoded_image[key] == full_image[key]
+
+    def test_image_info_unknown_key(self):
+        info = PNGImageInfo()
+
+        assert info["gama"] is None
+        with pytest.raises(KeyError):
+            info["pixels"]
+        with pytest.raises(KeyError):
+            info["pixels"] = b""
+
+    def test_decoder_pixels_ok_input_str(self):
+        GOOD_IMAGES_PATHS = glob.glob("./tests/testimages/good_*.png")
+        for good_image_path in GOOD_IMAGES_PATHS:
+            decoded_image = PNGCodec.decode(good_image_path)
+            standard_rows = png.Reader(filename=good_image_path).read()[2]
+            pixels = decoded_image["pixels"]
+
+            assert pixels.shape[:2] == (decoded_image.height, decoded_image.width)
+            for y, standard_row in enumerate(standard_rows):
+                assert list(pixels.row(y).cast(pixels.format)) == list(standard_row)
+
+    def test_decoder_pixels_interlaced_input_bytes(self):
+        rows = [[(x * y) % 65536 for x in range(3 * 13)] for y in range(11)]
+        pngfile = BytesIO()
+        png.Writer(13, 11, greyscale=False, bitdepth=16, interlace=True).write(
+            pngfile, rows
+        )
+
+        pixels = PNGCodec.decode(pngfile.getvalue())["pixels"]
+
+        assert pixels.shape == (11, 13, 3)
+        assert bytes(pixels.view()) == bytes(pixels.data)
+        assert pixels.view().tolist() == [
+            [row[x : x + 3] for x in range(0, len(row), 3)] for row in rows
+        ]
+
+    def test_decoder_ihdr_bad_input_str(self):
+        BAD_IMAGES_PATHS = glob.glob("./tests/testimages/bad_ihdr*.png")
+        for bad_image_path in BAD_IMAGES_PATHS:
+            pytest.raises(PNGDecodeException, PNGCodec.decode, bad_image_path)
+
+    def test_decoder_pixels_array_interface_is_zero_copy(self):
+        numpy = pytest.importorskip("numpy")
+        pixels = PNGCodec.decode("./tests/testimages/good_normal_tiny-rgb-gray.png")[
+            "pixels"
+        ]
+
+        pixel_array = numpy.asarray(pixels)
+        pixel_array[0, 0, 0] = 42
+
+        assert pixel_array.shape == pixels.shape
+        assert pixels.data[0] == 42
+
+    def test_decoder_gamma_to_linear_input_file(self):
+        pngfile = BytesIO()
+        png.Writer(256, 1, greyscale=True, gamma=0.5).write(pngfile, [range(256)])
+        pngfile.seek(0)
+
+        pixels = PNGDecoder.decode(pngfile, gamma="linear")["pixels"]
+
+        assert list(pixels.data) == [round((v / 255) ** 2 * 255) for v in range(256)]
+
+    def test_decoder_gamma_keeps_alpha_input_file(self):
+        rows = [[v, v, v, 65535 - v] for v in range(0, 65536, 4369)]
+        pngfile = BytesIO()
+        png.Writer(
+            1, len(rows), greyscale=False, alpha=True, bitdepth=16, gamma=1.0
+        ).write(pngfile, rows)
+        pngfile.seek(0)
+
+        pixels = PNGDecoder.decode(pngfile, gamma=2.0)["pixels"]
+
+        for y, row in enumerate(rows):
+            expected = [round((v / 65535) ** 0.5 * 65535) for v in row[:3]] + row[3:]
+            assert list(pixels.row(y).cast("H")) == expected
+
+    def test_decoder_gamma_without_gama_input_file(self):
+        with open("./tests/testimages/good_normal_tiny-rgb-gray.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        assert (
+            PNGDecoder.decode(BytesIO(image_bytes), gamma="srgb")["pixels"].data
+            == PNGCodec.decode(image_bytes)["pixels"].data
+        )
+
+    def test_decoder_gamma_palette_input_file(self):
+        palette = [(200, 100, 100), (0, 50, 255)]
+        pngfile = BytesIO()
+        png.Writer(2, 1, palette=palette, bitdepth=1, gamma=1.0).write(
+            pngfile, [[0, 1]]
+        )
+        image_bytes = pngfile.getvalue()
+        corrected = [round((v / 255) ** 0.5 * 255) for color in palette for v in color]
+
+        options = {"statistics": ["max"], "digest": "sha256"}
+        image = PNGDecoder.decode(BytesIO(image_bytes), gamma=2.0, **options)
+        plain = PNGDecoder.decode(BytesIO(image_bytes), **options)
+        composited = PNGDecoder.decode(
+            BytesIO(image_bytes), gamma=2.0, background=(0, 0, 0)
+        )
+
+        assert image["palette"] == plain["palette"] == tuple(palette)
+        assert image["pixels"].shape == (1, 2, 3)
+        assert list(image["pixels"].data) == corrected
+        assert list(composited["pixels"].data) == corrected
+        assert image["statistics"] == plain["statistics"] == {"max": (200, 100, 255)}
+        assert image["digest"] == plain["digest"]
+
+    def test_decoder_gamma_identity_input_file(self):
+        # gAMA holds an encoding exponent and gamma a display exponent, so only
+        # reciprocal values leave the samples alone
+        pngfile = BytesIO()
+        png.Writer(256, 1, greyscale=True, gamma=0.5).write(pngfile, [range(256)])
+        image_bytes = pngfile.getvalue()
+
+        same = PNGDecoder.decode(BytesIO(image_bytes), gamma=2.0)["pixels"]
+        squared = PNGDecoder.decode(BytesIO(image_bytes), gamma=0.5)["pixels"]
+
+        assert list(same.data) == list(range(256))
+        assert list(squared.data) == [round((v / 255) ** 4 * 255) for v in range(256)]
+
+    def test_decoder_trns_key_out_of_range_input_bytes(self):
+        pngfile = BytesIO()
+        png.Writer(2, 1, greyscale=False).write(pngfile, [[1, 2, 3, 4, 5, 6]])
+        image_bytes = pngfile.getvalue()
+        position = image_bytes.index(b"IDAT") - 4
+        image_bytes = (
+            image_bytes[:position]
+            + make_chunk(b"tRNS", bytes([0, 1, 1, 0, 0, 3]))
+            + image_bytes[position:]
+        )
+
+        for options in [
+            {"background": (0, 0, 0)},
+            {"mode": "RGBA8"},
+            {"statistics": ["transparent"]},
+            {"digest": "sha256"},
+        ]:
+            image = PNGDecoder.decode(BytesIO(image_bytes), **options)
+            assert image["trns"] is None
+
+        assert image["pixels"].tobytes() == bytes([1, 2, 3, 4, 5, 6])
+
+    def test_decoder_premultiply_input_file(self):
+        rows = [[200, 100, 50, 0, 200, 100, 50, 128, 200, 100, 50, 255]]
+        pngfile = BytesIO()
+        png.Writer(3, 1, greyscale=False, alpha=True).write(pngfile, rows)
+        pngfile.seek(0)
+
+        pixels = PNGDecoder.decode(pngfile, premultiply=True)["pixels"]
+
+        assert pixels.shape == (1, 3, 4)
+        assert list(pixels.data) == [0, 0, 0, 0, 100, 50, 25, 128, 200, 100, 50, 255]
+
+    def test_decoder_background_bkgd_input_file(self):
+        rows = [[200, 0, 200, 128, 200, 255]]
+        pngfile = BytesIO()
+        png.Writer(3, 1, greyscale=True, alpha=True, background=(100,)).write(
+            pngfile, rows
+        )
+        pngfile.seek(0)
+
+        pixels = PNGDecoder.decode(pngfile, background="bkgd")["pixels"]
+
+        assert pixels.shape == (1, 3)
+        assert list(pixels.data) == [100, 150, 200]
+
+    def test_decoder_background_palette_input_file(self):
+        palette = [(255, 0, 0, 0), (0, 255, 0, 128), (0, 0, 255, 254)]
+        pngfile = BytesIO()
+        png.Writer(3, 1, palette=palette, bitdepth=2).write(pngfile, [[0, 1, 2]])
+        pngfile.seek(0)
+
+        pixels = PNGDecoder.decode(pngfile, background=(10, 20, 30))["pixels"]
+
+        assert pixels.shape == (1, 3, 3)
+        assert list(pixels.data) == [10, 20, 30, 5, 138, 15, 0, 0, 254]
+
+    def test_decoder_apng_frames_input_file(self):
+        red, green = [255, 0, 0, 255], [0, 255, 0, 255]
+        half_blue = [0, 0, 255, 128]
+        image_bytes = make_apng(
+            2,
+            2,
+            [
+                (0, 0, 2, 2, 0, 0, [red * 2, red * 2]),
+                (1, 0, 1, 2, 2, 0, [green, green]),
+                (0, 1, 2, 1, 1, 1, [half_blue * 2]),
+                (0, 0, 1, 1, 0, 0, [green]),
+            ],
+        )
+
+        frames = [
+            (frame_control, bytes(canvas.data))
+            for frame_control, canvas in APNGDecoder.decode(BytesIO(image_bytes))
+        ]
+
+        assert [frame_control["sequence_number"] for frame_control, _ in frames] == [
+            0,
+            1,
+            3,
+            5,
+        ]
+        assert frames[0][0]["delay"] == 0.1
+        assert frames[0][1] == bytes(red * 4)
+        assert frames[1][1] == bytes(red + green + red + green)
+        # The second frame is disposed back to the first, then blended over
+        assert frames[2][1] == bytes(red * 2 + [127, 0, 128, 255] * 2)
+        # The third frame is disposed to transparent black
+        assert frames[3][1] == bytes(green + red + [0] * 8)
+
+    def test_decoder_apng_frame_outside_image_input_file(self):
+        red = [255, 0, 0, 255]
+        image_bytes = make_apng(
+            1, 1, [(0, 0, 1, 1, 0, 0, [red]), (1, 0, 1, 1, 0, 0, [red])]
+        )
+
+        with pytest.raises(PNGDecodeException):
+            list(APNGDecoder.decode(BytesIO(image_bytes)))
+
+    def test_decoder_apng_frame_seek_input_file(self):
+        red, green = [255, 0, 0, 255], [0, 255, 0, 255]
+        half_blue = [0, 0, 255, 128]
+        image_bytes = make_apng(
+            2,
+            2,
+            [
+                (0, 0, 2, 2, 0, 0, [red * 2, red * 2]),
+                (1, 0, 1, 2, 2, 0, [green, green]),
+                (0, 1, 2, 1, 1, 1, [half_blue * 2]),
+                (0, 0, 1, 1, 0, 0, [green]),
+            ],
+        )
+        frames = [
+            bytes(canvas.data) for _, canvas in APNGDecoder.decode(BytesIO(image_bytes))
+        ]
+        decoder = APNGDecoder(BytesIO(image_bytes))
+
+        assert len(decoder.frame_index()) == 4
+
+        for number in [3, 0, 2, 1]:
+            frame_control, canvas = decoder.frame(number)
+            assert bytes(canvas.data) == frames[number]
+
+        with pytest.raises(IndexError):
+            decoder.frame(4)
+
+    def test_decoder_apng_frame_seek_skips_frames_input_file(self):
+        red, green = [255, 0, 0, 255], [0, 255, 0, 255]
+        image_bytes = bytearray(
+            make_apng(
+                1,
+                1,
+                [
+                    (0, 0, 1, 1, 0, 0, [red]),
+                    (0, 0, 1, 1, 0, 0, [green]),
+                    (0, 0, 1, 1, 0, 0, [red]),
+                ],
+            )
+        )
+        # Break the CRC of the second frame, replaced as a whole by the third one
+        position = image_bytes.index(b"fdAT") + 8
+        image_bytes[position] ^= 0xFF
+
+        frame_control, canvas = APNGDecoder(BytesIO(image_bytes)).frame(2)
+
+        assert frame_control["sequence_number"] == 3
+        assert bytes(canvas.data) == bytes(red)
+
+        with pytest.raises(PNGDecodeException):
+            list(APNGDecoder.decode(BytesIO(bytes(image_bytes))))
+
+    def test_decoder_chunk_index_input_file(self, tmp_path):
+        image_path = tmp_path / "image.png"
+        image_path.write_bytes(
+            insert_chunk(
+                "./tests/testimages/good_gama_1.00000.png", b"tEXt", b"Title\x00A"
+            )
+        )
+
+        index = PNGChunkIndex.for_file(image_path)
+
+        assert PNGChunkIndex.sidecar_path(image_path).exists()
+        assert [chunk[0] for chunk in index.chunks][0] == b"IHDR"
+        assert index.chunks[-1][0] == b"IEND"
+        assert PNGChunkIndex.for_file(image_path).chunks == index.chunks
+
+        with open(image_path, "rb") as pngfile:
+            expected = PNGDecoder.decode(pngfile)
+
+        with open(image_path, "rb") as pngfile:
+            image = PNGDecoder.decode(pngfile, chunk_index=index)
+
+        with open(image_path, "rb") as pngfile:
+            info = PNGDecoder.decode(pngfile, metadata_only=True, chunk_index=index)
+
+        assert image["pixels"].data == expected["pixels"].data
+        assert image["text_data"] == expected["text_data"]
+        assert info["text_data"] == expected["text_data"]
+        assert info["width"] == index.ihdr["width"]
+
+    def test_decoder_chunk_index_stale_input_file(self, tmp_path):
+        image_path = tmp_path / "image.png"
+        image_path.write_bytes(
+            insert_chunk(
+                "./tests/testimages/good_gama_1.00000.png", b"tEXt", b"Title\x00A"
+            )
+        )
+        index = PNGChunkIndex.for_file(image_path)
+
+        image_path.write_bytes(
+            insert_chunk(
+                "./tests/testimages/good_gama_1.00000.png", b"tEXt", b"Title\x00AB"
+            )
+        )
+
+        assert (
+            PNGChunkIndex.load(PNGChunkIndex.sidecar_path(image_path), image_path)
+            is None
+        )
+
+        with open(image_path, "rb") as pngfile:
+            assert not index.matches(pngfile)
+            image = PNGDecoder.decode(pngfile, chunk_index=index)
+
+        assert image["text_data"] == {"Title": "AB"}
+
+    def test_decoder_chunk_index_same_size_input_file(self, tmp_path):
+        # Uncompressed tiles of the same size, the second one written with the first
+        # one's mtime so that only its chunks tell it apart
+        tiles = []
+        for value in [10, 200]:
+            pngfile = BytesIO()
+            png.Writer(4, 4, greyscale=True, compression=0).write(
+                pngfile, [[value] * 4] * 4
+            )
+            tiles.append(pngfile.getvalue())
+
+        assert len(tiles[0]) == len(tiles[1])
+
+        index = PNGChunkIndex.build(BytesIO(tiles[0]))
+        assert not index.matches(BytesIO(tiles[1]))
+        image = PNGDecoder.decode(BytesIO(tiles[1]), chunk_index=index)
+        assert image["pixels"].tobytes() == bytes([200] * 16)
+
+        image_path = tmp_path / "tile.png"
+        image_path.write_bytes(tiles[0])
+        index = PNGChunkIndex.build(image_path)
+        image_path.write_bytes(tiles[1])
+        os.utime(image_path, ns=(index.mtime_ns, index.mtime_ns))
+
+        with open(image_path, "rb") as pngfile:
+            assert index.matches(pngfile)
+            image = PNGDecoder.decode(pngfile, chunk_index=index)
+
+        assert image["pixels"].tobytes() == bytes([200] * 16)
+
+    def test_decoder_chunk_index_moved_chunks_input_file(self, tmp_path):
+        # Same size, same mtime, but the tEXt chunk moved past IDAT: the IHDR is
+        # decoded from the index before the moved chunks are found out
+        pngfile = BytesIO()
+        png.Writer(4, 4, greyscale=True).write(pngfile, [[10, 20, 30, 40]] * 4)
+        image_bytes = pngfile.getvalue()
+        text = make_chunk(b"tEXt", b"Title\x00Tile")
+        idat_start = image_bytes.index(b"IDAT") - 4
+        iend_start = image_bytes.index(b"IEND") - 4
+
+        image_path = tmp_path / "tile.png"
+        image_path.write_bytes(
+            image_bytes[:idat_start] + text + image_bytes[idat_start:]
+        )
+        index = PNGChunkIndex.build(image_path)
+        image_path.write_bytes(
+            image_bytes[:iend_start] + text + image_bytes[iend_start:]
+        )
+        os.utime(image_path, ns=(index.mtime_ns, index.mtime_ns))
+
+        with open(image_path, "rb") as pngfile:
+            assert index.matches(pngfile)
+            image = PNGDecoder.decode(
+                pngfile, chunk_index=index, statistics=["max"], digest="sha256"
+            )
+
+        expected = PNGDecoder.decode(
+            BytesIO(image_path.read_bytes()), statistics=["max"], digest="sha256"
+        )
+        assert image["pixels"].tobytes() == bytes([10, 20, 30, 40] * 4)
+        assert image["text_data"] == expected["text_data"]
+        assert image["statistics"] == expected["statistics"] == {"max": (40,)}
+        assert image["digest"] == expected["digest"]
+        assert image["idat"] is None
+
+    def test_decoder_chunk_index_truncated_ihdr_input_file(self):
+        with pytest.raises(PNGDecodeException):
+            PNGChunkIndex.build("./tests/testimages/bad_chunk_data_truncated.png")
+
+    def test_decoder_restart_points_input_file(self):
+        rows = [bytes((x * y + y) % 256 for x in range(30)) for y in range(25)]
+        stream, restart_points = encode_image_data(rows, 3, restart_rows=4)
+        image_bytes = (
+            b"\x89PNG\r\n\x1a\n"
+            + make_chunk(b"IHDR", bytes([0, 0, 0, 10, 0, 0, 0, 25, 8, 2, 0, 0, 0]))
+            + make_chunk(b"vpRS", restart_chunk_data(restart_points))
+            + make_chunk(b"IDAT", stream)
+            + make_chunk(b"IEND", b"")
+        )
+
+        pixels = PNGDecoder.decode(BytesIO(image_bytes))["pixels"]
+        _, _, expected_rows, _ = png.Reader(bytes=image_bytes).read()
+
+        assert len(restart_points) == 6
+        assert pixels.tobytes() == b"".join(bytes(row) for row in expected_rows)
+
+    def test_decoder_restart_points_unusable_input_file(self):
+        rows = [bytes((x * y + y) % 256 for x in range(30)) for y in range(25)]
+        stream, _ = encode_image_data(rows, 3, restart_rows=4)
+        image_bytes = (
+            b"\x89PNG\r\n\x1a\n"
+            + make_chunk(b"IHDR", bytes([0, 0, 0, 10, 0, 0, 0, 25, 8, 2, 0, 0, 0]))
+            + make_chunk(b"vpRS", restart_chunk_data([(1, 30)]))
+            + make_chunk(b"IDAT", stream)
+            + make_chunk(b"IEND", b"")
+        )
+
+        pixels = PNGDecoder.decode(BytesIO(image_bytes))["pixels"]
+
+        assert pixels.tobytes() == b"".join(rows)
+
+    @pytest.mark.parametrize("shift, level", [(1, None), (-1, None), (0, 0)])
+    def test_decoder_restart_points_stale_input_file(self, shift, level):
+        # Restart points that are in bounds, but moved or left over from before the
+        # image data was compressed again
+        rows = [bytes((x * y + y) % 256 for x in range(30)) for y in range(25)]
+        stream, restart_points = encode_image_data(rows, 3, restart_rows=4)
+        if level is not None:
+            stream = compress(decompress(stream), level)
+        stale_points = [(offset + shift, row) for offset, row in restart_points]
+        image_bytes = (
+            b"\x89PNG\r\n\x1a\n"
+            + make_chunk(b"IHDR", bytes([0, 0, 0, 10, 0, 0, 0, 25, 8, 2, 0, 0, 0]))
+            + make_chunk(b"vpRS", restart_chunk_data(stale_points))
+            + make_chunk(b"IDAT", stream)
+            + make_chunk(b"IEND", b"")
+        )
+
+        pixels = PNGDecoder.decode(BytesIO(image_bytes))["pixels"]
+
+        assert pixels.tobytes() == b"".join(rows)
+
+    @pytest.mark.parametrize("keep_pixels", [True, False])
+    @pytest.mark.parametrize("stream_type", [BytesIO, TrickleStream])
+    def test_decoder_restart_points_wrong_late_input_file(
+        self, keep_pixels, stream_type
+    ):
+        # Only the last restart point is wrong, so rows of the blocks before it are
+        # stored before the decoder falls back. Seekable files read the IDAT chunks
+        # again for it, streams keep them.
+        rows = [bytes((x * y + y) % 256 for x in range(30)) for y in range(25)]
+        stream, restart_points = encode_image_data(rows, 3, restart_rows=4)
+        offset, row = restart_points[-1]
+        restart_chunk = make_chunk(
+            b"vpRS", restart_chunk_data(restart_points[:-1] + [(offset + 1, row)])
+        )
+        image_bytes = (
+            b"\x89PNG\r\n\x1a\n"
+            + make_chunk(b"IHDR", bytes([0, 0, 0, 10, 0, 0, 0, 25, 8, 2, 0, 0, 0]))
+            + restart_chunk
+            + b"".join(
+                make_chunk(b"IDAT", stream[start : start + 20])
+                for start in range(0, len(stream), 20)
+            )
+            + make_chunk(b"IEND", b"")
+        )
+        options = {"statistics": ["max", "mean"], "digest": "sha256"}
+
+        image = PNGDecoder.decode(
+            stream_type(image_bytes), keep_pixels=keep_pixels, **options
+        )
+        expected = PNGDecoder.decode(
+            BytesIO(image_bytes.replace(restart_chunk, b"")), **options
+        )
+
+        assert image["statistics"] == expected["statistics"]
+        assert image["digest"] == expected["digest"]
+        if keep_pixels:
+            assert image["pixels"].tobytes() == b"".join(rows)
+
+    def test_decoder_short_reads_input_stream(self):
+        GOOD_IMAGES_PATHS = glob.glob("./tests/testimages/good_*.png")
+        for good_image_path in GOOD_IMAGES_PATHS:
+            with open(good_image_path, "rb") as pngfile:
+                image_bytes = pngfile.read()
+
+            decoded_image = PNGDecoder.decode(TrickleStream(image_bytes))
+            expected_image = PNGDecoder.decode(BytesIO(image_bytes))
+
+            for key in ["width", "height", "bit_depth", "palette", "text_data"]:
+                assert decoded_image[key] == expected_image[key]
+            assert bytes(decoded_image["pixels"].data) == bytes(
+                expected_image["pixels"].data
+            )
+
+    def test_decoder_read_ahead_unused_data_input_stream(self):
+        with open("./tests/testimages/good_gama_1.00000.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        stream = TrickleStream(image_bytes + b"trailing data", read_size=1 << 20)
+        decoder = PNGDecoder(stream)
+
+        assert decoder.file is stream
+        assert decoder.unused_data + stream.read() == b"trailing data"
+
+    def test_decoder_read_ahead_seeks_back_input_file(self, tmp_path):
+        with open("./tests/testimages/good_gama_1.00000.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+        image_path = tmp_path / "trailing.png"
+        image_path.write_bytes(image_bytes + b"trailing data")
+
+        with open(image_path, "rb", buffering=0) as pngfile:
+            decoder = PNGDecoder(pngfile)
+
+            assert decoder.unused_data == b""
+            assert pngfile.tell() == len(image_bytes)
+
+    def test_decoder_truncated_input_stream(self):
+        with open("./tests/testimages/good_gama_1.00000.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        for size in [10, 20, len(image_bytes) - 5]:
+            with pytest.raises(PNGDecodeException):
+                PNGDecoder.decode(TrickleStream(image_bytes[:size]))
+
+    def test_decoder_metadata_only_skips_image_data_input_file(self):
+        rows = [bytes((x * y * 7 + y) % 256 for x in range(3 * 64)) for y in range(64)]
+        pngfile = BytesIO()
+        png.Writer(64, 64, greyscale=False, chunk_limit=256).write(pngfile, rows)
+        image_bytes = pngfile.getvalue()
+        position = image_bytes.index(b"IEND") - 4
+        image_bytes = (
+            image_bytes[:position]
+            + make_chunk(b"tEXt", b"Title\x00A")
+            + image_bytes[position:]
+        )
+
+        stream = CountingBytesIO(image_bytes)
+        info = PNGDecoder.decode(stream, metadata_only=True)
+
+        assert info["text_data"] == {"Title": "A"}
+        assert stream.bytes_read < 200 < len(image_bytes)
+
+    def test_decoder_metadata_only_skipped_image_data_truncated_input_file(self):
+        with open("./tests/testimages/good_gama_1.00000.png", "rb") as pngfile:
+            image_bytes = pngfile.read()
+
+        with pytest.raises(PNGDecodeException):
+            PNGDecoder.decode(
+                BytesIO(image_bytes[: image_bytes.index(b"IDAT") + 10]),
+                metadata_only=True,
+            )
+
+    def test_decoder_decode_into_input_file(self):
+        GOOD_IMAGES_PATHS = glob.glob("./tests/testimages/good_*.png")
+        decoder = PNGDecoder()
+        for good_image_path in GOOD_IMAGES_PATHS:
+            expected = PNGCodec.decode(good_image_path)["pixels"]
+            buffer = bytearray(expected.nbytes)
+
+            with open(good_image_path, "rb") as pngfile:
+                image = decoder.decode_into(pngfile, buffer)
+
+            assert image["pixels"].data.obj is buffer
+            assert buffer == expected.tobytes()
+
+    def test_decoder_decode_into_stride_input_bytes(self):
+        rows = [[(x * y + y) % 256 for x in range(3 * 10)] for y in range(6)]
+        pngfile = BytesIO()
+        png.Writer(10, 6, greyscale=False).write(pngfile, rows)
+        stride = 3 * 10 + 5
+        buffer = bytearray(b"\xaa" * (stride * 6))
+
+        pixels = PNGDecoder().decode_into(BytesIO(pngfile.getvalue()), buffer, stride)[
+            "pixels"
+        ]
+
+        for y, row in enumerate(rows):
+            assert buffer[y * stride : y * stride + 30] == bytes(row)
+            assert buffer[y * stride + 30 : (y + 1) * stride] == b"\xaa" * 5
+        assert pixels.tobytes() == b"".join(bytes(row) for row in rows)
+        assert pixels.strides == (stride, 3, 1)
+        with pytest.raises(ValueError):
+            pixels.view()
+
+    def test_decoder_decode_into_numpy_input_bytes(self):
+        numpy = pytest.importorskip("numpy")
+        rows = [[(x + y) % 65536 * 97 % 65536 for x in range(2 * 7)] for y in range(5)]
+        pngfile = BytesIO()
+        png.Writer(7, 5, greyscale=True, alpha=True, bitdepth=16).write(pngfile, rows)
+        array = numpy.zeros((5, 7, 2), dtype=numpy.uint16)
+
+        PNGDecoder().decode_into(BytesIO(pngfile.getvalue()), array)
+
+        assert array.reshape(5, 14).tolist() == rows
+
+    def test_decoder_decode_into_bad_numpy_input_bytes(self):
+        numpy = pytest.importorskip("numpy")
+        pngfile = BytesIO()
+        png.Writer(4, 3, greyscale=True).write(pngfile, [[1, 2, 3, 4]] * 3)
+        image_bytes = pngfile.getvalue()
+
+        for array in [
+            numpy.zeros((3, 8), dtype=numpy.uint8)[:, ::2],
+            numpy.zeros((3, 4), dtype=numpy.uint16),
+            numpy.zeros((4, 3), dtype=numpy.uint8),
+            numpy.zeros((3, 4, 1), dtype=numpy.uint8),
+        ]:
+            with pytest.raises(ValueError):
+                PNGDecoder().decode_into(BytesIO(image_bytes), array)
+
+        array = numpy.zeros((3, 4), dtype=numpy.uint8)
+        PNGDecoder().decode_into(BytesIO(image_bytes), array)
+        assert array.tolist() == [[1, 2, 3, 4]] * 3
+
+    def test_decoder_decode_into_bad_buffer_input_bytes(self):
+        rows = [[x % 256 for x in range(3 * 10)] for y in range(6)]
+        pngfile = BytesIO()
+        png.Writer(10, 6, greyscale=False).write(pngfile, rows)
+        image_bytes = pngfile.getvalue()
+
+        for buffer, stride in [
+            (bytearray(3 * 10 * 6 - 1), None),
+            (bytes(3 * 10 * 6), None),
+            (bytearray(3 * 10 * 6), 29),
+            (bytearray(3 * 10 * 6), 31),
+        ]:
+            with pytest.raises(ValueError):
+                PNGDecoder().decode_into(BytesIO(image_bytes), buffer, stride)
+
+        with pytest.raises(ValueError):
+            PNGDecoder(metadata_only=True).decode_into(
+                BytesIO(image_bytes), bytearray(3 * 10 * 6)
+            )
+
+    def test_decoder_decode_into_reuses_row_decoder_input_bytes(self):
+        decoder = PNGDecoder()
+        buffer = bytearray(13 * 11 * 3)
+        row_decoder = None
+
+        for seed in range(3):
+            rows = [[(x * y + seed) % 256 for x in range(3 * 13)] for y in range(11)]
+            pngfile = BytesIO()
+            png.Writer(13, 11, greyscale=False, interlace=True).write(pngfile, rows)
+
+            decoder.decode_into(BytesIO(pngfile.getvalue()), buffer)
+
+            assert buffer == b"".join(bytes(row) for row in rows)
+            assert row_decoder is None or decoder.row_decoder is row_decoder
+            row_decoder = decoder.row_decoder
+
+        # Larger buffers are fine, the rows go at its start
+        with open("./tests/testimages/good_gama_1.00000.png", "rb") as pngfile:
+            decoder.decode_into(pngfile, bytearray(1 << 16))
+
+        assert decoder.row_decoder is not row_decoder
+
+    @pytest.mark.parametrize(
+        "mode", ["L8", "LA8", "RGB8", "RGBA8", "L16", "LA16", "RGB16", "RGBA16"]
+    )
+    @pytest.mark.parametrize(
+        "color_type, bit_depth",
+        [(0, 1), (0, 2), (0, 4), (0, 8), (0, 16), (2, 8), (2, 16), (3, 2), (3, 8)]
+        + [(4, 8), (4, 16), (6, 8), (6, 16)],
+    )
+    @pytest.mark.parametrize("transparency", [False, True])
+    def test_decoder_mode_input_bytes(self, mode, color_type, bit_depth, transparency):
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+        width, height, maximum = 11, 5, (1 << bit_depth) - 1
+        pixels = [
+            tuple((x * 37 + y * 101 + c * 59) % (maximum + 1) for c in range(channels))
+            for y in range(height)
+            for x in range(width)
+        ]
+        palette, key, writer_options = None, None, {}
+
+        if color_type == 3:
+            palette = [
+                (
+                    i * 3 % 256,
+                    255 - i,
+                    i * 7 % 256,
+                    (255 - 2 * i) % 256 if transparency else 255,
+                )
+                for i in range(maximum + 1)
+            ]
+            writer_options["palette"] = palette
+        else:
+            writer_options["greyscale"] = color_type in [0, 4]
+            writer_options["alpha"] = color_type in [4, 6]
+            if transparency and color_type in [0, 2]:
+                key = pixels[3]
+                writer_options["transparent"] = key if channels == 3 else key[0]
+
+        pngfile = BytesIO()
+        png.Writer(width, height, bitdepth=bit_depth, **writer_options).write_array(
+            pngfile, [value for pixel in pixels for value in pixel]
+        )
+
+        decoded = PNGDecoder.decode(BytesIO(pngfile.getvalue()), mode=mode)["pixels"]
+        expected = reference_mode_pixels(
+            pixels, bit_depth, mode, palette if color_type == 3 else None, key
+        )
+
+        assert decoded.shape[:2] == (height, width)
+        assert list(memoryview(decoded.tobytes()).cast(decoded.format)) == expected
+
+    def test_decoder_mode_rgba8_input_file(self):
+        for good_image_path in glob.glob("./tests/testimages/good_*.png"):
+            expected = png.Reader(filename=good_image_path).asRGBA8()[2]
+
+            with open(good_image_path, "rb") as pngfile:
+                pixels = PNGDecoder.decode(pngfile, mode="RGBA8")["pixels"]
+
+            assert pixels.tobytes() == b"".join(bytes(row) for row in expected)
+
+    def test_decoder_mode_bad_options(self):
+        with pytest.raises(ValueError):
+            PNGDecoder(mode="CMYK8")
+        with pytest.raises(ValueError):
+            PNGDecoder(mode="RGB8", premultiply=True)
+
+    @pytest.mark.parametrize(
+        "color_type, bit_depth",
+        [(0, 1), (0, 4), (0, 8), (0, 16), (2, 8), (2, 16), (3, 2), (3, 8), (4, 8)]
+        + [(4, 16), (6, 8), (6, 16)],
+    )
+    @pytest.mark.parametrize("interlace", [False, True])
+    def test_decoder_statistics_input_bytes(self, color_type, bit_depth, interlace):
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+        width, height, maximum = 13, 6, (1 << bit_depth) - 1
+        pixels = [
+            tuple((x * 37 + y * 101 + c * 59) % (maximum + 1) for c in range(channels))
+            for y in range(height)
+            for x in range(width)
+        ]
+        writer_options, transparent = {"interlace": interlace}, None
+
+        if color_type == 3:
+            palette = [
+                (i * 3 % 256, 255 - i, i * 7 % 256, 0 if i % 3 == 0 else 255)
+                for i in range(maximum + 1)
+            ]
+            writer_options["palette"] = palette
+            samples = [palette[pixel[0]] for pixel in pixels]
+            transparent = sum(color[3] == 0 for color in samples)
+        else:
+            writer_options["greyscale"] = color_type in [0, 4]
+            writer_options["alpha"] = color_type in [4, 6]
+            samples = pixels
+            if color_type in [4, 6]:
+                transparent = sum(pixel[-1] == 0 for pixel in pixels)
+            else:
+                key = pixels[3]
+                writer_options["transparent"] = key if channels == 3 else key[0]
+                transparent = pixels.count(key)
+
+        pngfile = BytesIO()
+        png.Writer(width, height, bitdepth=bit_depth, **writer_options).write_array(
+            pngfile, [value for pixel in pixels for value in pixel]
+        )
+
+        statistics = PNGDecoder.decode(
+            BytesIO(pngfile.getvalue()), statistics=STATISTICS
+        )["statistics"]
+        planes = list(zip(*samples))
+        bins = 256 if color_type == 3 else maximum + 1
+
+        assert statistics["min"] == tuple(min(plane) for plane in planes)
+        assert statistics["max"] == tuple(max(plane) for plane in planes)
+        assert statistics["mean"] == pytest.approx(
+            [sum(plane) / len(plane) for plane in planes]
+        )
+        assert statistics["histogram"] == [
+            [plane.count(value) for value in range(bins)] for plane in planes
+        ]
+        assert statistics["transparent"] == transparent / (width * height)
+        assert statistics["grayscale"] == (
+            color_type in [0, 4] or all(s[0] == s[1] == s[2] for s in samples)
+        )
+
+    def test_decoder_statistics_grayscale_rgb_input_bytes(self):
+        pngfile = BytesIO()
+        rows = [[value for x in range(8) for value in [x * y] * 3] for y in range(4)]
+        png.Writer(8, 4, greyscale=False).write(pngfile, rows)
+
+        decoder = PNGDecoder(statistics=["grayscale", "max"], mode="L8")
+        image = decoder.decode_into(BytesIO(pngfile.getvalue()), bytearray(32))
+        assert image["statistics"] == {"max": (21, 21, 21), "grayscale": True}
+
+        rows[3][4] += 1
+        pngfile = BytesIO()
+        png.Writer(8, 4, greyscale=False).write(pngfile, rows)
+
+        image = PNGDecoder.decode(BytesIO(pngfile.getvalue()), statistics=["grayscale"])
+        assert image["statistics"] == {"grayscale": False}
+
+    def test_decoder_statistics_input_file(self):
+        for good_image_path in glob.glob("./tests/testimages/good_*.png"):
+            reader = png.Reader(filename=good_image_path)
+            width, height, rows, info = reader.read()
+            pixels = list(zip(*[iter(v for row in rows for v in row)] * info["planes"]))
+
+            with open(good_image_path, "rb") as pngfile:
+                image = PNGDecoder.decode(pngfile, statistics=["min", "max"])
+
+            if image["color_type"] == 3 or image["trns"] is not None:
+                continue
+
+            planes = list(zip(*pixels))
+            assert image["statistics"]["min"] == tuple(min(p) for p in planes)
+            assert image["statistics"]["max"] == tuple(max(p) for p in planes)
+
+    def test_decoder_statistics_palette_without_plte_input_bytes(self):
+        image_bytes = (
+            b"\x89PNG\r\n\x1a\n"
+            + make_chunk(b"IHDR", bytes([0, 0, 0, 3, 0, 0, 0, 2, 8, 3, 0, 0, 0]))
+            + make_chunk(b"IDAT", compress(bytes(8)))
+            + make_chunk(b"IEND", b"")
+        )
+
+        assert PNGDecoder.decode(BytesIO(image_bytes))["palette"] is None
+
+        for options in [{"statistics": ["max"]}, {"digest": "sha256"}]:
+            with pytest.raises(PNGDecodeException):
+                PNGDecoder.decode(BytesIO(image_bytes), **options)
+
+    def test_decoder_statistics_bad_options(self):
+        with pytest.raises(ValueError):
+            PNGDecoder(statistics=["median"])
+        with pytest.raises(ValueError):
+            PNGDecoder(statistics=["min"], metadata_only=True)
+
+    def test_decoder_digest_same_picture_input_bytes(self):
+        # One 4 bit grey picture, saved every way that keeps the same pixels
+        width, height = 9, 7
+        grey = [[(x + y * 3) % 16 for x in range(width)] for y in range(height)]
+        rgba = [[v * 17 for v in row for v in [v, v, v]] for row in grey]
+        encodings = []
+
+        for options in [
+            {"greyscale": True, "bitdepth": 4},
+            {"greyscale": True, "bitdepth": 4, "interlace": True},
+            {"greyscale": True, "bitdepth": 4, "compression": 0, "chunk_limit": 20},
+        ]:
+            pngfile = BytesIO()
+            png.Writer(width, height, **options).write(pngfile, grey)
+            encodings.append(pngfile.getvalue())
+
+        pngfile = BytesIO()
+        png.Writer(width, height, greyscale=True).write(
+            pngfile, [[v * 17 for v in row] for row in grey]
+        )
+        image_bytes = pngfile.getvalue()
+        encodings.append(
+            image_bytes[:-12] + make_chunk(b"tEXt", b"a\0b") + image_bytes[-12:]
+        )
+
+        pngfile = BytesIO()
+        png.Writer(width, height, greyscale=False).write(pngfile, rgba)
+        encodings.append(pngfile.getvalue())
+
+        pngfile = BytesIO()
+        palette = [(v * 17, v * 17, v * 17) for v in range(16)]
+        png.Writer(width, height, palette=palette[::-1]).write(
+            pngfile, [[15 - v for v in row] for row in grey]
+        )
+        encodings.append(pngfile.getvalue())
+
+        expected = sha256(pack(">II", width, height) + b"RGBA8")
+        for row in rgba:
+            expected.update(
+                bytes(v for i in range(0, len(row), 3) for v in row[i : i + 3] + [255])
+            )
+
+        for image_bytes in encodings:
+            image = PNGDecoder.decode(BytesIO(image_bytes), digest="sha256")
+            assert image["digest"] == expected.hexdigest()
+
+    def test_decoder_digest_without_pixels_input_bytes(self):
+        pngfile = BytesIO()
+        rows = [[y * 7, 65535 - y, y * 1000] for y in range(4)]
+        png.Writer(1, 4, greyscale=False, bitdepth=16, transparent=rows[2]).write(
+            pngfile, rows
+        )
+        image_bytes = pngfile.getvalue()
+
+        image = PNGDecoder.decode(
+            BytesIO(image_bytes),
+            digest="blake2b",
+            keep_pixels=False,
+            statistics=["max"],
+        )
+        kept = PNGDecoder.decode(BytesIO(image_bytes), digest="blake2b", mode="L8")
+
+        expected = blake2b(pack(">II", 1, 4) + b"RGBA16")
+        for row in rows:
+            expected.update(pack(">HHHH", *row, 0 if row == rows[2] else 65535))
+
+        assert image["pixels"] is None
+        assert image["idat"] is None and kept["idat"] is None
+        assert image["statistics"] == {"max": (21, 65535, 3000)}
+        assert image["digest"] == kept["digest"] == expected.hexdigest()
+
+        # A different sample gives a different digest
+        rows[0][0] += 1
+        pngfile = BytesIO()
+        png.Writer(1, 4, greyscale=False, bitdepth=16, transparent=rows[2]).write(
+            pngfile, rows
+        )
+        changed = PNGDecoder.decode(BytesIO(pngfile.getvalue()), digest="blake2b")
+        assert changed["digest"] != image["digest"]
+
+    def test_decoder_digest_bad_options(self):
+        with pytest.raises(ValueError):
+            PNGDecoder(digest="crc32")
+        with pytest.raises(ValueError):
+            PNGDecoder(digest="shake_128")
+        with pytest.raises(ValueError):
+            PNGDecoder(digest="sha256", metadata_only=True)
+        with pytest.raises(ValueError):
+            PNGDecoder(keep_pixels=False).decode_into(BytesIO(), bytearray(16))
@@ -0,0 +1,92 @@
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing.shared_memory import SharedMemory
+
+import png
+import pytest
+
+from vpypng import PNGDecodeException, PNGDecoder, PNGSharedPixels
+
+GOOD_IMAGES_PATHS = sorted(glob.glob("./tests/testimages/good_*.png"))[:6]
+
+
+class TestPngSharedPixels:
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_shared_pixels_decode_files(self, jobs):
+        names = []
+
+        for path, handle in zip(
+            GOOD_IMAGES_PATHS, PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS, jobs)
+        ):
+            with open(path, "rb") as pngfile:
+                expected = PNGDecoder.decode(pngfile)["pixels"]
+
+            with handle:
+                assert handle.pixels.shape == expected.shape
+                assert handle.pixels.tobytes() == expected.tobytes()
+                names.append(handle.name)
+
+            assert handle.closed
+
+        assert len(names) == len(GOOD_IMAGES_PATHS)
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                SharedMemory(name=name)
+
+    def test_shared_pixels_decode_options(self):
+        handles = list(PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS, 2, mode="RGBA8"))
+
+        for path, handle in zip(GOOD_IMAGES_PATHS, handles):
+            expected = png.Reader(filename=path).asRGBA8()[2]
+            assert handle.pixels.tobytes() == b"".join(bytes(row) for row in expected)
+            handle.close()
+
+    def test_shared_pixels_close_with_views(self):
+        handle = next(PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS[:1]))
+        row = handle.pixels.row(0)
+
+        with pytest.raises(BufferError):
+            handle.close()
+
+        row.release()
+        handle.close()
+        handle.close()
+
+    def test_shared_pixels_stop_early(self):
+        handles = PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS, 2)
+        first = next(handles)
+        handles.close()
+
+        assert not first.closed
+        first.close()
+
+    def test_shared_pixels_bounded_in_flight(self, monkeypatch):
+        submitted = []
+        submit = ProcessPoolExecutor.submit
+
+        def counting_submit(executor, *args):
+            submitted.append(args)
+            return submit(executor, *args)
+
+        monkeypatch.setattr(ProcessPoolExecutor, "submit", counting_submit)
+        handles = PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS * 4, 2)
+
+        # Two decodes per process run ahead of the caller
+        with next(handles):
+            assert len(submitted) == 4
+
+        for handle in handles:
+            handle.close()
+
+        assert len(submitted) == 24
+
+    def test_shared_pixels_bad_image(self, tmp_path):
+        image_path = tmp_path / "bad.png"
+        image_path.write_bytes(b"\x89PNG\r\n\x1a\n")
+
+        with pytest.raises(PNGDecodeException):
+            list(PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS[:2] + [image_path], 2))
+
+        with pytest.raises(ValueError):
+            next(PNGSharedPixels.decode_files(GOOD_IMAGES_PATHS, mode="CMYK8"))
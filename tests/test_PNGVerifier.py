@@ -0,0 +1,60 @@
+import glob
+from pathlib import Path
+from zlib import compress, crc32
+
+from vpypng import PNGVerifier
+
+
+def replace_idat(image_path, idat_data):
+    image_bytes = Path(image_path).read_bytes()
+    start = image_bytes.index(b"IDAT") - 4
+    end = image_bytes.index(b"IEND") - 4
+    return (
+        image_bytes[:start]
+        + len(idat_data).to_bytes(4, "big")
+        + b"IDAT"
+        + idat_data
+        + crc32(b"IDAT" + idat_data).to_bytes(4, "big")
+        + image_bytes[end:]
+    )
+
+
+class TestPngVerifier:
+    def test_verifier_good_images(self):
+        for report in PNGVerifier.verify_files(
+            sorted(glob.glob("./tests/testimages/good_*.png")), jobs=1
+        ):
+            assert report["ok"], report
+            assert report["inflated_size"] == report["expected_size"]
+
+    def test_verifier_bad_chunk_images(self):
+        BAD_IMAGES_PATHS = [
+            "./tests/testimages/bad_chunk_crc_mismatch.png",
+            "./tests/testimages/bad_idat_nonconsecutive.png",
+            "./tests/testimages/bad_srgb_misordered.png",
+            "./tests/testimages/bad_signature_mismatch.png",
+        ]
+        for report in PNGVerifier.verify_files(BAD_IMAGES_PATHS, jobs=2):
+            assert not report["ok"]
+            assert report["errors"]
+
+    def test_verifier_idat_wrong_size(self):
+        # good_normal_one-black-pixel.png is a single 8 bit greyscale pixel
+        image_path = "./tests/testimages/good_normal_one-black-pixel.png"
+
+        report = PNGVerifier.verify(replace_idat(image_path, compress(bytes(3))))
+
+        assert not report["ok"]
+        assert report["inflated_size"] == 3
+
+    def test_verifier_idat_incomplete(self):
+        image_path = "./tests/testimages/good_normal_one-black-pixel.png"
+
+        report = PNGVerifier.verify(replace_idat(image_path, compress(bytes(2))[:-4]))
+
+        assert report["errors"] == ["Image data zlib stream is incomplete"]
+
+    def test_verifier_missing_file(self):
+        report = PNGVerifier.verify_files(["tests/testimages/incorrect.png"])[0]
+
+        assert not report["ok"]
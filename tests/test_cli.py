@@ -0,0 +1,87 @@
+import glob
+import json
+import os
+import shutil
+
+import pytest
+
+from vpypng import cli
+from vpypng.cli import expand_inputs, main, run
+
+
+def read_reports(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+class TestCli:
+    def test_cli_expand_inputs(self):
+        directory_paths = expand_inputs(["./tests/testimages"])
+        pattern_paths = expand_inputs(["./tests/testimages/good_t*.png"])
+
+        assert len(directory_paths) == len(glob.glob("./tests/testimages/*.png"))
+        assert "./tests/testimages/good_text.png" in pattern_paths
+        assert all("/good_t" in path for path in pattern_paths)
+
+    def test_cli_info(self, capsys):
+        assert main(["info", "./tests/testimages/good_text.png"]) == 0
+
+        (report,) = read_reports(capsys)
+        assert report["chunks"] == ["IHDR", "tEXt", "IDAT", "tEXt", "IEND"]
+        assert (report["width"], report["height"]) == (1, 1)
+
+    def test_cli_verify_jobs(self, capsys):
+        image_paths = [
+            "./tests/testimages/good_text.png",
+            "./tests/testimages/bad_idat_nonconsecutive.png",
+        ]
+
+        assert main(["verify", "--jobs", "2"] + image_paths) == 1
+
+        reports = read_reports(capsys)
+        assert [report["path"] for report in reports] == image_paths
+        assert [report["ok"] for report in reports] == [True, False]
+
+    def test_cli_strip(self, capsys, tmp_path):
+        image_path = tmp_path / "image.png"
+        shutil.copy("./tests/testimages/good_text.png", image_path)
+
+        assert main(["strip", str(image_path)]) == 0
+        assert main(["info", str(image_path)]) == 0
+
+        reports = read_reports(capsys)
+        assert reports[0]["removed"] == ["tEXt", "tEXt"]
+        assert reports[1]["chunks"] == ["IHDR", "IDAT", "IEND"]
+
+    def test_cli_bad_file(self, capsys):
+        assert main(["info", "./tests/testimages/bad_signature_empty.png"]) == 1
+
+        (report,) = read_reports(capsys)
+        assert not report["ok"]
+
+    def test_cli_unexpected_error_keeps_going(self):
+        def command(path):
+            if "bad" in path:
+                raise KeyError(path)
+            return {"path": path}
+
+        reports = list(run(command, ["bad.png", "good.png"]))
+
+        assert reports[0]["ok"] is False
+        assert reports[0]["errors"] == ["KeyError: 'bad.png'"]
+        assert reports[1] == {"path": "good.png"}
+
+    def test_cli_strip_failed_write_keeps_original(self, monkeypatch, tmp_path):
+        image_path = tmp_path / "image.png"
+        shutil.copy("./tests/testimages/good_text.png", image_path)
+        original = image_path.read_bytes()
+
+        def failing_replace(source, destination):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(cli.os, "replace", failing_replace)
+
+        with pytest.raises(OSError):
+            cli.strip(str(image_path))
+
+        assert image_path.read_bytes() == original
+        assert os.listdir(tmp_path) == ["image.png"]
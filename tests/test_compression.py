@@ -0,0 +1,59 @@
+import zlib
+from io import BytesIO
+
+import png
+import pytest
+
+from vpypng import PNGDecoder, get_backend, set_backend
+from vpypng.compression import AUTOMATIC_BACKENDS, load_backend
+
+
+class TestCompressionBackend:
+    def test_backend_automatic(self):
+        backend = set_backend()
+
+        assert backend.name in AUTOMATIC_BACKENDS
+        assert get_backend() is backend
+
+    def test_backend_forced(self):
+        try:
+            backend = set_backend("zlib")
+
+            assert get_backend().module is zlib
+            assert backend.crc32(b"IEND") == zlib.crc32(b"IEND")
+            assert backend.decompress(backend.compress(b"vpypng", 9)) == b"vpypng"
+        finally:
+            set_backend()
+
+    def test_backend_used_by_decoder(self):
+        pngfile = BytesIO()
+        png.Writer(2, 1, greyscale=True).write(pngfile, [[10, 20]])
+
+        try:
+            set_backend("zlib")
+            pixels = PNGDecoder.decode(BytesIO(pngfile.getvalue()))["pixels"]
+        finally:
+            set_backend()
+
+        assert list(pixels.data) == [10, 20]
+
+    def test_backend_used_for_text(self, monkeypatch):
+        with open("./tests/testimages/good_ztxt.png", "rb") as pngfile:
+            image = PNGDecoder.decode(pngfile)
+
+        inflated = []
+        backend = set_backend("zlib")
+        monkeypatch.setattr(
+            backend, "decompress", lambda data: inflated.append(data) or b"text"
+        )
+
+        try:
+            assert set(image["ztxt_data"].values()) == {"text"}
+        finally:
+            set_backend()
+
+        assert len(inflated) == len(image["ztxt_data"])
+
+    def test_backend_unknown(self):
+        with pytest.raises(ValueError):
+            load_backend("lzma")
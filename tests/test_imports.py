@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+
+def loaded_modules(statement):
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            statement + "; import sys; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+class TestImports:
+    def test_import_package_is_lazy(self):
+        modules = loaded_modules("import vpypng")
+
+        assert "vpypng.PNGDecoder" not in modules
+        assert "vpypng.PNGCodec" not in modules
+
+    def test_import_decoder_skips_hashlib(self):
+        modules = loaded_modules("import vpypng.PNGDecoder")
+
+        assert "vpypng.digest" in modules
+        assert "hashlib" not in modules
+
+    def test_import_names_are_classes(self):
+        import vpypng.PNGDecoder
+        from vpypng import APNGDecoder, PNGDecodeException, PNGDecoder
+
+        assert isinstance(PNGDecoder, type)
+        assert issubclass(APNGDecoder, PNGDecoder)
+        assert issubclass(PNGDecodeException, Exception)
+        assert "PNGVerifier" in dir(vpypng)
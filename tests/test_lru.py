@@ -0,0 +1,34 @@
+from vpypng.lru import ByteBudgetLRU
+
+
+class TestByteBudgetLRU:
+    def test_lru_evicts_least_recently_used(self):
+        cache = ByteBudgetLRU(max_bytes=6)
+
+        for key in [b"a", b"b", b"a", b"c"]:
+            cache.get_or_create(key, lambda: key * 3, len)
+
+        assert len(cache) == 2
+        assert cache.stats() == {
+            "entries": 2,
+            "current_bytes": 6,
+            "max_bytes": 6,
+            "hits": 1,
+            "misses": 3,
+            "evictions": 1,
+        }
+        assert cache.get_or_create(b"a", lambda: b"new", len) == b"aaa"
+        assert cache.get_or_create(b"b", lambda: b"new", len) == b"new"
+
+    def test_lru_skips_values_over_budget(self):
+        cache = ByteBudgetLRU(max_bytes=2)
+
+        assert cache.get_or_create(b"a", lambda: b"aaa", len) == b"aaa"
+        assert len(cache) == 0
+        assert cache.current_bytes == 0
+
+        cache.get_or_create(b"b", lambda: b"bb", len)
+        cache.resize(1)
+
+        assert len(cache) == 0
+        assert cache.evictions == 1
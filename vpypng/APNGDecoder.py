@@ -0,0 +1,446 @@
+from io import SEEK_CUR, BufferedIOBase
+from struct import unpack
+
+from .convert import mode_converter
+from .exceptions import PNGDecodeException
+from .PNGDecoder import PNGDecoder
+from .PNGPixelBuffer import PNGPixelBuffer
+from .PNGRowDecoder import PNGRowDecoder
+
+APNG_DISPOSE_OP_NONE, APNG_DISPOSE_OP_BACKGROUND, APNG_DISPOSE_OP_PREVIOUS = range(3)
+APNG_BLEND_OP_SOURCE, APNG_BLEND_OP_OVER = range(2)
+
+# Chunks that make up a frame, the only ones read again when seeking to a frame
+APNG_FRAME_CHUNK_TYPES = frozenset([b"fcTL", b"fdAT", b"IDAT"])
+
+
+def blend_over(canvas, start: int, row, itemsize: int):
+    # Alpha composites an RGBA row over the canvas bytes starting at start
+    max_value = 255 if itemsize == 1 else 65535
+    alphas = row[3::4] if itemsize == 1 else row[6::8] + row[7::8]
+
+    if not alphas.strip(b"\xff"):
+        canvas[start : start + len(row)] = row
+        return
+
+    if not alphas.strip(b"\x00"):
+        return
+
+    source = row if itemsize == 1 else memoryview(row).cast("H")
+    target = (
+        memoryview(canvas)[start : start + len(row)]
+        if itemsize == 1
+        else memoryview(canvas)[start : start + len(row)].cast("H")
+    )
+
+    for i in range(0, len(row) // itemsize, 4):
+        source_alpha = source[i + 3]
+
+        if source_alpha == max_value:
+            target[i : i + 4] = source[i : i + 4]
+        elif source_alpha:
+            target_alpha = target[i + 3] * (max_value - source_alpha) // max_value
+            alpha = source_alpha + target_alpha
+
+            for k in range(3):
+                target[i + k] = (
+                    source[i + k] * source_alpha + target[i + k] * target_alpha
+                ) // alpha
+
+            target[i + 3] = alpha
+
+
+class APNGDecoder(PNGDecoder):
+    # Decodes an animated PNG one frame at a time. frames() yields
+    # (frame_control, canvas) pairs, where canvas is a PNGPixelBuffer of the whole
+    # animation in RGBA with every dispose and blend op applied. The same canvas is
+    # updated in place for every frame, so only one canvas and the rows of the frame
+    # being decoded are ever held. Copy the canvas to keep a frame around.
+    @staticmethod
+    def decode(file: BufferedIOBase):
+        return APNGDecoder(file).frames()
+
+    def __init__(self, file: BufferedIOBase):
+        self.canvas = None
+        self.converter = None
+        self.frame_control = None
+        self.next_frame_control = None
+        self.frame_decoder = None
+        self.expected_sequence_number = 0
+        self.finished_frame = None
+        self.saved_region = None
+        self.index = None
+        super().__init__(file)
+        self.first_chunk_offset = self.file.tell()
+
+    def _decode_chunks(self):
+        # Chunks are read lazily by frames()
+        pass
+
+    def frames(self):
+        while self.keep_decoding:
+            chunk_type, chunk, chunk_size = self._read_chunk_and_check_crc()
+            self._do_chunk_parsing(chunk_type, chunk, chunk_size)
+
+            if self.finished_frame is not None:
+                frame_control, self.finished_frame = self.finished_frame, None
+                yield frame_control, self.canvas
+                self._dispose_frame(frame_control)
+
+            # The next frame starts only once the previous one has been disposed
+            if self.next_frame_control is not None:
+                self._start_frame()
+
+        self._release_file()
+
+    def frame(self, number: int):
+        # Random access to a single frame, returned like frames() does. Only the
+        # frames the canvas depends on are inflated, starting from the closest frame
+        # that does not need the canvas before it. Needs a seekable file, and moves
+        # its position, so frames() can't be used on the same decoder afterwards.
+        index = self.frame_index()
+
+        if not 0 <= number < len(index):
+            raise IndexError("APNG has no frame {}".format(number))
+
+        first = self._first_frame_to_decode(number)
+
+        if self.canvas is not None:
+            self.canvas.data[:] = bytes(len(self.canvas.data))
+
+        for frame_number in range(first, number + 1):
+            entry = index[frame_number]
+
+            # A frame disposed to the previous one leaves no trace on later frames
+            if (
+                frame_number < number
+                and frame_number > 0
+                and entry["dispose_op"] == APNG_DISPOSE_OP_PREVIOUS
+            ):
+                continue
+
+            self._decode_indexed_frame(entry)
+            frame_control, self.finished_frame = self.finished_frame, None
+
+            if frame_number < number:
+                self._dispose_frame(frame_control)
+
+        return frame_control, self.canvas
+
+    def frame_index(self):
+        # Offsets of every frame's chunks, found by walking the chunk headers and
+        # seeking over the data, so nothing is inflated. Chunks before the first
+        # frame are parsed, as the frames need IHDR, PLTE and tRNS.
+        if self.index is not None:
+            return self.index
+
+        if not self.file.seekable():
+            raise ValueError("Seeking to a frame needs a seekable file")
+
+        parse_metadata = self.image["width"] is None
+        index = []
+        self.file.seek(self.first_chunk_offset)
+
+        while True:
+            offset = self.file.tell()
+            chunk_header = self.file.read(8)
+
+            if len(chunk_header) < 8:
+                raise PNGDecodeException("File ended before the IEND chunk")
+
+            chunk_size = unpack(">I", chunk_header[:4])[0]
+            chunk_type = chunk_header[4:]
+
+            if chunk_type == b"IEND":
+                break
+
+            if chunk_type == b"fcTL":
+                if chunk_size != 26:
+                    raise PNGDecodeException("fcTL chunk must be 26 bytes long")
+
+                index.append(self._index_entry(offset, self.file.read(26)))
+                self.file.seek(4, SEEK_CUR)
+                continue
+
+            if chunk_type in APNG_FRAME_CHUNK_TYPES:
+                if chunk_type == b"IDAT":
+                    self.image_data_started = True
+
+                if index:
+                    index[-1]["chunk_offsets"].append(offset)
+
+                self.file.seek(chunk_size + 4, SEEK_CUR)
+            elif parse_metadata:
+                self.file.seek(offset)
+                self._do_chunk_parsing(*self._read_chunk_and_check_crc())
+            else:
+                self.file.seek(chunk_size + 4, SEEK_CUR)
+
+        self.index = index
+        return index
+
+    # APNG CHUNKS PARSING SECTION START
+    def _parse_FCTL(self, chunk, chunk_size):
+        if chunk_size != 26:
+            raise PNGDecodeException("fcTL chunk must be 26 bytes long")
+
+        (
+            sequence_number,
+            width,
+            height,
+            x_offset,
+            y_offset,
+            delay_num,
+            delay_den,
+            dispose_op,
+            blend_op,
+        ) = unpack(">IIIIIHHBB", chunk.getvalue())
+
+        self._check_sequence_number(sequence_number)
+
+        if self.image["width"] is None:
+            raise PNGDecodeException("IHDR chunk must be before fcTL chunk")
+
+        if (
+            width == 0
+            or height == 0
+            or x_offset + width > self.image["width"]
+            or y_offset + height > self.image["height"]
+        ):
+            raise PNGDecodeException("Frame is outside of the image")
+
+        if dispose_op > APNG_DISPOSE_OP_PREVIOUS or blend_op > APNG_BLEND_OP_OVER:
+            raise PNGDecodeException("Unknown dispose or blend op")
+
+        if self.frame_control is None and not self.image_data_started:
+            # The first frame is the default image, it must cover the whole canvas
+            if (x_offset, y_offset, width, height) != (
+                0,
+                0,
+                self.image["width"],
+                self.image["height"],
+            ):
+                raise PNGDecodeException("First frame must cover the whole image")
+
+        self._finish_frame()
+
+        self.next_frame_control = {
+            "sequence_number": sequence_number,
+            "width": width,
+            "height": height,
+            "x_offset": x_offset,
+            "y_offset": y_offset,
+            "delay_num": delay_num,
+            "delay_den": delay_den,
+            "delay": delay_num / (delay_den or 100),
+            "dispose_op": dispose_op,
+            "blend_op": blend_op,
+        }
+
+    def _parse_FDAT(self, chunk, chunk_size):
+        if chunk_size < 4:
+            raise PNGDecodeException("fdAT chunk is too short")
+
+        data = chunk.getvalue()
+        self._check_sequence_number(unpack(">I", data[:4])[0])
+
+        if self.frame_decoder is None or not self.image_data_started:
+            raise PNGDecodeException("fdAT chunk without a preceding fcTL chunk")
+
+        self._decode_frame_data(data[4:])
+
+    # APNG CHUNKS PARSING SECTION END
+
+    # PIXEL DATA SECTION START
+    def _parse_IDAT(self, chunk, chunk_size):
+        self.image_data_started = True
+
+        # Without a preceding fcTL the default image is not part of the animation
+        if self.frame_decoder is not None:
+            self._decode_frame_data(chunk.getvalue())
+
+    def _parse_IEND(self, chunk, chunk_size):
+        self.keep_decoding = False
+        self._finish_frame()
+
+    def _index_entry(self, offset, data):
+        (
+            sequence_number,
+            width,
+            height,
+            x_offset,
+            y_offset,
+            _,
+            _,
+            dispose_op,
+            blend_op,
+        ) = unpack(">IIIIIHHBB", data)
+
+        return {
+            "sequence_number": sequence_number,
+            "width": width,
+            "height": height,
+            "x_offset": x_offset,
+            "y_offset": y_offset,
+            "dispose_op": dispose_op,
+            "blend_op": blend_op,
+            "chunk_offsets": [offset],
+        }
+
+    def _covers_canvas(self, entry):
+        return (
+            entry["x_offset"],
+            entry["y_offset"],
+            entry["width"],
+            entry["height"],
+        ) == (
+            0,
+            0,
+            self.image["width"],
+            self.image["height"],
+        )
+
+    def _first_frame_to_decode(self, number):
+        # Walks back to a frame that can be drawn on a cleared canvas: the first frame,
+        # a frame replacing the whole canvas, or one after a frame that was disposed
+        # to background over the whole canvas
+        index = self.index
+
+        for frame_number in range(number, 0, -1):
+            entry = index[frame_number]
+
+            if (
+                self._covers_canvas(entry)
+                and entry["blend_op"] == APNG_BLEND_OP_SOURCE
+                and (
+                    frame_number == number
+                    or entry["dispose_op"] != APNG_DISPOSE_OP_PREVIOUS
+                )
+            ):
+                return frame_number
+
+            previous = index[frame_number - 1]
+
+            if (
+                self._covers_canvas(previous)
+                and previous["dispose_op"] == APNG_DISPOSE_OP_BACKGROUND
+            ):
+                return frame_number
+
+        return 0
+
+    def _decode_indexed_frame(self, entry):
+        self.expected_sequence_number = entry["sequence_number"]
+
+        for offset in entry["chunk_offsets"]:
+            self.file.seek(offset)
+            self._do_chunk_parsing(*self._read_chunk_and_check_crc())
+
+            if self.next_frame_control is not None:
+                self._start_frame()
+
+        self._finish_frame()
+
+    def _check_sequence_number(self, sequence_number):
+        if sequence_number != self.expected_sequence_number:
+            raise PNGDecodeException(
+                "Expected APNG sequence number {}, found {}".format(
+                    self.expected_sequence_number, sequence_number
+                )
+            )
+
+        self.expected_sequence_number += 1
+
+    def _start_frame(self):
+        frame_control = self.frame_control = self.next_frame_control
+        self.next_frame_control = None
+
+        if self.canvas is None:
+            self.canvas = PNGPixelBuffer(
+                self.image["width"],
+                self.image["height"],
+                4,
+                2 if self.image["bit_depth"] == 16 else 1,
+            )
+
+        # Rows are converted at the frame's width, the converter is only rebuilt
+        # when that changes
+        if self.converter is None or self.converter.width != frame_control["width"]:
+            self.converter = mode_converter(
+                self.image,
+                "RGBA16" if self.image["bit_depth"] == 16 else "RGBA8",
+                frame_control["width"],
+            )
+
+        self.frame_decoder = PNGRowDecoder(
+            frame_control["width"],
+            frame_control["height"],
+            self.image["bit_depth"],
+            self.image["color_type"],
+            self.image["interlace_method"],
+        )
+
+        if frame_control["dispose_op"] == APNG_DISPOSE_OP_PREVIOUS:
+            # Disposing the very first frame to the previous one clears it instead
+            if frame_control["sequence_number"] == 0:
+                frame_control["dispose_op"] = APNG_DISPOSE_OP_BACKGROUND
+            else:
+                self.saved_region = self._copy_region(frame_control)
+
+    def _decode_frame_data(self, data):
+        for y, row in self.frame_decoder.decode(data):
+            self._draw_frame_row(y, row)
+
+    def _finish_frame(self):
+        if self.frame_decoder is None:
+            return
+
+        if not self.image_data_started:
+            raise PNGDecodeException("Frame without any image data")
+
+        for y, row in self.frame_decoder.flush():
+            self._draw_frame_row(y, row)
+
+        self.frame_decoder = None
+        self.finished_frame = self.frame_control
+
+    def _draw_frame_row(self, y, row):
+        frame_control, canvas = self.frame_control, self.canvas
+        row = self.converter(row)
+        start = (frame_control["y_offset"] + y) * canvas.row_stride + frame_control[
+            "x_offset"
+        ] * 4 * canvas.itemsize
+
+        if frame_control["blend_op"] == APNG_BLEND_OP_SOURCE:
+            canvas.data[start : start + len(row)] = row
+        else:
+            blend_over(canvas.data, start, row, canvas.itemsize)
+
+    def _region_rows(self, frame_control):
+        canvas = self.canvas
+        length = frame_control["width"] * 4 * canvas.itemsize
+
+        for y in range(frame_control["height"]):
+            start = (frame_control["y_offset"] + y) * canvas.row_stride + frame_control[
+                "x_offset"
+            ] * 4 * canvas.itemsize
+            yield start, start + length
+
+    def _copy_region(self, frame_control):
+        data = self.canvas.data
+        return [data[start:end] for start, end in self._region_rows(frame_control)]
+
+    def _dispose_frame(self, frame_control):
+        data = self.canvas.data
+
+        if frame_control["dispose_op"] == APNG_DISPOSE_OP_BACKGROUND:
+            for start, end in self._region_rows(frame_control):
+                data[start:end] = bytes(end - start)
+        elif frame_control["dispose_op"] == APNG_DISPOSE_OP_PREVIOUS:
+            for (start, end), saved in zip(
+                self._region_rows(frame_control), self.saved_region
+            ):
+                data[start:end] = saved
+            self.saved_region = None
+
+    # PIXEL DATA SECTION END
@@ -0,0 +1,195 @@
+from pathlib import Path
+from struct import pack_into
+
+from .compression import get_backend
+from .filters import (
+    ALLOWED_BIT_DEPTHS,
+    CHANNELS,
+    FILTER_NONE,
+    FILTER_PAETH,
+    filter_row,
+    filter_unit,
+    png_row,
+    row_byte_count,
+)
+from .PNGImage import PNGImage
+
+# IEND never changes, CRC included
+IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+INITIAL_BUFFER_SIZE = 1 << 16
+
+
+class PNGBatchEncoder:
+    # Encodes many small images one after the other, keeping the per image overhead low:
+    # the filtered image data and the output file are built in buffers that are reused
+    # from image to image, the deflate window is sized to the image instead of always
+    # taking 32 KiB, and every file is written with a single write() call.
+    #
+    # Images are mappings with the PNGImage keys width, height, bit_depth, color_type,
+    # pixels and, for palette images, palette. pixels is laid out like PNGPixelBuffer:
+    # one byte per sample below 8 bits and native endian 16 bit samples.
+    def __init__(self, level: int = 6, filter_type: int = FILTER_NONE):
+        if not -1 <= level <= 9:
+            raise ValueError("Compression level must be between -1 and 9")
+
+        if not FILTER_NONE <= filter_type <= FILTER_PAETH:
+            raise ValueError("Unknown filter type {}".format(filter_type))
+
+        self.level = level
+        self.filter_type = filter_type
+        self.image_data = bytearray(INITIAL_BUFFER_SIZE)
+        self.output = bytearray(INITIAL_BUFFER_SIZE)
+
+    def encode(self, image) -> bytes:
+        return bytes(self.output[: self._encode(image)])
+
+    def write(self, file, image) -> int:
+        # Writes to a path or a binary file, returns the number of bytes written
+        size = self._encode(image)
+
+        with memoryview(self.output) as output:
+            if isinstance(file, (str, Path)):
+                with open(file, "wb") as pngfile:
+                    pngfile.write(output[:size])
+            else:
+                file.write(output[:size])
+
+        return size
+
+    def encode_batch(self, images):
+        for image in images:
+            yield self.encode(image)
+
+    def write_batch(self, items) -> int:
+        # items are (path or file, image) pairs, returns the number of images written
+        count = 0
+
+        for file, image in items:
+            self.write(file, image)
+            count += 1
+
+        return count
+
+    def _encode(self, image) -> int:
+        # Builds the PNG file at the start of self.output and returns its size
+        width, height = image["width"], image["height"]
+        bit_depth, color_type = image["bit_depth"], image["color_type"]
+        self._check_header(width, height, bit_depth, color_type)
+
+        palette = b""
+        if color_type == 3:
+            if not image["palette"] or len(image["palette"]) > 2**bit_depth:
+                raise ValueError("Palette images need 1 to 2^bit_depth palette entries")
+            palette = bytes(value for entry in image["palette"] for value in entry)
+
+        backend = get_backend()
+        image_data_size = self._filter_image_data(
+            image["pixels"], width, height, bit_depth, color_type
+        )
+
+        # Small images don't need the 32 KiB window, and a smaller one is much
+        # cheaper to set up
+        window_bits = min(15, max(9, (image_data_size - 1).bit_length()))
+        compressor = backend.compressobj(self.level, 8, window_bits)
+
+        with memoryview(self.image_data) as image_data:
+            stream = compressor.compress(image_data[:image_data_size])
+        stream += compressor.flush()
+
+        size = (
+            8
+            + 25
+            + (len(palette) + 12 if palette else 0)
+            + len(stream)
+            + 12
+            + len(IEND_CHUNK)
+        )
+        if len(self.output) < size:
+            self.output = bytearray(size)
+
+        output = self.output
+        output[0:8] = bytes(PNGImage.PNG_FILE_SIGNATURE)
+        position = self._put_chunk(
+            8,
+            b"IHDR",
+            width.to_bytes(4, "big")
+            + height.to_bytes(4, "big")
+            + bytes([bit_depth, color_type, 0, 0, 0]),
+            backend,
+        )
+
+        if palette:
+            position = self._put_chunk(position, b"PLTE", palette, backend)
+
+        position = self._put_chunk(position, b"IDAT", stream, backend)
+        output[position : position + len(IEND_CHUNK)] = IEND_CHUNK
+
+        return position + len(IEND_CHUNK)
+
+    def _put_chunk(self, position: int, chunk_type: bytes, data, backend) -> int:
+        # Writes the chunk at position in self.output and returns where it ends
+        end = position + 8 + len(data)
+        output = self.output
+        pack_into(">I4s", output, position, len(data), chunk_type)
+        output[position + 8 : end] = data
+        pack_into(">I", output, end, backend.crc32(data, backend.crc32(chunk_type)))
+        return end + 4
+
+    def _filter_image_data(self, pixels, width, height, bit_depth, color_type) -> int:
+        # Fills self.image_data with the filtered rows and returns their total size
+        sample_bytes = width * CHANNELS[color_type] * (2 if bit_depth == 16 else 1)
+        row_bytes = row_byte_count(width, color_type, bit_depth)
+        stride = row_bytes + 1
+        size = stride * height
+
+        source = memoryview(getattr(pixels, "data", pixels)).cast("B")
+
+        if len(source) != sample_bytes * height:
+            raise ValueError(
+                "Pixels must be {} bytes for a {}x{} image, got {}".format(
+                    sample_bytes * height, width, height, len(source)
+                )
+            )
+
+        if len(self.image_data) < size:
+            self.image_data = bytearray(size)
+
+        image_data = self.image_data
+
+        # Unfiltered 8 bit rows are copied straight from the pixels
+        if self.filter_type == FILTER_NONE and bit_depth == 8:
+            for y in range(height):
+                image_data[y * stride] = FILTER_NONE
+                image_data[y * stride + 1 : (y + 1) * stride] = source[
+                    y * sample_bytes : (y + 1) * sample_bytes
+                ]
+            return size
+
+        unit = filter_unit(color_type, bit_depth)
+        previous = None
+
+        for y in range(height):
+            row = png_row(source[y * sample_bytes : (y + 1) * sample_bytes], bit_depth)
+            image_data[y * stride] = self.filter_type
+            image_data[y * stride + 1 : (y + 1) * stride] = filter_row(
+                self.filter_type, row, previous, unit
+            )
+            previous = row
+
+        return size
+
+    @staticmethod
+    def _check_header(width: int, height: int, bit_depth: int, color_type: int):
+        if not (0 < width < 2**31 and 0 < height < 2**31):
+            raise ValueError("Image dimensions must be between 1 and 2^31-1")
+
+        if color_type not in ALLOWED_BIT_DEPTHS:
+            raise ValueError("Unknown color type {}".format(color_type))
+
+        if bit_depth not in ALLOWED_BIT_DEPTHS[color_type]:
+            raise ValueError(
+                "Bit depth {} is not allowed for color type {}".format(
+                    bit_depth, color_type
+                )
+            )
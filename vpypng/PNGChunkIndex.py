@@ -0,0 +1,190 @@
+import json
+import os
+from io import SEEK_CUR, SEEK_END
+from pathlib import Path
+from struct import unpack
+
+from .exceptions import PNGDecodeException
+from .PNGImage import PNGImage
+
+CHUNK_INDEX_VERSION = 1
+CHUNK_INDEX_SUFFIX = ".chunks.json"
+
+
+def _file_stamp(file):
+    # Size and mtime of a path or an open file. In memory files have no mtime.
+    if isinstance(file, (str, Path)):
+        stat = os.stat(file)
+        return stat.st_size, stat.st_mtime_ns
+
+    try:
+        stat = os.fstat(file.fileno())
+        return stat.st_size, stat.st_mtime_ns
+    except (AttributeError, OSError, ValueError):
+        position = file.tell()
+        size = file.seek(0, SEEK_END)
+        file.seek(position)
+        return size, None
+
+
+class PNGChunkIndex:
+    # Type, offset, length and CRC of every chunk in a file, plus its IHDR fields.
+    # Decoders given an index seek straight to the chunks they need instead of
+    # reading the whole file. The index remembers the size and mtime of the file it
+    # was built from and is ignored once they no longer match. Decoders also check
+    # every chunk they read against its recorded header and CRC, and read the file
+    # without the index when one differs.
+    def __init__(self, chunks, ihdr, size: int, mtime_ns=None):
+        self.chunks = chunks
+        self.ihdr = ihdr
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @staticmethod
+    def build(file):
+        if isinstance(file, (str, Path)):
+            with open(file, "rb") as pngfile:
+                return PNGChunkIndex.build(pngfile)
+
+        size, mtime_ns = _file_stamp(file)
+        file.seek(0)
+
+        if list(file.read(8)) != PNGImage.PNG_FILE_SIGNATURE:
+            raise PNGDecodeException
+
+        chunks = []
+        ihdr = None
+
+        while True:
+            offset = file.tell()
+            chunk_header = file.read(8)
+
+            if len(chunk_header) < 8:
+                raise PNGDecodeException("File ended before the IEND chunk")
+
+            chunk_size = unpack(">I", chunk_header[:4])[0]
+            chunk_type = chunk_header[4:]
+
+            if chunk_type == b"IHDR" and chunk_size == 13:
+                ihdr_data = file.read(13)
+
+                if len(ihdr_data) < 13:
+                    raise PNGDecodeException("File ended before the IEND chunk")
+
+                ihdr = dict(
+                    zip(
+                        [
+                            "width",
+                            "height",
+                            "bit_depth",
+                            "color_type",
+                            "compression_method",
+                            "filter_method",
+                            "interlace_method",
+                        ],
+                        unpack(">IIBBBBB", ihdr_data),
+                    )
+                )
+            else:
+                file.seek(chunk_size, SEEK_CUR)
+
+            crc_bytes = file.read(4)
+
+            if len(crc_bytes) < 4:
+                raise PNGDecodeException("File ended before the IEND chunk")
+
+            chunks.append((chunk_type, offset, chunk_size, unpack(">I", crc_bytes)[0]))
+
+            if chunk_type == b"IEND":
+                break
+
+        if ihdr is None:
+            raise PNGDecodeException("IHDR chunk is missing")
+
+        return PNGChunkIndex(chunks, ihdr, size, mtime_ns)
+
+    def matches(self, file) -> bool:
+        # Files without an mtime, like in memory ones, can't be told apart from other
+        # files of the same size and never match
+        size, mtime_ns = _file_stamp(file)
+        return mtime_ns is not None and size == self.size and mtime_ns == self.mtime_ns
+
+    def find(self, chunk_type: bytes):
+        return [chunk for chunk in self.chunks if chunk[0] == chunk_type]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "version": CHUNK_INDEX_VERSION,
+                "size": self.size,
+                "mtime_ns": self.mtime_ns,
+                "ihdr": self.ihdr,
+                "chunks": [
+                    [chunk_type.decode("latin-1"), offset, length, crc]
+                    for chunk_type, offset, length, crc in self.chunks
+                ],
+            },
+            separators=(",", ":"),
+        )
+
+    @staticmethod
+    def from_json(text: str):
+        fields = json.loads(text)
+
+        if fields.get("version") != CHUNK_INDEX_VERSION:
+            return None
+
+        return PNGChunkIndex(
+            [
+                (chunk_type.encode("latin-1"), offset, length, crc)
+                for chunk_type, offset, length, crc in fields["chunks"]
+            ],
+            fields["ihdr"],
+            fields["size"],
+            fields["mtime_ns"],
+        )
+
+    def save(self, path):
+        Path(path).write_text(self.to_json())
+
+    @staticmethod
+    def load(path, image_path):
+        # Returns the saved index for image_path, or None if it is missing, unreadable
+        # or stale
+        try:
+            index = PNGChunkIndex.from_json(Path(path).read_text())
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if index is None or not index.matches(image_path):
+            return None
+
+        return index
+
+    @staticmethod
+    def sidecar_path(image_path) -> Path:
+        image_path = Path(image_path)
+        return image_path.with_name(image_path.name + CHUNK_INDEX_SUFFIX)
+
+    @staticmethod
+    def for_file(image_path, save: bool = True):
+        # Loads the sidecar index next to image_path, rebuilding (and saving) it when
+        # it is missing or stale
+        sidecar = PNGChunkIndex.sidecar_path(image_path)
+        index = PNGChunkIndex.load(sidecar, image_path)
+
+        if index is None:
+            index = PNGChunkIndex.build(image_path)
+
+            if save:
+                index.save(sidecar)
+
+        return index
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __repr__(self):
+        return "PNGChunkIndex({} chunks, {}x{})".format(
+            len(self.chunks), self.ihdr["width"], self.ihdr["height"]
+        )
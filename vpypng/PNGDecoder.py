@@ -1,28 +1,182 @@
-import string
-from datetime import datetime, timezone
-from io import BufferedIOBase, BytesIO
-from struct import unpack
+from array import array
+from io import SEEK_CUR, BufferedIOBase, BytesIO
+from struct import iter_unpack, pack, unpack, unpack_from
+from sys import byteorder
 
+from .alpha import ColorKeyComposite, PaletteComposite, alpha_stage
+from .convert import MODES, mode_converter
 from .crc import check_crc_is_same
-from .deflate import deflate
+from .deferred import DeferredInflateMap, latin1_text, utf8_text
+from .digest import PixelDigest, check_algorithm
 from .exceptions import PNGDecodeException
+from .filters import CHANNELS, native_row
+from .gamma import gamma_stage
+from .pixelstats import PixelStatistics, check_statistics
 from .PNGImage import PNGImage
+from .PNGImageInfo import PNGImageInfo
+from .PNGPixelBuffer import PNGPixelBuffer
+from .PNGRowDecoder import PNGRowDecoder
+from .profiles import ICC_PROFILE_CACHE
+from .readahead import ReadAheadBuffer
+from .restarts import RESTART_CHUNK_TYPE, BlockInflater, parse_restart_points
+
+ALLOWED_KEYWORDS = frozenset(
+    [
+        keyword.title()
+        for keyword in [
+            "title",
+            "author",
+            "description",
+            "copyright",
+            "creation time",
+            "software",
+            "disclaimer",
+            "warning",
+            "source",
+            "comment",
+        ]
+    ]
+    + ["XML:com.adobe.xmp"]
+)
+
+# sPLT entries are red, green, blue, alpha and a 2 byte frequency
+SPLT_ENTRY_FORMATS = {8: ">BBBBH", 16: ">HHHHH"}
+
+# APNG chunks, in the same form as the PNGImage chunk signatures
+PNG_ACTL_CHUNK_SIGNATURE = list(b"acTL")
+PNG_FCTL_CHUNK_SIGNATURE = list(b"fcTL")
+PNG_FDAT_CHUNK_SIGNATURE = list(b"fdAT")
+
+# Private chunk with zlib restart points, for inflating blocks of rows in parallel
+PNG_VPRS_CHUNK_SIGNATURE = list(RESTART_CHUNK_TYPE)
 
 
 class PNGDecoder:
     @staticmethod
-    def decode(file: BufferedIOBase):
-        decoder = PNGDecoder(file)
+    def decode(file: BufferedIOBase, **options):
+        decoder = PNGDecoder(file, **options)
         return decoder.image
 
-    def __init__(self, file: BufferedIOBase):
+    def __init__(
+        self,
+        file: BufferedIOBase = None,
+        metadata_only: bool = False,
+        gamma=None,
+        premultiply: bool = False,
+        background=None,
+        chunk_index=None,
+        mode=None,
+        statistics=None,
+        digest=None,
+        keep_pixels: bool = True,
+    ):
+        # Options, kept when the decoder is reused with decode_into()
+        self.metadata_only = metadata_only
+        self.gamma = gamma
+        self.premultiply = premultiply
+        self.background = background
+        # Fixed output format, one of convert.MODES, whatever the file stores
+        self.mode = mode
+        self.mode_converter = None
+        # Names from pixelstats.STATISTICS, gathered while the rows are stored
+        self.statistics = None if statistics is None else check_statistics(statistics)
+        self.pixel_statistics = None
+        # hashlib algorithm for a canonical digest of the pixels, see digest.py
+        self.digest = None if digest is None else check_algorithm(digest)
+        self.pixel_digest = None
+        # Without pixels a decode only gathers the statistics and digest
+        self.keep_pixels = keep_pixels
+        self.row_decoder = None
+        self.block_inflater = None
+        self.output = None
+
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(
+                    "Unknown mode {!r}, expected one of {}".format(
+                        mode, ", ".join(MODES)
+                    )
+                )
+
+            if gamma is not None or premultiply or background is not None:
+                raise ValueError(
+                    "mode can't be combined with gamma, premultiply or background"
+                )
+
+        if metadata_only and (statistics is not None or digest is not None):
+            raise ValueError(
+                "Metadata only decoders have no pixels for statistics or digests"
+            )
+
+        # Without a file the decoder only waits for decode_into()
+        if file is not None:
+            self._decode_file(file, chunk_index)
+
+    def decode_into(self, file: BufferedIOBase, buffer, stride=None, chunk_index=None):
+        # Decodes file with this decoder's options, writing the pixels straight into
+        # buffer (a bytearray, mmap, NumPy array or any writable bytes-like object)
+        # with rows stride bytes apart. The buffer is checked against the image size
+        # before any pixels are written. buffer can also be a function that is called
+        # with the width, height, channels and bytes per sample once they are known,
+        # and returns the buffer. The decoder can decode any number of files this way,
+        # images with the same header reuse its row decoder.
+        if self.metadata_only or not self.keep_pixels:
+            raise ValueError(
+                "Decoders that don't keep pixels can't decode into buffers"
+            )
+
+        self.output = (buffer, stride)
+
+        try:
+            self._decode_file(file, chunk_index)
+        finally:
+            self.output = None
+
+        return self.image
+
+    def _decode_file(self, file: BufferedIOBase, chunk_index):
         # Required variables
-        self.file = file
-        self.image = PNGImage()
-        self.keep_decoding = True
+        self.file = ReadAheadBuffer.wrap(file)
+        self.chunk_index = chunk_index
+        self._reset_image()
 
         # Start decoding
         self._check_file_signature()
+        self._decode_chunks()
+
+        if not self.keep_decoding:
+            self._release_file()
+
+    def _reset_image(self):
+        # Metadata only decodes of seekable files step over the image data unread
+        self.skip_image_data = self.metadata_only and self.file.seekable()
+        self.image = PNGImageInfo() if self.metadata_only else PNGImage()
+        self.keep_decoding = True
+        # Set by the first IDAT chunk, chunks that must come before it check it
+        self.image_data_started = False
+        # The previous file's row decoder, reused when the header is the same
+        self.spare_row_decoder, self.row_decoder = self.row_decoder, None
+        self.pixels = None
+        self.restart_points = None
+        self._close_block_inflater()
+        # Bytes read ahead past IEND from a stream that can't seek back over them
+        self.unused_data = b""
+
+    def _decode_chunks(self):
+        # A stale index is never used, the file is read chunk by chunk instead. An index
+        # whose size and mtime match but whose chunks don't is found out chunk by chunk,
+        # and the file is then decoded again from the start without it.
+        if (
+            self.chunk_index is not None
+            and self.file.seekable()
+            and self.chunk_index.matches(self.file)
+        ):
+            if self._decode_indexed_chunks():
+                return
+
+            self._reset_image()
+            self.file.seek(0)
+            self._check_file_signature()
 
         while self.keep_decoding:
             chunk_type, chunk, chunk_size = self._read_chunk_and_check_crc()
@@ -54,41 +208,37 @@ class PNGDecoder:
 
     def _parse_PLTE(self, chunk, chunk_size):
         print("Found PLTE chunk")  # Remove after defining all chunks
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             raise PNGDecodeException("PLTE chunk must be before IDAT chunk")
 
         if chunk_size % 3 != 0:
             raise PNGDecodeException("PLTE chunk size must be divisible by 3")
 
-        palette = []
-
-        for i in range(chunk_size // 3):
-            red = self._parse_int_from_byte(chunk.read(1))
-            green = self._parse_int_from_byte(chunk.read(1))
-            blue = self._parse_int_from_byte(chunk.read(1))
-            palette.append((red, green, blue))
-
-        self.image["palette"] = palette
+        self.image["palette"] = tuple(iter_unpack("BBB", chunk.getvalue()))
 
     def _parse_IDAT(self, chunk, chunk_size):
         print("Found IDAT chunk")  # Remove after defining all chunks
-        if self.image["idata"] is None:
-            self.image["idat"] = []
-            self.image["idat"].append(chunk)
-        else:
-            self.image["idat"].append(chunk)
+        # The chunks are streamed through the row decoder and never kept, so memory is
+        # bounded by the largest chunk
+        self.image_data_started = True
+
+        if not self.metadata_only:
+            self._decode_image_data(chunk.getvalue())
 
     def _parse_IEND(self, chunk, chunk_size):
         print("Found IEND chunk")  # Remove after defining all chunks
         self.keep_decoding = False
 
+        if not self.metadata_only:
+            self._finish_image_data()
+
     # CRITICAL CHUNKS PARSING SECTION END
 
     # ANCILLARY CHUNKS PARSING SECTION START
     def _parse_CHRM(self, chunk, chunk_size):
         print("Found CHRM chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None or self.image["palette"] is not None:
+        if self.image_data_started or self.image["palette"] is not None:
             return
 
         if chunk_size != 32:  # 8 bytes for each of the 4 points
@@ -116,7 +266,7 @@ class PNGDecoder:
     def _parse_GAMA(self, chunk, chunk_size):
         print("Found GAMA chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None or self.image["palette"] is not None:
+        if self.image_data_started or self.image["palette"] is not None:
             return
 
         try:
@@ -128,7 +278,7 @@ class PNGDecoder:
     def _parse_ICCP(self, chunk, chunk_size):
         print("Found ICCP chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None or self.image["palette"] is not None:
+        if self.image_data_started or self.image["palette"] is not None:
             return
 
         if self.image["srgb"] is not None:
@@ -137,37 +287,27 @@ class PNGDecoder:
             )
 
         try:
-            profile_name, null_is_seen, bytes_parsed = "", False, 0
-
-            while not null_is_seen and bytes_parsed < chunk_size:
-                char = self._parse_int_from_byte(chunk.read(1))
-                bytes_parsed += 1
+            data = chunk.getvalue()
+            profile_name, offset = self._split_at_null(data, 0)
+            compression_method = data[offset]
 
-                if char == 0:
-                    null_is_seen = True
-                    break
-
-                profile_name += chr(char)
-
-            compression_method = self._parse_int_from_byte(chunk.read(1))
-            bytes_parsed += 1
-
-            profile_info = chunk.read(chunk_size - bytes_parsed)
+            if compression_method != 0:
+                return
 
-            profile_info = deflate(profile_info)
+            iccp = DeferredInflateMap(
+                items={"profile_name": profile_name.decode("latin1")},
+                inflate=ICC_PROFILE_CACHE.inflate,
+            )
+            iccp.defer("profile_info", data[offset + 1 :])
 
-            self.image["iccp"] = {
-                "profile_name": profile_name,
-                "profile_info": profile_info,
-            }
+            self.image["iccp"] = iccp
         except Exception as e:
             pass
-        pass
 
     def _parse_SBIT(self, chunk, chunk_size):
         print("Found SBIT chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None or self.image["palette"] is not None:
+        if self.image_data_started or self.image["palette"] is not None:
             return
 
         try:
@@ -198,7 +338,7 @@ class PNGDecoder:
     def _parse_SRGB(self, chunk, chunk_size):
         print("Found SRGB chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None or self.image["palette"] is not None:
+        if self.image_data_started or self.image["palette"] is not None:
             return
 
         if self.image["iccp"] is not None:
@@ -221,7 +361,7 @@ class PNGDecoder:
 
     def _parse_BKGD(self, chunk, chunk_size):
         print("Found BKGD chunk")  # Remove after defining all chunks
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             return
 
         try:
@@ -264,16 +404,17 @@ class PNGDecoder:
     def _parse_HIST(self, chunk, chunk_size):
         print("Found HIST chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             return
 
         if self.image["palette"] is None:
             return
 
         try:
-            histogram = []
-            for i in range(0, chunk_size, 2):
-                histogram.append(self._parse_int_from_byte(chunk.read(2)))
+            histogram = array("H", chunk.getvalue())
+
+            if byteorder == "little":
+                histogram.byteswap()
 
             if len(histogram) != len(self.image["palette"]):
                 return
@@ -285,7 +426,7 @@ class PNGDecoder:
     def _parse_TRNS(self, chunk, chunk_size):
         print("Found TRNS chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             return
 
         try:
@@ -310,24 +451,29 @@ class PNGDecoder:
                     return
 
                 red_sample = self._parse_int_from_byte(chunk.read(2))
-                blue_sample = self._parse_int_from_byte(chunk.read(2))
                 green_sample = self._parse_int_from_byte(chunk.read(2))
-                self.image["trns"] = (red_sample, blue_sample, green_sample)
+                blue_sample = self._parse_int_from_byte(chunk.read(2))
+
+                # Keys no sample can equal are ignored, like greyscale ones
+                if (
+                    max(red_sample, green_sample, blue_sample)
+                    > 2 ** (self.image["bit_depth"]) - 1
+                ):
+                    return
+
+                self.image["trns"] = (red_sample, green_sample, blue_sample)
             elif color_type == 3:
                 if chunk_size != len(self.image["palette"]):
                     return
 
-                palette_indexes = []
-                for i in range(0, chunk_size):
-                    palette_indexes.append(self._parse_int_from_byte(chunk.read(1)))
-                self.image["trns"] = palette_indexes
+                self.image["trns"] = list(chunk.getvalue())
         except Exception as e:
             pass
 
     def _parse_PHYS(self, chunk, chunk_size):
         print("Found PHYS chunk")  # Remove after defining all chunks
 
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             raise PNGDecodeException("PHYS chunk must be before IDAT chunk")
 
         try:
@@ -350,54 +496,25 @@ class PNGDecoder:
 
     def _parse_SPLT(self, chunk, chunk_size):
         print("Found SPLT chunk")  # Remove after defining all chunks
-        if self.image["idat"] is not None:
+        if self.image_data_started:
             return
 
         try:
-            palette_name, bytes_parsed, null_is_seen = "", 0, False
-
-            while not null_is_seen and bytes_parsed < chunk_size:
-                byte = self._parse_int_from_byte(chunk.read(1))
-                bytes_parsed += 1
-                if byte == 0:
-                    null_is_seen = True
-                else:
-                    palette_name += chr(byte)
+            data = chunk.getvalue()
+            palette_name, offset = self._split_at_null(data, 0)
+            palette_name = palette_name.decode("latin1")
 
             if " " in palette_name:
                 return
 
-            sample_depth = self._parse_int_from_byte(chunk.read(1))
-            bytes_parsed += 1
+            sample_depth = data[offset]
 
-            if sample_depth not in [8, 16]:
+            if sample_depth not in SPLT_ENTRY_FORMATS:
                 return
 
-            plte_entries = []
-
-            if sample_depth == 8:
-                for _ in range(0, chunk_size - bytes_parsed, 6):
-                    red = self._parse_int_from_byte(chunk.read(1))
-                    green = self._parse_int_from_byte(chunk.read(1))
-                    blue = self._parse_int_from_byte(chunk.read(1))
-                    alpha = self._parse_int_from_byte(chunk.read(1))
-                    frequency = self._parse_int_from_byte(chunk.read(2))
-                    plte_entries.append((red, green, blue, alpha, frequency))
-
-            elif sample_depth == 16:
-                for _ in range(0, chunk_size - bytes_parsed, 10):
-                    red = self._parse_int_from_byte(chunk.read(2))
-                    green = self._parse_int_from_byte(chunk.read(2))
-                    blue = self._parse_int_from_byte(chunk.read(2))
-                    alpha = self._parse_int_from_byte(chunk.read(2))
-                    frequency = self._parse_int_from_byte(chunk.read(2))
-                    plte_entries.append((red, green, blue, alpha, frequency))
-
-            if sample_depth == 8:
-                print(sample_depth, (chunk_size - bytes_parsed), chunk_size)
-
-            if sample_depth == 16:
-                print(sample_depth, (chunk_size - bytes_parsed), chunk_size)
+            plte_entries = list(
+                iter_unpack(SPLT_ENTRY_FORMATS[sample_depth], data[offset + 1 :])
+            )
 
             if self.image["splt"] is None:
                 self.image["splt"] = []
@@ -412,10 +529,13 @@ class PNGDecoder:
                 self.image["splt"].append((palette_name, sample_depth, plte_entries))
 
         except Exception as e:
-            print(e)
+            return
 
     def _parse_TIME(self, chunk, chunk_size):
         print("Found TIME chunk")  # Remove after defining all chunks
+        # Imported here, most images have no tIME chunk and datetime is slow to import
+        from datetime import datetime, timezone
+
         try:
 
             year = self._parse_int_from_byte(chunk.read(2))
@@ -438,44 +558,19 @@ class PNGDecoder:
 
     def _parse_TEXT(self, chunk, chunk_size):
         print("Found TEXT chunk")  # Remove after defining all chunks
-        ALLOWED_KEYWORDS = [
-            keyword.title()
-            for keyword in [
-                "title",
-                "author",
-                "description",
-                "copyright",
-                "creation time",
-                "software",
-                "disclaimer",
-                "warning",
-                "source",
-                "comment",
-            ]
-        ] + ["XML:com.adobe.xmp"]
-
         try:
-            parsed_bytes, null_is_found = 0, False
-            key_word, value = "", ""
+            data = chunk.getvalue()
+            separator = data.find(b"\x00")
 
-            while not null_is_found and parsed_bytes < chunk_size:
-                character = self._parse_int_from_byte(chunk.read(1))
-                if character == 0:
-                    parsed_bytes += 1
-                    break
-                key_word += chr(character)
-
-                parsed_bytes += 1
+            if separator == -1:
+                key_word, value = data.decode("latin1"), ""
+            else:
+                key_word = data[:separator].decode("latin1")
+                value = data[separator + 1 :].decode("latin1")
 
             if key_word not in ALLOWED_KEYWORDS:
                 return
 
-            remaining_bytes = chunk_size - parsed_bytes
-
-            for i in range(remaining_bytes):
-                character = self._parse_int_from_byte(chunk.read(1))
-                value += chr(character)
-
             if self.image["text_data"] is None:
                 self.image["text_data"] = {}
                 self.image["text_data"][key_word] = value
@@ -489,48 +584,26 @@ class PNGDecoder:
     def _parse_ZTXT(self, chunk, chunk_size):
         print("Found ZTXT chunk")  # Remove after defining all chunks
 
-        ALLOWED_KEYWORDS = [
-            keyword.title()
-            for keyword in [
-                "title",
-                "author",
-                "description",
-                "copyright",
-                "creation time",
-                "software",
-                "disclaimer",
-                "warning",
-                "source",
-                "comment",
-            ]
-        ] + ["XML:com.adobe.xmp"]
-
         try:
-            keyword, null_seperator_is_found, parsed_bytes = "", False, 0
-
-            while not null_seperator_is_found and parsed_bytes < chunk_size:
-                character = self._parse_int_from_byte(chunk.read(1))
-                if character == 0:
-                    parsed_bytes += 1
-                    break
-                keyword += chr(character)
-
-                parsed_bytes += 1
+            data = chunk.getvalue()
+            keyword, offset = self._split_at_null(data, 0)
+            keyword = keyword.decode("latin1")
 
             if keyword not in ALLOWED_KEYWORDS:
                 return
 
-            compression_method = self._parse_int_from_byte(chunk.read(1))
-            parsed_bytes += 1
+            compression_method = data[offset]
 
-            text_data = deflate(chunk.read(chunk_size - parsed_bytes))
-            text_data = text_data.decode("latin1")
+            if compression_method != 0:
+                return
+
+            text_data = data[offset + 1 :]
 
             if self.image["ztxt_data"] is None:
-                self.image["ztxt_data"] = {}
-                self.image["ztxt_data"][keyword] = text_data
+                self.image["ztxt_data"] = DeferredInflateMap(latin1_text)
+                self.image["ztxt_data"].defer(keyword, text_data)
             else:
-                self.image["ztxt_data"][keyword] = text_data
+                self.image["ztxt_data"].defer(keyword, text_data)
 
         except Exception as e:
             return
@@ -538,84 +611,42 @@ class PNGDecoder:
     def _parse_ITXT(self, chunk, chunk_size):
         print("Found ITXT chunk")  # Remove after defining all chunks
 
-        ALLOWED_KEYWORDS = [
-            keyword.title()
-            for keyword in [
-                "title",
-                "author",
-                "description",
-                "copyright",
-                "creation time",
-                "software",
-                "disclaimer",
-                "warning",
-                "source",
-                "comment",
-            ]
-        ] + ["XML:com.adobe.xmp"]
-
         try:
-            keyword, null_seperator_is_found, parsed_bytes = "", False, 0
-
-            while not null_seperator_is_found and parsed_bytes < chunk_size:
-                character = self._parse_int_from_byte(chunk.read(1))
-                if character == 0:
-                    parsed_bytes += 1
-                    break
-                keyword += chr(character)
-
-                parsed_bytes += 1
-
-            compression_flag = self._parse_int_from_byte(chunk.read(1))
-            parsed_bytes += 1
-
-            compression_method = self._parse_int_from_byte(chunk.read(1))
-            parsed_bytes += 1
+            data = chunk.getvalue()
+            keyword, offset = self._split_at_null(data, 0)
+            keyword = keyword.decode("latin1")
 
-            null_seperator_is_found = False
-            language_tag = ""
-
-            while not null_seperator_is_found and parsed_bytes < chunk_size:
-                character = self._parse_int_from_byte(chunk.read(1))
-                if character == 0:
-                    parsed_bytes += 1
-                    break
-                language_tag += chr(character)
+            if keyword not in ALLOWED_KEYWORDS:
+                return
 
-                parsed_bytes += 1
+            compression_flag, compression_method = unpack_from("BB", data, offset)
 
-            null_seperator_is_found = False
-            translated_keyword = bytearray()
+            if compression_flag not in [0, 1]:
+                return
 
-            while not null_seperator_is_found and parsed_bytes < chunk_size:
-                character = self._parse_int_from_byte(chunk.read(1))
-                if character == 0:
-                    parsed_bytes += 1
-                    break
-                translated_keyword.append(character)
+            if compression_flag == 1 and compression_method != 0:
+                return
 
-                parsed_bytes += 1
+            language_tag, offset = self._split_at_null(data, offset + 2)
+            translated_keyword, offset = self._split_at_null(data, offset)
 
+            language_tag = language_tag.decode("latin1")
             translated_keyword = translated_keyword.decode("utf-8")
-            text_data = chunk.read(chunk_size - parsed_bytes)
-
-            text_data = (
-                text_data.decode("utf-8")
-                if compression_flag == 0
-                else deflate(text_data).decode("utf-8")
-            )
-
-            if keyword not in ALLOWED_KEYWORDS:
-                return
+            text_data = data[offset:]
 
             itxt_info_object = {
                 "keyword": keyword,
                 "translated_keyword": translated_keyword,
                 "compression_flag": compression_flag,
                 "language_tag": language_tag,
-                "text_data": text_data,
             }
 
+            if compression_flag == 0:
+                itxt_info_object["text_data"] = text_data.decode("utf-8")
+            else:
+                itxt_info_object = DeferredInflateMap(utf8_text, itxt_info_object)
+                itxt_info_object.defer("text_data", text_data)
+
             if self.image["itxt_data"] is None:
                 self.image["itxt_data"] = []
                 self.image["itxt_data"].append(itxt_info_object)
@@ -626,6 +657,261 @@ class PNGDecoder:
 
     # ANCILLARY CHUNKS PARSING SECTION END
 
+    # APNG CHUNKS PARSING SECTION START
+    def _parse_ACTL(self, chunk, chunk_size):
+        if self.image_data_started or chunk_size != 8:
+            return
+
+        num_frames, num_plays = unpack(">II", chunk.getvalue())
+
+        if num_frames == 0:
+            return
+
+        self.image["actl"] = {"num_frames": num_frames, "num_plays": num_plays}
+
+    def _parse_FCTL(self, chunk, chunk_size):
+        # Frames are only decoded by APNGDecoder, PNGDecoder shows the default image
+        pass
+
+    def _parse_FDAT(self, chunk, chunk_size):
+        pass
+
+    # APNG CHUNKS PARSING SECTION END
+
+    # PRIVATE CHUNKS PARSING SECTION START
+    def _parse_VPRS(self, chunk, chunk_size):
+        if self.image_data_started:
+            return
+
+        self.restart_points = parse_restart_points(chunk.getvalue())
+
+    # PRIVATE CHUNKS PARSING SECTION END
+
+    # PIXEL DATA SECTION START
+    def _decode_image_data(self, data):
+        if self.row_decoder is None:
+            self._start_image_data(len(data))
+
+        if self.block_inflater is not None:
+            if self.image_data is not None:
+                self.image_data += data
+
+            self._store_block_rows(self.block_inflater.decode(data))
+            return
+
+        for y, row in self.row_decoder.decode(data):
+            self._store_row(y, row)
+
+    def _start_image_data(self, chunk_size):
+        if self.image["width"] is None:
+            raise PNGDecodeException("IHDR chunk must be before IDAT chunk")
+
+        if self.image["compression_method"] != 0 or self.image["filter_method"] != 0:
+            raise PNGDecodeException("Unknown compression or filter method")
+
+        header = (
+            self.image["width"],
+            self.image["height"],
+            self.image["bit_depth"],
+            self.image["color_type"],
+            self.image["interlace_method"],
+        )
+
+        if (
+            self.spare_row_decoder is not None
+            and self.spare_row_decoder.header == header
+        ):
+            self.row_decoder, self.spare_row_decoder = self.spare_row_decoder, None
+            self.row_decoder.reset()
+        else:
+            self.row_decoder = PNGRowDecoder(*header)
+
+        self.samples_per_row = self.image["width"] * CHANNELS[self.image["color_type"]]
+
+        if self.restart_points and self.image["interlace_method"] == 0:
+            try:
+                self.block_inflater = BlockInflater(
+                    self.restart_points,
+                    self.image["height"],
+                    self.row_decoder.row_bytes,
+                    self.row_decoder.unit,
+                )
+            except PNGDecodeException:
+                self.block_inflater = None
+
+        # The stream is decoded again if the restart points turn out to be wrong.
+        # Seekable files read it again from this first IDAT chunk, streams keep it.
+        if self.block_inflater is not None:
+            if self.file.seekable():
+                self.image_data_offset = self.file.tell() - chunk_size - 12
+            else:
+                self.image_data = bytearray()
+
+        # Optional transforms applied to every row before it is stored
+        self.row_stages = []
+
+        corrected_palette = None
+
+        if self.gamma is not None:
+            stage = gamma_stage(self.image, self.gamma)
+            if stage is not None:
+                self.row_stages.append(stage)
+                corrected_palette = getattr(stage, "palette", None)
+
+        stage = alpha_stage(
+            self.image, self.premultiply, self.background, corrected_palette
+        )
+        if stage is not None:
+            # Color keys have to be matched against the samples as stored in the file
+            if isinstance(stage, ColorKeyComposite):
+                self.row_stages.insert(0, stage)
+            elif isinstance(stage, PaletteComposite):
+                # Looks the indices up in the (gamma corrected) palette by itself
+                self.row_stages = [stage]
+            else:
+                self.row_stages.append(stage)
+
+        channels = CHANNELS[self.image["color_type"]]
+        for stage in self.row_stages:
+            channels = getattr(stage, "output_channels", channels)
+        itemsize = 2 if self.image["bit_depth"] == 16 else 1
+
+        # A mode replaces the whole row pipeline with one conversion kernel
+        self.mode_converter = None
+        if self.mode is not None:
+            self.mode_converter = mode_converter(self.image, self.mode)
+            channels = self.mode_converter.output_channels
+            itemsize = self.mode_converter.itemsize
+
+        self._start_pixel_summaries()
+
+        pixel_format = (self.image["width"], self.image["height"], channels, itemsize)
+
+        if not self.keep_pixels:
+            self.pixels = None
+        elif self.output is None:
+            self.pixels = PNGPixelBuffer(*pixel_format)
+        else:
+            buffer, stride = self.output
+            if callable(buffer):
+                buffer = buffer(*pixel_format)
+            self.pixels = PNGPixelBuffer.wrap(buffer, *pixel_format, stride=stride)
+
+    def _start_pixel_summaries(self):
+        self.pixel_statistics = None
+        if self.statistics is not None:
+            self.pixel_statistics = PixelStatistics(
+                self.statistics,
+                self.image["color_type"],
+                self.image["bit_depth"],
+                self.image["palette"],
+                self.image["trns"],
+            )
+
+        self.pixel_digest = None
+        if self.digest is not None:
+            self.pixel_digest = PixelDigest(self.digest, self.image)
+
+    def _finish_image_data(self):
+        if self.row_decoder is None:
+            raise PNGDecodeException("Image must contain at least one IDAT chunk")
+
+        if self.block_inflater is not None:
+            self._store_block_rows(self.block_inflater.flush())
+
+        # Still there when the restart points held up to the end of the stream
+        if self.block_inflater is not None:
+            self._close_block_inflater()
+        else:
+            for y, row in self.row_decoder.flush():
+                self._store_row(y, row)
+
+        self._attach_pixels()
+
+    def _store_block_rows(self, rows):
+        # Restart points are an unverified hint. Once blocks don't inflate to the rows
+        # they promise, or fail the checksum, the rows stored so far are decoded again
+        # from the start of the stream, and the statistics and digest start over.
+        try:
+            for y, row in rows:
+                self._store_row(y, row)
+        except PNGDecodeException:
+            if self.image_data is not None:
+                chunks = [self.image_data]
+            else:
+                chunks = self._read_image_data_again()
+
+            self._close_block_inflater()
+            self._start_pixel_summaries()
+
+            for data in chunks:
+                for y, row in self.row_decoder.decode(data):
+                    self._store_row(y, row)
+
+    def _read_image_data_again(self):
+        # Data of the IDAT chunks from the first one up to where the file was read,
+        # their CRCs were checked the first time
+        end = self.file.tell()
+        self.file.seek(self.image_data_offset)
+
+        while self.file.tell() < end:
+            chunk_size, chunk_type = unpack(">I4s", self.file.read(8))
+            data = self.file.read(chunk_size)
+            self.file.seek(4, SEEK_CUR)
+
+            if chunk_type == b"IDAT":
+                yield data
+
+        self.file.seek(end)
+
+    def _close_block_inflater(self):
+        if self.block_inflater is not None:
+            self.block_inflater.close()
+
+        self.block_inflater = None
+        self.image_data = None
+
+    def _attach_pixels(self):
+        self.image["pixels"] = self.pixels
+
+        if self.pixel_statistics is not None:
+            self.image["statistics"] = self.pixel_statistics.result()
+
+        if self.pixel_digest is not None:
+            self.image["digest"] = self.pixel_digest.hexdigest()
+
+    def _store_row(self, y, row):
+        if self.pixel_digest is not None:
+            self.pixel_digest.add_row(row)
+
+        if self.mode_converter is not None:
+            if self.pixel_statistics is not None:
+                self.pixel_statistics.add_row(
+                    native_row(row, self.image["bit_depth"], self.samples_per_row)
+                )
+            if self.pixels is not None:
+                self.pixels.write_row(y, self.mode_converter(row))
+            return
+
+        if self.pixels is None and self.pixel_statistics is None:
+            return
+
+        row = native_row(row, self.image["bit_depth"], self.samples_per_row)
+
+        # Statistics describe the samples in the file, before any stage changes them
+        if self.pixel_statistics is not None:
+            self.pixel_statistics.add_row(row)
+
+        if self.pixels is None:
+            return
+
+        for stage in self.row_stages:
+            row = stage(row)
+
+        self.pixels.write_row(y, row)
+
+    # PIXEL DATA SECTION END
+
     # HELPER CHUNKS SECTION START
     def _check_file_signature(self):
         first_bytes = self.file.read(8)
@@ -633,13 +919,27 @@ class PNGDecoder:
             raise PNGDecodeException
 
     def _read_chunk_and_check_crc(self):
-        chunk_size = unpack(">I", self.file.read(4))[0]
+        # Length and type in one read, then data and CRC in another
+        chunk_start = self.file.read(8)
+
+        if len(chunk_start) != 8:
+            raise PNGDecodeException("Unexpected end of file")
+
+        chunk_size = unpack_from(">I", chunk_start)[0]
+        chunk_header = chunk_start[4:]
 
-        chunk_header = self.file.read(4)
+        # Neither the data nor the CRC of skipped chunks is read
+        if self.skip_image_data and chunk_header == b"IDAT":
+            self.file.seek(chunk_size + 4, SEEK_CUR)
+            return list(chunk_header), BytesIO(), chunk_size
 
-        chunk = self.file.read(chunk_size)
+        chunk_end = self.file.read(chunk_size + 4)
 
-        chunk_crc = unpack(">I", self.file.read(4))[0]
+        if len(chunk_end) != chunk_size + 4:
+            raise PNGDecodeException("Unexpected end of file")
+
+        chunk = memoryview(chunk_end)[:-4]
+        chunk_crc = unpack_from(">I", chunk_end, chunk_size)[0]
 
         data_to_check_crc = chunk_header + chunk
 
@@ -649,6 +949,41 @@ class PNGDecoder:
         chunk_header = [int(x) for x in chunk_header]
         return chunk_header, BytesIO(chunk), chunk_size
 
+    def _release_file(self):
+        # Gives the caller's file back once IEND has been read
+        if isinstance(self.file, ReadAheadBuffer):
+            self.unused_data = self.file.release()
+            self.file = self.file.file
+
+    def _decode_indexed_chunks(self) -> bool:
+        # Returns False as soon as a chunk differs from the index, in its header, its
+        # stored CRC or its data, leaving the image partly decoded
+        for chunk_type, offset, chunk_size, crc in self.chunk_index.chunks:
+            if not self.keep_decoding:
+                break
+
+            # Metadata only decodes never read the image data
+            if self.metadata_only and chunk_type == b"IDAT":
+                self._do_chunk_parsing(list(chunk_type), BytesIO(), chunk_size)
+                continue
+
+            self.file.seek(offset)
+            chunk = self.file.read(chunk_size + 12)
+
+            if (
+                len(chunk) != chunk_size + 12
+                or chunk[:8] != pack(">I", chunk_size) + chunk_type
+                or chunk[-4:] != pack(">I", crc)
+                or not check_crc_is_same(chunk[4:-4], crc)
+            ):
+                return False
+
+            self._do_chunk_parsing(
+                list(chunk_type), BytesIO(chunk[8:-4]), chunk_size
+            )
+
+        return True
+
     def _do_chunk_parsing(self, chunk_header, chunk, chunk_size):
         # CRITICAL CHUNKS PARSING SECTION START
         if chunk_header == PNGImage.PNG_IHDR_CHUNK_SIGNATURE:
@@ -692,9 +1027,31 @@ class PNGDecoder:
             self._parse_ITXT(chunk, chunk_size)
         # ANCILLARY CHUNKS PARSING SECTION END
 
+        # APNG CHUNKS PARSING SECTION START
+        elif chunk_header == PNG_ACTL_CHUNK_SIGNATURE:
+            self._parse_ACTL(chunk, chunk_size)
+        elif chunk_header == PNG_FCTL_CHUNK_SIGNATURE:
+            self._parse_FCTL(chunk, chunk_size)
+        elif chunk_header == PNG_FDAT_CHUNK_SIGNATURE:
+            self._parse_FDAT(chunk, chunk_size)
+        # APNG CHUNKS PARSING SECTION END
+
+        # PRIVATE CHUNKS PARSING SECTION START
+        elif chunk_header == PNG_VPRS_CHUNK_SIGNATURE:
+            self._parse_VPRS(chunk, chunk_size)
+        # PRIVATE CHUNKS PARSING SECTION END
+
     def _parse_int_from_byte(self, bytes):
         return int.from_bytes(bytes, byteorder="big")
 
+    def _split_at_null(self, data, start):
+        separator = data.find(b"\x00", start)
+
+        if separator == -1:
+            raise PNGDecodeException("Missing null separator")
+
+        return data[start:separator], separator + 1
+
     # HELPER CHUNKS SECTION END
 
     pass
@@ -0,0 +1,66 @@
+class PNGImageInfo:
+    # Compact, metadata only counterpart of PNGImage. Every field lives in a slot, so
+    # an instance has no per-object __dict__, and no pixel data is kept.
+    FIELDS = (
+        # IHDR
+        "width",
+        "height",
+        "bit_depth",
+        "color_type",
+        "compression_method",
+        "filter_method",
+        "interlace_method",
+        # Critical chunks
+        "palette",
+        # Ancillary chunks
+        "chrm",
+        "gama",
+        "iccp",
+        "sbit",
+        "srgb",
+        "bkgd",
+        "histogram",
+        "trns",
+        "phys",
+        "splt",
+        "last_modified",
+        "text_data",
+        "ztxt_data",
+        "itxt_data",
+        # APNG
+        "actl",
+    )
+
+    __slots__ = FIELDS
+
+    _FIELD_SET = frozenset(FIELDS)
+
+    # Only the names in FIELDS are valid keys, reading or writing any other one
+    # raises KeyError. A field that was never set reads as None.
+    def __getitem__(self, key):
+        if key not in PNGImageInfo._FIELD_SET:
+            raise KeyError(key)
+
+        return getattr(self, key, None)
+
+    def __setitem__(self, key, value):
+        if key not in PNGImageInfo._FIELD_SET:
+            raise KeyError(key)
+
+        setattr(self, key, value)
+
+    def set_items_from_map(self, items):
+        for key, value in items.items():
+            self[key] = value
+
+    def items(self):
+        return [
+            (key, getattr(self, key))
+            for key in PNGImageInfo.FIELDS
+            if hasattr(self, key)
+        ]
+
+    def __repr__(self):
+        return "PNGImageInfo({})".format(
+            ", ".join("{}={!r}".format(key, value) for key, value in self.items())
+        )
@@ -0,0 +1,169 @@
+from sys import byteorder
+
+from .filters import CHANNELS
+
+
+class PNGPixelBuffer:
+    # Decoded pixels in one contiguous buffer, row after row. Samples below 8 bits are
+    # stored one per byte, 16 bit samples are native endian unsigned shorts and palette
+    # images keep their indices.
+    #
+    # The storage is exported without copying: memoryview(pixels) on Python 3.12+
+    # (PEP 688), pixels.view() on older versions, and numpy.asarray(pixels) through
+    # __array_interface__.
+    #
+    # The storage can also be a caller's buffer, see wrap(), whose rows may be further
+    # apart than their size.
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        channels: int,
+        itemsize: int = 1,
+        data=None,
+        row_stride=None,
+    ):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.itemsize = itemsize
+        self.format = "B" if itemsize == 1 else "H"
+        self.row_size = width * channels * itemsize
+        self.row_stride = self.row_size if row_stride is None else row_stride
+        self.data = bytearray(self.row_stride * height) if data is None else data
+
+    @staticmethod
+    def for_header(width: int, height: int, bit_depth: int, color_type: int):
+        return PNGPixelBuffer(
+            width, height, CHANNELS[color_type], 2 if bit_depth == 16 else 1
+        )
+
+    @staticmethod
+    def wrap(
+        buffer, width: int, height: int, channels: int, itemsize: int = 1, stride=None
+    ):
+        # Pixels written straight into buffer, any writable, C contiguous bytes-like
+        # object (bytearray, mmap, NumPy array), with rows stride bytes apart
+        view = memoryview(buffer)
+
+        try:
+            data = view.cast("B")
+        except TypeError as e:
+            raise ValueError("Buffer must be C contiguous") from e
+
+        row_size = width * channels * itemsize
+        stride = row_size if stride is None else stride
+
+        if data.readonly:
+            raise ValueError("Buffer must be writable")
+
+        # Typed buffers, like NumPy arrays and array("H"), must hold samples of the
+        # pixel format and, with more than one dimension, rows of the image's shape.
+        # Only plain one dimensional byte buffers take any layout.
+        if (view.ndim > 1 or view.itemsize > 1) and view.itemsize != itemsize:
+            raise ValueError(
+                "Buffer samples are {} bytes, the image's are {}".format(
+                    view.itemsize, itemsize
+                )
+            )
+
+        if view.ndim > 1:
+            if stride == row_size:
+                row_shape = (width,) if channels == 1 else (width, channels)
+                rows_match = view.shape[1:] == row_shape
+            else:
+                # Padded rows, every row of the buffer has to span one stride
+                rows_match = data.nbytes // view.shape[0] == stride
+
+            if not rows_match:
+                raise ValueError(
+                    "Buffer of shape {} doesn't hold {}x{} pixels of {} samples".format(
+                        view.shape, width, height, channels
+                    )
+                )
+
+        if stride < row_size:
+            raise ValueError(
+                "Stride must be at least the row size of {} bytes".format(row_size)
+            )
+
+        if len(data) < stride * (height - 1) + row_size:
+            raise ValueError(
+                "Buffer of {} bytes is too small for {}x{} pixels with a stride of {}".format(
+                    len(data), width, height, stride
+                )
+            )
+
+        return PNGPixelBuffer(width, height, channels, itemsize, data, stride)
+
+    @property
+    def is_padded(self) -> bool:
+        return self.row_stride != self.row_size
+
+    @property
+    def shape(self):
+        if self.channels == 1:
+            return (self.height, self.width)
+
+        return (self.height, self.width, self.channels)
+
+    @property
+    def strides(self):
+        if self.channels == 1:
+            return (self.row_stride, self.itemsize)
+
+        return (self.row_stride, self.channels * self.itemsize, self.itemsize)
+
+    @property
+    def nbytes(self) -> int:
+        return self.row_size * self.height
+
+    def write_row(self, y: int, row):
+        start = y * self.row_stride
+        self.data[start : start + self.row_size] = row
+
+    def row(self, y: int) -> memoryview:
+        start = y * self.row_stride
+        return memoryview(self.data)[start : start + self.row_size]
+
+    def view(self) -> memoryview:
+        if self.is_padded:
+            raise ValueError("Padded rows can't be viewed as one array, use row()")
+
+        return memoryview(self.data)[: self.nbytes].cast(self.format, self.shape)
+
+    def tobytes(self) -> bytes:
+        if self.is_padded:
+            return b"".join(self.row(y) for y in range(self.height))
+
+        return bytes(memoryview(self.data)[: self.nbytes])
+
+    def __buffer__(self, flags):
+        return self.view()
+
+    def __release_buffer__(self, view):
+        view.release()
+
+    @property
+    def __array_interface__(self):
+        return {
+            "version": 3,
+            "shape": self.shape,
+            "typestr": self._typestr(),
+            "data": memoryview(self.data),
+            "strides": self.strides if self.is_padded else None,
+        }
+
+    def _typestr(self):
+        if self.itemsize == 1:
+            return "|u1"
+
+        return ("<" if byteorder == "little" else ">") + "u2"
+
+    def __len__(self):
+        return self.height
+
+    def __repr__(self):
+        return "PNGPixelBuffer(width={}, height={}, channels={}, format={!r})".format(
+            self.width, self.height, self.channels, self.format
+        )
@@ -0,0 +1,183 @@
+from .compression import get_backend
+from .exceptions import PNGDecodeException
+from .filters import (
+    ADAM7_PASSES,
+    adam7_pass_sizes,
+    check_header,
+    filter_unit,
+    pack_samples,
+    row_byte_count,
+    unfilter_row,
+    unpack_samples,
+)
+
+# Upper bound on how much is inflated at once, so a small, highly compressed
+# chunk can't expand into one huge buffer
+INFLATE_CHUNK_SIZE = 1 << 18
+
+
+class PNGRowDecoder:
+    # Turns the zlib stream of IDAT (or fdAT) chunk data into reconstructed rows.
+    # decode() and flush() yield (y, row) pairs in top to bottom order, where row is
+    # a bytearray in PNG layout with the filter byte removed. Interlaced images are
+    # assembled in a scratch buffer and their rows are only yielded by flush().
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        bit_depth: int,
+        color_type: int,
+        interlace_method: int = 0,
+        decompressor=None,
+    ):
+        check_header(width, height, bit_depth, color_type)
+
+        if interlace_method not in [0, 1]:
+            raise PNGDecodeException(
+                "Unknown interlace method {}".format(interlace_method)
+            )
+
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.color_type = color_type
+        self.interlace_method = interlace_method
+        self.header = (width, height, bit_depth, color_type, interlace_method)
+        self.row_bytes = row_byte_count(width, color_type, bit_depth)
+        self.unit = filter_unit(color_type, bit_depth)
+        self.decompressor = (
+            decompressor if decompressor is not None else get_backend().decompressobj()
+        )
+
+        self._pending = bytearray()
+        self._previous = None
+        self._pass_index = 0
+        self._pass_y = 0
+
+        if interlace_method == 0:
+            self._passes = [(None, width, height, self.row_bytes)]
+            self._scratch = None
+        else:
+            self._passes = [
+                (
+                    pass_index,
+                    pass_width,
+                    pass_height,
+                    row_byte_count(pass_width, color_type, bit_depth),
+                )
+                for pass_index, (pass_width, pass_height) in enumerate(
+                    adam7_pass_sizes(width, height)
+                )
+                if pass_width > 0 and pass_height > 0
+            ]
+            # Sub byte samples are scattered one per byte and packed again at the end
+            self._scratch = bytearray(
+                width * height if bit_depth < 8 else self.row_bytes * height
+            )
+
+        # Kept for reset(), every pass together covers all of it again
+        self._scratch_buffer = self._scratch
+
+    def reset(self, decompressor=None):
+        # Starts over on the image data of another image with the same header, without
+        # allocating a new scratch buffer for interlaced images
+        self.decompressor = (
+            decompressor if decompressor is not None else get_backend().decompressobj()
+        )
+        self._pending.clear()
+        self._previous = None
+        self._pass_index = 0
+        self._pass_y = 0
+        self._scratch = self._scratch_buffer
+
+    @property
+    def is_complete(self) -> bool:
+        return self._pass_index == len(self._passes)
+
+    def decode(self, data):
+        try:
+            while data:
+                self._pending += self.decompressor.decompress(data, INFLATE_CHUNK_SIZE)
+                data = self.decompressor.unconsumed_tail
+                yield from self._take_rows()
+        except PNGDecodeException:
+            raise
+        except Exception as e:
+            raise PNGDecodeException("Could not inflate image data") from e
+
+    def flush(self):
+        try:
+            self._pending += self.decompressor.flush()
+        except Exception as e:
+            raise PNGDecodeException("Could not inflate image data") from e
+
+        yield from self._take_rows()
+
+        if not self.is_complete:
+            raise PNGDecodeException("Image data is incomplete")
+
+        if self._scratch is not None:
+            yield from self._interlaced_rows()
+
+    def _take_rows(self):
+        pending, offset = self._pending, 0
+
+        while self._pass_index < len(self._passes):
+            pass_index, pass_width, pass_height, row_bytes = self._passes[
+                self._pass_index
+            ]
+            end = offset + row_bytes + 1
+
+            if end > len(pending):
+                break
+
+            row = pending[offset + 1 : end]
+            unfilter_row(pending[offset], row, self._previous, self.unit)
+            offset = end
+
+            self._previous = row
+            y = self._pass_y
+            self._pass_y += 1
+
+            if self._pass_y == pass_height:
+                self._pass_index += 1
+                self._pass_y = 0
+                self._previous = None
+
+            if pass_index is None:
+                yield y, row
+            else:
+                self._scatter_pass_row(pass_index, y, row, pass_width)
+
+        del pending[:offset]
+
+    def _scatter_pass_row(self, pass_index, pass_y, row, pass_width):
+        x_start, y_start, x_step, y_step = ADAM7_PASSES[pass_index]
+        y = y_start + pass_y * y_step
+
+        if self.bit_depth < 8:
+            line_start = y * self.width
+            self._scratch[line_start + x_start : line_start + self.width : x_step] = (
+                unpack_samples(row, self.bit_depth, pass_width)
+            )
+            return
+
+        unit, line_start = self.unit, y * self.row_bytes
+        line_end = line_start + self.row_bytes
+
+        for k in range(unit):
+            self._scratch[
+                line_start + x_start * unit + k : line_end : x_step * unit
+            ] = row[k::unit]
+
+    def _interlaced_rows(self):
+        scratch, self._scratch = self._scratch, None
+
+        if self.bit_depth < 8:
+            for y in range(self.height):
+                yield y, pack_samples(
+                    scratch[y * self.width : (y + 1) * self.width], self.bit_depth
+                )
+        else:
+            for y in range(self.height):
+                yield y, scratch[y * self.row_bytes : (y + 1) * self.row_bytes]
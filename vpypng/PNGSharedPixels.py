@@ -0,0 +1,142 @@
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from .PNGDecoder import PNGDecoder
+from .PNGPixelBuffer import PNGPixelBuffer
+
+# Decoder of each worker process, created once with the batch's options
+_worker_decoder = None
+
+
+def _start_worker(options):
+    global _worker_decoder
+    _worker_decoder = PNGDecoder(**options)
+
+
+def _decode_file(path):
+    return _decode_to_shared_memory(_worker_decoder, path)
+
+
+def _decode_to_shared_memory(decoder, path):
+    # Decodes straight into a new block sized from the image header, and returns
+    # what the parent needs to map it
+    blocks = []
+
+    def allocate(width, height, channels, itemsize):
+        block = SharedMemory(create=True, size=width * height * channels * itemsize)
+        blocks.append(block)
+        return block.buf
+
+    try:
+        with open(path, "rb") as pngfile:
+            pixels = decoder.decode_into(pngfile, allocate)["pixels"]
+    except BaseException:
+        if decoder.pixels is not None and decoder.pixels.data.obj is not None:
+            decoder.pixels.data.release()
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+
+    # The parent owns the block from here on, its handle frees it
+    block = blocks[0]
+    pixels.data.release()
+    resource_tracker.unregister(block._name, "shared_memory")
+    block.close()
+    return block.name, pixels.width, pixels.height, pixels.channels, pixels.itemsize
+
+
+class PNGSharedPixels:
+    # Pixels a worker process decoded into a shared memory block, mapped here without
+    # copying or pickling them. pixels is a PNGPixelBuffer on the block, so row(),
+    # view() and numpy.asarray(pixels) all work on the shared memory. close() unmaps
+    # and frees the block, and raises BufferError while views of it are still alive.
+    # Blocks outlive the worker that created them, which needs POSIX shared memory.
+    def __init__(
+        self, name: str, width: int, height: int, channels: int, itemsize: int
+    ):
+        self.name = name
+        self.block = SharedMemory(name=name)
+        self.pixels = PNGPixelBuffer.wrap(
+            self.block.buf, width, height, channels, itemsize
+        )
+
+    @staticmethod
+    def decode_files(paths, jobs=None, **options):
+        # Yields one handle per path, in order, decoding with PNGDecoder options on
+        # that many processes (all cores when None). Blocks that were decoded but not
+        # handed out, because a decode failed or the caller stopped early, are freed.
+        paths = list(paths)
+        decoder = PNGDecoder(**options)
+
+        if jobs == 1 or len(paths) < 2:
+            for path in paths:
+                yield PNGSharedPixels(*_decode_to_shared_memory(decoder, path))
+            return
+
+        # Slow to import, and only needed for batches
+        from concurrent.futures import ProcessPoolExecutor
+
+        jobs = jobs or os.cpu_count() or 1
+        # Every decode holds a block until it is handed out, so only this many run
+        # ahead of the caller and a large batch can't fill up shared memory
+        in_flight = 2 * jobs
+
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_start_worker, initargs=(options,)
+        ) as executor:
+            pending = deque()
+            remaining = iter(paths)
+
+            try:
+                while True:
+                    for path in islice(remaining, in_flight - len(pending)):
+                        pending.append(executor.submit(_decode_file, path))
+
+                    if not pending:
+                        break
+
+                    handle = PNGSharedPixels(*pending.popleft().result())
+                    yield handle
+            finally:
+                for future in pending:
+                    if future.cancel():
+                        continue
+
+                    try:
+                        PNGSharedPixels(*future.result()).close()
+                    except Exception:
+                        pass
+
+    @property
+    def closed(self) -> bool:
+        return self.block is None
+
+    def close(self):
+        if self.block is None:
+            return
+
+        self.pixels.data.release()
+        self.block.close()
+        self.block.unlink()
+        self.block = None
+
+    def __del__(self):
+        # Handles dropped without close() still free their block, unless something
+        # still holds a view of it
+        try:
+            self.close()
+        except (AttributeError, BufferError):
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "PNGSharedPixels(name={!r}, {!r})".format(self.name, self.pixels)
@@ -0,0 +1,274 @@
+import os
+from io import BufferedIOBase, BytesIO
+from pathlib import Path
+from struct import unpack
+
+from .compression import get_backend
+from .exceptions import PNGDecodeException
+from .filters import adam7_pass_sizes, check_header, row_byte_count
+from .PNGImage import PNGImage
+
+# Chunk data is streamed in pieces of this size, so memory use doesn't depend on
+# the size of the file or of its chunks
+VERIFY_READ_SIZE = 1 << 16
+
+MAX_CHUNK_SIZE = 2**31 - 1
+
+# Chunks that must come before PLTE, and before IDAT
+BEFORE_PLTE = frozenset([b"cHRM", b"gAMA", b"iCCP", b"sBIT", b"sRGB"])
+# Chunks that must come after PLTE (when there is one), and before IDAT
+AFTER_PLTE = frozenset([b"bKGD", b"hIST", b"tRNS"])
+BEFORE_IDAT = BEFORE_PLTE | AFTER_PLTE | frozenset([b"pHYs", b"sPLT", b"acTL"])
+MULTIPLE_ALLOWED = frozenset(
+    [b"IDAT", b"sPLT", b"tEXt", b"zTXt", b"iTXt", b"fcTL", b"fdAT"]
+)
+CRITICAL_CHUNKS = frozenset([b"IHDR", b"PLTE", b"IDAT", b"IEND"])
+
+
+def expected_image_data_size(width, height, bit_depth, color_type, interlace_method):
+    # Size of the inflated IDAT stream: one filter byte plus the row bytes per row
+    if interlace_method == 0:
+        return height * (row_byte_count(width, color_type, bit_depth) + 1)
+
+    return sum(
+        pass_height * (row_byte_count(pass_width, color_type, bit_depth) + 1)
+        for pass_width, pass_height in adam7_pass_sizes(width, height)
+        if pass_width > 0 and pass_height > 0
+    )
+
+
+class PNGVerifier:
+    # Checks that a PNG is intact without decoding it: the signature, every chunk CRC,
+    # chunk ordering, and that the IDAT zlib stream is complete, passes its Adler-32
+    # check and inflates to exactly the size IHDR implies. Rows are not unfiltered and
+    # inflated data is counted and dropped, so memory use stays constant.
+    @staticmethod
+    def verify(file):
+        if isinstance(file, (str, Path)):
+            with open(file, "rb") as pngfile:
+                report = PNGVerifier(pngfile).report
+            report["path"] = str(file)
+            return report
+
+        if isinstance(file, (bytes, bytearray)):
+            file = BytesIO(file)
+
+        return PNGVerifier(file).report
+
+    @staticmethod
+    def verify_files(paths, jobs=None):
+        # One report per path, in order. With jobs other than 1 the files are spread
+        # over that many processes (all cores when None).
+        paths = list(paths)
+
+        if jobs == 1 or len(paths) < 2:
+            return [PNGVerifier._verify_path(path) for path in paths]
+
+        # Slow to import, and only needed for batches
+        from concurrent.futures import ProcessPoolExecutor
+
+        jobs = jobs or os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(
+                executor.map(
+                    PNGVerifier._verify_path,
+                    paths,
+                    chunksize=max(1, len(paths) // (4 * jobs)),
+                )
+            )
+
+    @staticmethod
+    def _verify_path(path):
+        try:
+            return PNGVerifier.verify(path)
+        except OSError as e:
+            return {"path": str(path), "ok": False, "errors": [str(e)]}
+
+    def __init__(self, file: BufferedIOBase):
+        self.file = file
+        self.backend = get_backend()
+        self.errors = []
+        self.seen = set()
+        self.last_type = None
+        self.chunk_count = 0
+        self.ihdr = None
+        self.decompressor = None
+        self.inflated_size = 0
+        self.expected_size = None
+        self.idat_finished = False
+
+        try:
+            self._verify()
+        except PNGDecodeException as e:
+            self.errors.append(str(e) or "File is not a valid PNG")
+
+        self.report = {
+            "ok": not self.errors,
+            "errors": self.errors,
+            "chunks": self.chunk_count,
+            "width": self.ihdr[0] if self.ihdr else None,
+            "height": self.ihdr[1] if self.ihdr else None,
+            "inflated_size": self.inflated_size,
+            "expected_size": self.expected_size,
+        }
+
+    def _verify(self):
+        if list(self.file.read(8)) != PNGImage.PNG_FILE_SIGNATURE:
+            raise PNGDecodeException("PNG file signature is wrong")
+
+        while True:
+            chunk_header = self.file.read(8)
+
+            if len(chunk_header) < 8:
+                raise PNGDecodeException("File ended before the IEND chunk")
+
+            chunk_size = unpack(">I", chunk_header[:4])[0]
+            chunk_type = chunk_header[4:]
+
+            if chunk_size > MAX_CHUNK_SIZE:
+                raise PNGDecodeException("Chunk length is larger than 2^31-1")
+
+            if not chunk_type.isalpha():
+                raise PNGDecodeException(
+                    "Chunk type {!r} is invalid".format(chunk_type)
+                )
+
+            self._check_order(chunk_type)
+            self._read_chunk(chunk_type, chunk_size)
+            self.seen.add(chunk_type)
+            self.last_type = chunk_type
+            self.chunk_count += 1
+
+            if chunk_type == b"IEND":
+                break
+
+        if self.file.read(1):
+            self.errors.append("Data after the IEND chunk")
+
+        self._finish_image_data()
+
+    def _check_order(self, chunk_type):
+        seen = self.seen
+
+        if not seen and chunk_type != b"IHDR":
+            raise PNGDecodeException("IHDR chunk must be the first chunk")
+
+        if chunk_type in seen and chunk_type not in MULTIPLE_ALLOWED:
+            self.errors.append("Multiple {} chunks".format(chunk_type.decode()))
+
+        if chunk_type == b"IDAT" and self.last_type != b"IDAT" and b"IDAT" in seen:
+            self.errors.append("IDAT chunks must be consecutive")
+
+        if chunk_type in BEFORE_IDAT | {b"PLTE"} and b"IDAT" in seen:
+            self.errors.append("{} chunk after IDAT".format(chunk_type.decode()))
+        elif chunk_type in BEFORE_PLTE and b"PLTE" in seen:
+            self.errors.append("{} chunk after PLTE".format(chunk_type.decode()))
+
+        if chunk_type in AFTER_PLTE and self.ihdr and self.ihdr[3] == 3:
+            if b"PLTE" not in seen:
+                self.errors.append("{} chunk before PLTE".format(chunk_type.decode()))
+
+        if chunk_type == b"IDAT" and b"IDAT" not in seen:
+            if self.ihdr and self.ihdr[3] == 3 and b"PLTE" not in seen:
+                self.errors.append("PLTE chunk is missing")
+
+        if chunk_type == b"IEND" and b"IDAT" not in seen:
+            self.errors.append("Image must contain at least one IDAT chunk")
+
+        # Unknown critical chunks can't be skipped by a decoder
+        if chunk_type[0:1].isupper() and chunk_type not in CRITICAL_CHUNKS:
+            self.errors.append("Unknown critical chunk {}".format(chunk_type.decode()))
+
+    def _read_chunk(self, chunk_type, chunk_size):
+        crc = self.backend.crc32(chunk_type)
+        remaining = chunk_size
+        head = b""
+
+        if chunk_type == b"IDAT" and self.decompressor is None:
+            self.decompressor = self.backend.decompressobj()
+
+        while remaining:
+            piece = self.file.read(min(remaining, VERIFY_READ_SIZE))
+
+            if not piece:
+                raise PNGDecodeException("File ended inside a chunk")
+
+            crc = self.backend.crc32(piece, crc)
+            remaining -= len(piece)
+
+            if chunk_type == b"IDAT":
+                self._inflate(piece)
+            elif len(head) < 16:
+                head += piece[: 16 - len(head)]
+
+        chunk_crc = self.file.read(4)
+
+        if len(chunk_crc) < 4:
+            raise PNGDecodeException("File ended inside a chunk")
+
+        if unpack(">I", chunk_crc)[0] != crc:
+            self.errors.append("CRC mismatch in {} chunk".format(chunk_type.decode()))
+
+        if chunk_type == b"IHDR":
+            self._check_ihdr(head, chunk_size)
+        elif chunk_type == b"PLTE":
+            if chunk_size % 3 != 0 or not 0 < chunk_size <= 768:
+                self.errors.append("PLTE chunk has an invalid length")
+            elif self.ihdr and self.ihdr[3] in [0, 4]:
+                self.errors.append("PLTE chunk is not allowed for this color type")
+
+    def _check_ihdr(self, head, chunk_size):
+        if chunk_size != 13:
+            raise PNGDecodeException("IHDR chunk must be 13 bytes long")
+
+        self.ihdr = unpack(">IIBBBBB", head[:13])
+        width, height, bit_depth, color_type, compression, filtering, interlace = (
+            self.ihdr
+        )
+        check_header(width, height, bit_depth, color_type)
+
+        if compression != 0 or filtering != 0 or interlace not in [0, 1]:
+            raise PNGDecodeException("Unknown compression, filter or interlace method")
+
+        self.expected_size = expected_image_data_size(
+            width, height, bit_depth, color_type, interlace
+        )
+
+    def _inflate(self, data):
+        if self.idat_finished:
+            if data:
+                self.errors.append("Data after the end of the zlib stream")
+            return
+
+        try:
+            while data:
+                inflated = self.decompressor.decompress(data, VERIFY_READ_SIZE)
+                self.inflated_size += len(inflated)
+                data = self.decompressor.unconsumed_tail
+
+                if self.inflated_size > self.expected_size:
+                    raise PNGDecodeException(
+                        "Image data inflates to more than IHDR allows"
+                    )
+
+            if self.decompressor.eof:
+                self.idat_finished = True
+
+                if self.decompressor.unused_data:
+                    self.errors.append("Data after the end of the zlib stream")
+        except self.backend.error as e:
+            raise PNGDecodeException("Image data is corrupt: {}".format(e))
+
+    def _finish_image_data(self):
+        if self.decompressor is None:
+            return
+
+        if not self.decompressor.eof:
+            self.errors.append("Image data zlib stream is incomplete")
+        elif self.inflated_size != self.expected_size:
+            self.errors.append(
+                "Image data inflates to {} bytes, IHDR needs {}".format(
+                    self.inflated_size, self.expected_size
+                )
+            )
@@ -1,5 +1,55 @@
+import sys
+from importlib import import_module as _import_module
+from types import ModuleType as _ModuleType
+
 from .exceptions import *
-from .PNGCodec import PNGCodec
-from .PNGDecoder import PNGDecoder
-from .PNGEncoder import PNGEncoder
-from .PNGImage import PNGImage
+
+# Everything else is imported on first use of one of its names, so that importing the
+# package stays cheap. The exceptions are needed by every module and load eagerly.
+_LAZY_ATTRIBUTES = {
+    "APNGDecoder": ".APNGDecoder",
+    "DecodedImageCache": ".imagecache",
+    "PNGChunkIndex": ".PNGChunkIndex",
+    "PNGBatchEncoder": ".PNGBatchEncoder",
+    "PNGCodec": ".PNGCodec",
+    "PNGDecoder": ".PNGDecoder",
+    "PNGEncoder": ".PNGEncoder",
+    "PNGImage": ".PNGImage",
+    "PNGImageInfo": ".PNGImageInfo",
+    "PNGSharedPixels": ".PNGSharedPixels",
+    "PNGVerifier": ".PNGVerifier",
+    "get_backend": ".compression",
+    "set_backend": ".compression",
+}
+
+__all__ = [
+    name
+    for name, value in globals().items()
+    if not name.startswith("_") and not isinstance(value, _ModuleType)
+] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(_import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+class _LazyPackage(_ModuleType):
+    # Importing a submodule binds it on the package under the name of its class,
+    # which would hide the class from __getattr__
+    def __setattr__(self, name, value):
+        if name in _LAZY_ATTRIBUTES and isinstance(value, _ModuleType):
+            return
+
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _LazyPackage
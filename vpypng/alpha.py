@@ -0,0 +1,227 @@
+from array import array
+from functools import lru_cache
+
+from .exceptions import PNGDecodeException
+from .filters import CHANNELS
+
+BKGD = "bkgd"
+
+
+@lru_cache(maxsize=256)
+def premultiply_table(alpha: int) -> bytes:
+    return bytes((value * alpha + 127) // 255 for value in range(256))
+
+
+@lru_cache(maxsize=1024)
+def composite_table(alpha: int, background: int) -> bytes:
+    return bytes(
+        (value * alpha + background * (255 - alpha) + 127) // 255
+        for value in range(256)
+    )
+
+
+def _drop_alpha(row, channels: int, itemsize: int):
+    # Bulk copy of the color samples of every pixel, for fully opaque rows
+    width = len(row) // (channels * itemsize)
+    out = bytearray(width * (channels - 1) * itemsize)
+    pixel, out_pixel = channels * itemsize, (channels - 1) * itemsize
+
+    for k in range(out_pixel):
+        out[k::out_pixel] = row[k::pixel]
+
+    return out
+
+
+class AlphaComposite:
+    # Row stage for images with an alpha channel (color types 4 and 6). With a
+    # background the alpha channel is flattened away, otherwise color samples are
+    # premultiplied by alpha. 8 bit rows go through tables keyed by the alpha value.
+    def __init__(self, channels: int, bit_depth: int, background=None):
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.background = background
+        self.output_channels = channels if background is None else channels - 1
+        self._tables = {}
+
+    def __call__(self, row):
+        if self.bit_depth == 8:
+            return self._composite_8_bit(row)
+
+        return self._composite_16_bit(row)
+
+    def _tables_for(self, alpha: int):
+        # One table per color channel, since each background sample differs
+        tables = self._tables.get(alpha)
+
+        if tables is None:
+            if self.background is None:
+                tables = [premultiply_table(alpha)] * (self.channels - 1)
+            else:
+                tables = [composite_table(alpha, sample) for sample in self.background]
+            self._tables[alpha] = tables
+
+        return tables
+
+    def _composite_8_bit(self, row):
+        channels, background = self.channels, self.background
+        alphas = row[channels - 1 :: channels]
+
+        if not alphas.strip(b"\xff"):
+            return row if background is None else _drop_alpha(row, channels, 1)
+
+        out = bytearray(len(alphas) * self.output_channels)
+        color_channels = channels - 1
+        o = 0
+
+        for i in range(0, len(row), channels):
+            alpha = row[i + color_channels]
+            tables = self._tables_for(alpha)
+
+            for k in range(color_channels):
+                out[o + k] = tables[k][row[i + k]]
+
+            if background is None:
+                out[o + color_channels] = alpha
+
+            o += self.output_channels
+
+        return out
+
+    def _composite_16_bit(self, row):
+        channels, background = self.channels, self.background
+        samples = array("H", row)
+        out = array("H", [0]) * (len(samples) // channels * self.output_channels)
+        color_channels = channels - 1
+        o = 0
+
+        for i in range(0, len(samples), channels):
+            alpha = samples[i + color_channels]
+
+            for k in range(color_channels):
+                value = samples[i + k] * alpha
+                if background is not None:
+                    value += background[k] * (65535 - alpha)
+                out[o + k] = (value + 32767) // 65535
+
+            if background is None:
+                out[o + color_channels] = alpha
+
+            o += self.output_channels
+
+        return out
+
+
+class ColorKeyComposite:
+    # Row stage for greyscale and truecolor images with a tRNS color key. Pixels
+    # matching the key are replaced by the background color.
+    def __init__(self, channels: int, bit_depth: int, key, background):
+        self.channels = channels
+        self.itemsize = 2 if bit_depth == 16 else 1
+        self.output_channels = channels
+
+        if self.itemsize == 1:
+            self.key = bytes(key)
+            self.background = bytes(background)
+        else:
+            self.key = array("H", key).tobytes()
+            self.background = array("H", background).tobytes()
+
+    def __call__(self, row):
+        if self.channels == 1 and self.itemsize == 1:
+            return row.replace(self.key, self.background)
+
+        pixel, key, background = len(self.key), self.key, self.background
+        out = bytearray(row)
+        position = out.find(key)
+
+        while position != -1:
+            if position % pixel == 0:
+                out[position : position + pixel] = background
+                position = out.find(key, position + pixel)
+            else:
+                position = out.find(key, position - position % pixel + pixel)
+
+        return out
+
+
+class PaletteComposite:
+    # Row stage for palette images: every index is looked up in a table of
+    # premultiplied RGBA or background composited RGB entries
+    def __init__(self, palette, transparency, background=None):
+        transparency = list(transparency or [])
+        transparency += [255] * (len(palette) - len(transparency))
+        entries = []
+
+        for (red, green, blue), alpha in zip(palette, transparency):
+            if background is None:
+                table = premultiply_table(alpha)
+                entries.append(bytes([table[red], table[green], table[blue], alpha]))
+            else:
+                entries.append(
+                    bytes(
+                        composite_table(alpha, background[k])[sample]
+                        for k, sample in enumerate((red, green, blue))
+                    )
+                )
+
+        # Out of range indices map to black rather than failing halfway through
+        entries += [bytes(len(entries[0]))] * (256 - len(entries))
+
+        self.entries = entries
+        self.output_channels = len(entries[0])
+
+    def __call__(self, row):
+        entries = self.entries
+        return bytearray(b"".join([entries[index] for index in row]))
+
+
+def _resolve_background(image, background):
+    if background == BKGD:
+        if image["bkgd"] is None:
+            raise PNGDecodeException("Image has no valid bKGD chunk")
+
+        return tuple(image["bkgd"])
+
+    return tuple(background)
+
+
+def alpha_stage(image, premultiply: bool = False, background=None, palette=None):
+    # Returns a row stage for the requested alpha handling, or None if there is nothing
+    # to do. background is BKGD for the file's bKGD color or a color with one sample
+    # per color channel, at the image's bit depth (8 bit RGB for palette images).
+    # palette replaces the image's palette, e.g. with a gamma corrected one.
+    if background is None and not premultiply:
+        return None
+
+    color_type, bit_depth = image["color_type"], image["bit_depth"]
+
+    if background is not None:
+        background = _resolve_background(image, background)
+        if color_type == 3:
+            color_channels = 3
+        elif color_type in [4, 6]:
+            color_channels = CHANNELS[color_type] - 1
+        else:
+            color_channels = CHANNELS[color_type]
+
+        if len(background) != color_channels:
+            raise ValueError(
+                "Background must have {} samples for color type {}".format(
+                    color_channels, color_type
+                )
+            )
+
+    if color_type in [4, 6]:
+        return AlphaComposite(CHANNELS[color_type], bit_depth, background)
+
+    if color_type == 3:
+        if image["palette"] is None:
+            raise PNGDecodeException("PLTE chunk is missing")
+
+        return PaletteComposite(palette or image["palette"], image["trns"], background)
+
+    # Greyscale and truecolor images only have transparency through a color key
+    if background is None or image["trns"] is None:
+        return None
+
+    return ColorKeyComposite(CHANNELS[color_type], bit_depth, image["trns"], background)
@@ -0,0 +1,241 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from functools import partial
+from io import BytesIO, StringIO
+from pathlib import Path
+from time import perf_counter
+
+from .compression import get_backend
+from .exceptions import PNGDecodeException
+from .PNGChunkIndex import PNGChunkIndex
+from .PNGDecoder import PNGDecoder
+from .PNGImage import PNGImage
+from .PNGVerifier import PNGVerifier
+
+# Ancillary chunks that change how an image looks, kept by strip by default
+RENDERING_CHUNKS = frozenset(
+    [b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT", b"acTL", b"fcTL", b"fdAT"]
+)
+
+
+def expand_inputs(inputs):
+    # Files as given, directories searched recursively for .png files, anything else
+    # treated as a glob pattern
+    paths = []
+
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(str(path) for path in Path(item).rglob("*.png")))
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+
+    return paths
+
+
+def info(path):
+    index = PNGChunkIndex.build(path)
+    return dict(
+        {"path": path, "size": index.size},
+        **index.ihdr,
+        chunks=[chunk_type.decode("latin-1") for chunk_type, _, _, _ in index.chunks],
+    )
+
+
+def verify(path):
+    return PNGVerifier.verify(path)
+
+
+def strip(path, keep=(), output_dir=None):
+    # Copies critical chunks and the kept ancillary ones verbatim, dropping the rest
+    keep = RENDERING_CHUNKS | frozenset(chunk_type.encode() for chunk_type in keep)
+    index = PNGChunkIndex.build(path)
+    removed = []
+
+    with open(path, "rb") as pngfile:
+        image_bytes = pngfile.read()
+
+    stripped = bytearray(bytes(PNGImage.PNG_FILE_SIGNATURE))
+
+    for chunk_type, offset, length, crc in index.chunks:
+        if chunk_type[0:1].islower() and chunk_type not in keep:
+            removed.append(chunk_type.decode("latin-1"))
+            continue
+
+        chunk = image_bytes[offset : offset + length + 12]
+
+        if get_backend().crc32(chunk[4:-4]) != crc:
+            raise PNGDecodeException(
+                "CRC mismatch in {} chunk".format(chunk_type.decode("latin-1"))
+            )
+
+        stripped += chunk
+
+    output = (
+        path if output_dir is None else os.path.join(output_dir, os.path.basename(path))
+    )
+
+    if removed or output != path:
+        write_file(output, stripped)
+
+    return {
+        "path": path,
+        "output": output,
+        "removed": removed,
+        "bytes_before": len(image_bytes),
+        "bytes_after": len(stripped),
+    }
+
+
+def write_file(path, data):
+    # Writes to a temporary file next to path and renames it over path, so a failure
+    # part way through never leaves a half written file behind
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(
+        prefix=".{}.".format(os.path.basename(path)), dir=directory
+    )
+
+    try:
+        with os.fdopen(descriptor, "wb") as pngfile:
+            pngfile.write(data)
+
+        if os.path.exists(path):
+            shutil.copymode(path, temporary_path)
+
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def bench(path, repeat=3):
+    with open(path, "rb") as pngfile:
+        image_bytes = pngfile.read()
+
+    times = []
+
+    for _ in range(repeat):
+        start = perf_counter()
+        image = PNGDecoder.decode(BytesIO(image_bytes))
+        times.append(perf_counter() - start)
+
+    best = min(times)
+    pixel_count = image["width"] * image["height"]
+
+    return {
+        "path": path,
+        "seconds": best,
+        "megapixels_per_second": pixel_count / best / 1e6 if best else None,
+        "width": image["width"],
+        "height": image["height"],
+    }
+
+
+COMMANDS = {"info": info, "verify": verify, "strip": strip, "bench": bench}
+
+
+def run_command(command, path):
+    # Runs one command on one file, turning failures into a report, so one bad file
+    # never stops a batch. The decoder's debug output would end up in the JSON Lines
+    # output, so it is dropped.
+    try:
+        with redirect_stdout(StringIO()):
+            return command(path)
+    except (OSError, PNGDecodeException, ValueError) as e:
+        return {"path": path, "ok": False, "errors": [str(e) or type(e).__name__]}
+    except Exception as e:
+        # Anything else is a bug or a case nobody expected, named for the report
+        return {
+            "path": path,
+            "ok": False,
+            "errors": ["{}: {}".format(type(e).__name__, e)],
+        }
+
+
+def run(command, paths, jobs=1):
+    # Yields one report per path, in order. The process pool is started once for the
+    # whole batch, so Python start up is not paid for every file.
+    task = partial(run_command, command)
+
+    if jobs == 1 or len(paths) < 2:
+        yield from map(task, paths)
+        return
+
+    # Slow to import, and only needed for batches
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(
+            task, paths, chunksize=max(1, min(64, len(paths) // (4 * jobs)))
+        )
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(
+        prog="vpypng", description="Batch operations on PNG files, as JSON Lines"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in [
+        ("info", "print IHDR fields and the chunk list"),
+        ("verify", "check CRCs, chunk order and the image data stream"),
+        ("strip", "remove ancillary chunks that don't affect rendering"),
+        ("bench", "time decoding"),
+    ]:
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument(
+            "inputs", nargs="+", help="files, directories or glob patterns"
+        )
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="number of processes, 0 for one per core",
+        )
+
+        if name == "strip":
+            subparser.add_argument(
+                "--keep",
+                action="append",
+                default=[],
+                metavar="TYPE",
+                help="also keep chunks of this type",
+            )
+            subparser.add_argument(
+                "-o",
+                "--output-dir",
+                help="write stripped files here instead of in place",
+            )
+        elif name == "bench":
+            subparser.add_argument("--repeat", type=int, default=3)
+
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    arguments = parse_arguments(arguments)
+    command = COMMANDS[arguments.command]
+
+    if arguments.command == "strip":
+        command = partial(strip, keep=arguments.keep, output_dir=arguments.output_dir)
+    elif arguments.command == "bench":
+        command = partial(bench, repeat=arguments.repeat)
+
+    failed = False
+
+    for report in run(command, expand_inputs(arguments.inputs), arguments.jobs):
+        failed = failed or report.get("ok") is False
+        sys.stdout.write(json.dumps(report) + "\n")
+        sys.stdout.flush()
+
+    return 1 if failed else 0
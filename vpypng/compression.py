@@ -0,0 +1,95 @@
+import os
+from importlib import import_module
+
+# zlib compatible modules, by backend name. zlib-ng and isal (ISA-L) are drop in
+# replacements for the stdlib module that inflate and deflate considerably faster.
+BACKEND_MODULES = {
+    "zlib-ng": "zlib_ng.zlib_ng",
+    "isal": "isal.isal_zlib",
+    "zlib": "zlib",
+}
+
+# Order in which installed backends are picked when none is forced
+AUTOMATIC_BACKENDS = ("zlib-ng", "isal", "zlib")
+
+# Forces a backend for the whole process, e.g. VPYPNG_COMPRESSION_BACKEND=zlib
+BACKEND_ENVIRONMENT_VARIABLE = "VPYPNG_COMPRESSION_BACKEND"
+
+# ISA-L only has compression levels 0 to 3
+MAX_COMPRESSION_LEVELS = {"isal": 3}
+
+
+class CompressionBackend:
+    # The part of the zlib module interface used by vpypng
+    def __init__(self, name: str, module):
+        self.name = name
+        self.module = module
+        self.error = module.error
+        self.decompressobj = module.decompressobj
+        self.decompress = module.decompress
+        self.crc32 = module.crc32
+        self.adler32 = module.adler32
+        self.Z_FULL_FLUSH = module.Z_FULL_FLUSH
+        self.max_level = MAX_COMPRESSION_LEVELS.get(name, 9)
+
+    def compressobj(self, level: int = -1, *args, **kwargs):
+        if level > self.max_level:
+            level = self.max_level
+
+        return self.module.compressobj(level, *args, **kwargs)
+
+    def compress(self, data, level: int = -1):
+        if level > self.max_level:
+            level = self.max_level
+
+        return self.module.compress(data, level)
+
+    def __repr__(self):
+        return "CompressionBackend({!r})".format(self.name)
+
+
+_backend = None
+
+
+def load_backend(name: str) -> CompressionBackend:
+    # Raises ImportError when the backend's module isn't installed
+    if name not in BACKEND_MODULES:
+        raise ValueError(
+            "Unknown compression backend {!r}, expected one of {}".format(
+                name, ", ".join(BACKEND_MODULES)
+            )
+        )
+
+    return CompressionBackend(name, import_module(BACKEND_MODULES[name]))
+
+
+def _automatic_backend() -> CompressionBackend:
+    for name in AUTOMATIC_BACKENDS:
+        try:
+            return load_backend(name)
+        except ImportError:
+            pass
+
+
+def get_backend() -> CompressionBackend:
+    # Callers look the backend up every time they need it, so set_backend applies to
+    # everything decoded or encoded afterwards
+    global _backend
+
+    if _backend is None:
+        name = os.environ.get(BACKEND_ENVIRONMENT_VARIABLE)
+        _backend = load_backend(name) if name else _automatic_backend()
+
+    return _backend
+
+
+def set_backend(name=None) -> CompressionBackend:
+    # Forces a backend by name, or goes back to automatic selection with None
+    global _backend
+    _backend = load_backend(name) if name else _automatic_backend()
+    return _backend
+
+
+def inflate(data) -> bytes:
+    # Whole zlib streams of zTXt, iTXt and iCCP payloads, through the current backend
+    return get_backend().decompress(data)
@@ -0,0 +1,262 @@
+from sys import byteorder
+
+from .exceptions import PNGDecodeException
+from .filters import swap_16_bit_row
+
+
+def _clear_color_key(
+    out, row, key, pixel_bytes, alpha_offset, alpha_size, out_pixel_bytes
+):
+    # Makes every pixel of row that matches the tRNS key fully transparent in out,
+    # whose pixels are out_pixel_bytes long with alpha at alpha_offset
+    position = row.find(key)
+
+    while position != -1:
+        if position % pixel_bytes == 0:
+            pixel = position // pixel_bytes
+            start = pixel * out_pixel_bytes + alpha_offset
+            out[start : start + alpha_size] = bytes(alpha_size)
+            position = row.find(key, position + pixel_bytes)
+        else:
+            position = row.find(key, position - position % pixel_bytes + pixel_bytes)
+
+
+# Output pixel formats for the decoder's mode option: channels and bytes per sample.
+# 16 bit samples are native endian, like the rest of PNGPixelBuffer.
+MODES = {
+    "L8": ("L", 1),
+    "LA8": ("LA", 1),
+    "RGB8": ("RGB", 1),
+    "RGBA8": ("RGBA", 1),
+    "L16": ("L", 2),
+    "LA16": ("LA", 2),
+    "RGB16": ("RGB", 2),
+    "RGBA16": ("RGBA", 2),
+}
+
+# Channels of the samples stored for each color type, palette indices excluded
+SOURCE_CHANNELS = {0: "L", 2: "RGB", 4: "LA", 6: "RGBA"}
+
+
+def _luminance(red: int, green: int, blue: int) -> int:
+    # ITU-R BT.601 weights in 16 bit fixed point, they add up to 65536
+    return (19595 * red + 38470 * green + 7471 * blue + 32768) >> 16
+
+
+def _pixel_bytes(channels: str, itemsize: int, red, green, blue, alpha) -> bytes:
+    # One output pixel from samples at the output precision
+    values = {"L": _luminance(red, green, blue), "R": red, "G": green, "B": blue}
+    values["A"] = alpha
+    return b"".join(
+        values[channel].to_bytes(itemsize, byteorder) for channel in channels
+    )
+
+
+class ModeConverter:
+    # Row kernel from a reconstructed PNG row (packed samples, 16 bits big endian) to
+    # one of MODES, in a single pass over the row. The kernel is picked once per image
+    # from the color type, bit depth and mode:
+    # - palette and sub byte greyscale rows go through a table from every possible
+    #   byte to the output pixels it holds, expansion and scaling included
+    # - rows already in the output layout are returned as they are, or byte swapped
+    # - everything else is assembled channel by channel with extended slices
+    # Scaling from 16 to 8 bits keeps the high byte, and alpha is dropped without
+    # compositing when the mode has none.
+    def __init__(
+        self,
+        color_type: int,
+        bit_depth: int,
+        mode: str,
+        width: int,
+        palette=None,
+        trns=None,
+    ):
+        if mode not in MODES:
+            raise ValueError(
+                "Unknown mode {!r}, expected one of {}".format(mode, ", ".join(MODES))
+            )
+
+        self.channels, self.itemsize = MODES[mode]
+        self.output_channels = len(self.channels)
+        self.width = width
+        self.pixel_bytes = self.output_channels * self.itemsize
+        self.key = None
+
+        if color_type == 3 or bit_depth < 8:
+            self._build_table(color_type, bit_depth, palette, trns)
+            self.kernel = self._convert_table
+            return
+
+        source = SOURCE_CHANNELS[color_type]
+        self.source_itemsize = 2 if bit_depth == 16 else 1
+        self.source_pixel_bytes = len(source) * self.source_itemsize
+
+        # The color key only matters when the output has alpha to clear
+        if trns is not None and "A" in self.channels and "A" not in source:
+            self.key = b"".join(
+                value.to_bytes(self.source_itemsize, "big") for value in trns
+            )
+
+        if source == self.channels and self.key is None:
+            if self.itemsize == self.source_itemsize == 1:
+                self.kernel = self._convert_same
+                return
+
+            if self.itemsize == self.source_itemsize == 2:
+                self.kernel = (
+                    swap_16_bit_row if byteorder == "little" else self._convert_same
+                )
+                return
+
+        self._build_plan(source)
+        self.kernel = self._convert_planes
+
+    def __call__(self, row):
+        return self.kernel(row)
+
+    def _build_table(self, color_type, bit_depth, palette, trns):
+        max_value = (1 << bit_depth) - 1
+        full = (1 << (8 * self.itemsize)) - 1
+        # Samples of 8 bits become 16 bits by repeating the byte, value * 257
+        scale = 257 if self.itemsize == 2 else 1
+
+        if color_type == 3:
+            if palette is None:
+                raise PNGDecodeException("Palette image without a PLTE chunk")
+
+            alphas = list(trns or []) + [255] * (len(palette) - len(trns or []))
+            pixels = [
+                _pixel_bytes(
+                    self.channels,
+                    self.itemsize,
+                    *(value * scale for value in color),
+                    alpha * scale,
+                )
+                for color, alpha in zip(palette, alphas)
+            ]
+            # Indices past the end of the palette are black and transparent
+            pixels += [bytes(self.pixel_bytes)] * (max_value + 1 - len(pixels))
+        else:
+            key = trns[0] if trns is not None else None
+            pixels = []
+            for value in range(max_value + 1):
+                grey = value * full // max_value
+                pixels.append(
+                    _pixel_bytes(
+                        self.channels,
+                        self.itemsize,
+                        grey,
+                        grey,
+                        grey,
+                        0 if value == key else full,
+                    )
+                )
+
+        per_byte = 8 // bit_depth
+        self.table = [
+            b"".join(
+                pixels[(byte >> (8 - bit_depth * (k + 1))) & max_value]
+                for k in range(per_byte)
+            )
+            for byte in range(256)
+        ]
+        # The last byte of a row may hold padding bits past the last pixel
+        self.row_size = self.width * self.pixel_bytes if self.width % per_byte else None
+
+    def _convert_table(self, row):
+        table = self.table
+        out = b"".join([table[byte] for byte in row])
+        return out if self.row_size is None else out[: self.row_size]
+
+    def _convert_same(self, row):
+        return row
+
+    def _build_plan(self, source):
+        # (output channel, source channel) pairs, the source channel being an index
+        # into the row's channels or "luminance"; channels missing from the source
+        # stay at the template's fully opaque value
+        self.plan = []
+
+        for target, channel in enumerate(self.channels):
+            if channel in source:
+                self.plan.append((target, source.index(channel)))
+            elif channel in "RGB" and "L" in source:
+                self.plan.append((target, source.index("L")))
+            elif channel == "L":
+                self.plan.append((target, "luminance"))
+
+        self.source_channel_count = len(source)
+        self.template = b"\xff" * (self.width * self.pixel_bytes)
+
+    def _planes(self, row, channel):
+        # (high bytes, low bytes) of one source channel, 8 bit samples are their own
+        # low byte once scaled to 16 bits
+        if channel == "luminance":
+            return self._luminance_planes(row)
+
+        step = self.source_channel_count * self.source_itemsize
+
+        if self.source_itemsize == 1:
+            plane = row[channel::step]
+            return plane, plane
+
+        return row[2 * channel :: step], row[2 * channel + 1 :: step]
+
+    def _luminance_planes(self, row):
+        red, green, blue = (self._planes(row, channel) for channel in range(3))
+
+        # 8 bits of precision are all the output keeps
+        if self.itemsize == 1:
+            plane = bytes(map(_luminance, red[0], green[0], blue[0]))
+            return plane, plane
+
+        values = [
+            _luminance((rh << 8) | rl, (gh << 8) | gl, (bh << 8) | bl)
+            for rh, rl, gh, gl, bh, bl in zip(
+                red[0], red[1], green[0], green[1], blue[0], blue[1]
+            )
+        ]
+        return bytes([value >> 8 for value in values]), bytes(
+            [value & 0xFF for value in values]
+        )
+
+    def _convert_planes(self, row):
+        out = bytearray(self.template)
+        step = self.pixel_bytes
+
+        for target, channel in self.plan:
+            high, low = self._planes(row, channel)
+
+            if self.itemsize == 1:
+                out[target::step] = high
+            elif byteorder == "little":
+                out[2 * target :: step] = low
+                out[2 * target + 1 :: step] = high
+            else:
+                out[2 * target :: step] = high
+                out[2 * target + 1 :: step] = low
+
+        if self.key is not None:
+            _clear_color_key(
+                out,
+                bytes(row),
+                self.key,
+                self.source_pixel_bytes,
+                (self.output_channels - 1) * self.itemsize,
+                self.itemsize,
+                self.pixel_bytes,
+            )
+
+        return out
+
+
+def mode_converter(image, mode: str, width: int = None) -> ModeConverter:
+    # width defaults to the image's, APNG frames may be narrower
+    return ModeConverter(
+        image["color_type"],
+        image["bit_depth"],
+        mode,
+        image["width"] if width is None else width,
+        image["palette"],
+        image["trns"],
+    )
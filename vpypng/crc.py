@@ -1,14 +1,14 @@
-from zlib import crc32
+from .compression import get_backend
 
 def calculate_crc(data: bytes) -> int:
     if not isinstance(data, bytes):
         data=bytes(data)
 
-    return crc32(data)
+    return get_backend().crc32(data)
 
 
 def check_crc_is_same(data: bytes, crc: int) -> bool:
     if not isinstance(data, bytes):
         data=bytes(data)
 
-    return crc32(data) == crc
\ No newline at end of file
+    return get_backend().crc32(data) == crc
\ No newline at end of file
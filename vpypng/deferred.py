@@ -0,0 +1,75 @@
+from collections.abc import MutableMapping
+
+from .compression import inflate
+from .exceptions import PNGDecodeException
+
+
+def latin1_text(data: bytes) -> str:
+    return data.decode("latin1")
+
+
+def utf8_text(data: bytes) -> str:
+    return data.decode("utf-8")
+
+
+class _Compressed:
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+
+# Mapping whose compressed values are only inflated the first time they are read.
+# The inflated value replaces the compressed payload, so it is only done once.
+class DeferredInflateMap(MutableMapping):
+    def __init__(self, decode=bytes, items=None, inflate=inflate):
+        self._decode = decode
+        self._inflate = inflate
+        self._items = {}
+
+        if items is not None:
+            self._items.update(items)
+
+    def defer(self, key, payload: bytes):
+        self._items[key] = _Compressed(payload)
+
+    def is_inflated(self, key) -> bool:
+        return not isinstance(self._items[key], _Compressed)
+
+    def __getitem__(self, key):
+        value = self._items[key]
+
+        if isinstance(value, _Compressed):
+            try:
+                value = self._decode(self._inflate(value.payload))
+            except Exception as e:
+                raise PNGDecodeException(
+                    "Could not inflate compressed data for {!r}".format(key)
+                ) from e
+
+            self._items[key] = value
+
+        return value
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join(
+                "{!r}: {}".format(
+                    key, "<deferred>" if isinstance(value, _Compressed) else repr(value)
+                )
+                for key, value in self._items.items()
+            ),
+        )
@@ -0,0 +1,54 @@
+from struct import pack
+from sys import byteorder
+
+from .convert import mode_converter
+from .filters import swap_16_bit_row
+
+
+def check_algorithm(algorithm: str) -> str:
+    # Any fixed length hashlib algorithm, shake digests would need a length.
+    # hashlib is only imported once a digest is asked for.
+    import hashlib
+
+    try:
+        digest_size = hashlib.new(algorithm).digest_size
+    except (TypeError, ValueError):
+        digest_size = 0
+
+    if digest_size == 0:
+        raise ValueError(
+            "Unknown or variable length digest algorithm {!r}".format(algorithm)
+        )
+
+    return algorithm
+
+
+class PixelDigest:
+    # Hash of the pixels alone, the same for every file that stores the same
+    # picture whatever its filters, compression, chunk layout or metadata. It covers
+    # the width, height and normalized mode, then every row converted to that mode:
+    # RGBA8 for images up to 8 bits (palette, grey and color alike) and RGBA16 with
+    # big endian samples for 16 bit images. Rows are hashed as they are decoded, so
+    # the image itself never has to be kept.
+    def __init__(self, algorithm: str, image):
+        import hashlib
+
+        self.hash = hashlib.new(check_algorithm(algorithm))
+        self.mode = "RGBA16" if image["bit_depth"] == 16 else "RGBA8"
+        self.converter = mode_converter(image, self.mode)
+        self.swap = self.mode == "RGBA16" and byteorder == "little"
+        self.hash.update(
+            pack(">II", image["width"], image["height"]) + self.mode.encode("ascii")
+        )
+
+    def add_row(self, row):
+        # row is a reconstructed PNG row, as the mode converters take them
+        row = self.converter(row)
+
+        if self.swap:
+            row = swap_16_bit_row(row)
+
+        self.hash.update(row)
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
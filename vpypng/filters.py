@@ -0,0 +1,205 @@
+from sys import byteorder
+
+from .exceptions import PNGDecodeException
+
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+ALLOWED_BIT_DEPTHS = {
+    0: (1, 2, 4, 8, 16),
+    2: (8, 16),
+    3: (1, 2, 4, 8),
+    4: (8, 16),
+    6: (8, 16),
+}
+
+# (x start, y start, x step, y step) of each Adam7 pass
+ADAM7_PASSES = (
+    (0, 0, 8, 8),
+    (4, 0, 8, 8),
+    (0, 4, 4, 8),
+    (2, 0, 4, 4),
+    (0, 2, 2, 4),
+    (1, 0, 2, 2),
+    (0, 1, 1, 2),
+)
+
+FILTER_NONE, FILTER_SUB, FILTER_UP, FILTER_AVERAGE, FILTER_PAETH = range(5)
+
+# For every byte value, the samples it holds when the bit depth is below 8
+_UNPACK_TABLES = {
+    bit_depth: [
+        bytes(
+            (value >> shift) & ((1 << bit_depth) - 1)
+            for shift in range(8 - bit_depth, -1, -bit_depth)
+        )
+        for value in range(256)
+    ]
+    for bit_depth in (1, 2, 4)
+}
+
+
+def check_header(width: int, height: int, bit_depth: int, color_type: int):
+    if width == 0 or height == 0 or width > 2**31 - 1 or height > 2**31 - 1:
+        raise PNGDecodeException("Image dimensions must be between 1 and 2^31-1")
+
+    if bit_depth not in ALLOWED_BIT_DEPTHS.get(color_type, ()):
+        raise PNGDecodeException(
+            "Bit depth {} is not allowed for color type {}".format(
+                bit_depth, color_type
+            )
+        )
+
+
+def bits_per_pixel(color_type: int, bit_depth: int) -> int:
+    return CHANNELS[color_type] * bit_depth
+
+
+def row_byte_count(width: int, color_type: int, bit_depth: int) -> int:
+    return (width * bits_per_pixel(color_type, bit_depth) + 7) // 8
+
+
+# Distance in bytes to the corresponding byte of the pixel on the left
+def filter_unit(color_type: int, bit_depth: int) -> int:
+    return max(1, bits_per_pixel(color_type, bit_depth) // 8)
+
+
+def adam7_pass_sizes(width: int, height: int):
+    return [
+        (
+            (width - x_start + x_step - 1) // x_step,
+            (height - y_start + y_step - 1) // y_step,
+        )
+        for x_start, y_start, x_step, y_step in ADAM7_PASSES
+    ]
+
+
+def unfilter_row(filter_type: int, row: bytearray, previous, unit: int):
+    # Reconstructs row in place; previous is the reconstructed row above or None
+    length = len(row)
+
+    if filter_type == FILTER_NONE:
+        return
+
+    if filter_type == FILTER_SUB:
+        for i in range(unit, length):
+            row[i] = (row[i] + row[i - unit]) & 0xFF
+    elif filter_type == FILTER_UP:
+        if previous is not None:
+            row[:] = bytes([(a + b) & 0xFF for a, b in zip(row, previous)])
+    elif filter_type == FILTER_AVERAGE:
+        if previous is None:
+            for i in range(unit, length):
+                row[i] = (row[i] + (row[i - unit] >> 1)) & 0xFF
+        else:
+            for i in range(unit):
+                row[i] = (row[i] + (previous[i] >> 1)) & 0xFF
+            for i in range(unit, length):
+                row[i] = (row[i] + ((row[i - unit] + previous[i]) >> 1)) & 0xFF
+    elif filter_type == FILTER_PAETH:
+        if previous is None:
+            # With no row above, Paeth always predicts the left byte
+            for i in range(unit, length):
+                row[i] = (row[i] + row[i - unit]) & 0xFF
+        else:
+            for i in range(unit):
+                row[i] = (row[i] + previous[i]) & 0xFF
+            for i in range(unit, length):
+                a, b, c = row[i - unit], previous[i], previous[i - unit]
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                if pa <= pb and pa <= pc:
+                    predictor = a
+                elif pb <= pc:
+                    predictor = b
+                else:
+                    predictor = c
+                row[i] = (row[i] + predictor) & 0xFF
+    else:
+        raise PNGDecodeException("Unknown filter type {}".format(filter_type))
+
+
+def filter_row(filter_type: int, row, previous, unit: int) -> bytearray:
+    # Inverse of unfilter_row; previous is the unfiltered row above or None
+    length = len(row)
+    above = previous if previous is not None else bytes(length)
+    filtered = bytearray(row)
+
+    if filter_type == FILTER_NONE:
+        return filtered
+
+    if filter_type == FILTER_SUB:
+        for i in range(unit, length):
+            filtered[i] = (row[i] - row[i - unit]) & 0xFF
+    elif filter_type == FILTER_UP:
+        filtered[:] = bytes([(a - b) & 0xFF for a, b in zip(row, above)])
+    elif filter_type == FILTER_AVERAGE:
+        for i in range(unit):
+            filtered[i] = (row[i] - (above[i] >> 1)) & 0xFF
+        for i in range(unit, length):
+            filtered[i] = (row[i] - ((row[i - unit] + above[i]) >> 1)) & 0xFF
+    elif filter_type == FILTER_PAETH:
+        for i in range(unit):
+            filtered[i] = (row[i] - above[i]) & 0xFF
+        for i in range(unit, length):
+            a, b, c = row[i - unit], above[i], above[i - unit]
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                predictor = a
+            elif pb <= pc:
+                predictor = b
+            else:
+                predictor = c
+            filtered[i] = (row[i] - predictor) & 0xFF
+    else:
+        raise ValueError("Unknown filter type {}".format(filter_type))
+
+    return filtered
+
+
+def unpack_samples(row, bit_depth: int, sample_count: int) -> bytearray:
+    # One byte per sample for bit depths below 8, values are not scaled
+    table = _UNPACK_TABLES[bit_depth]
+    return bytearray(b"".join([table[value] for value in row])[:sample_count])
+
+
+def pack_samples(samples, bit_depth: int) -> bytearray:
+    per_byte = 8 // bit_depth
+    packed = bytearray((len(samples) + per_byte - 1) // per_byte)
+
+    for i, sample in enumerate(samples):
+        shift = 8 - bit_depth * (i % per_byte + 1)
+        packed[i // per_byte] |= sample << shift
+
+    return packed
+
+
+def swap_16_bit_row(row) -> bytearray:
+    # PNG stores 16 bit samples big endian
+    swapped = bytearray(len(row))
+    swapped[0::2] = row[1::2]
+    swapped[1::2] = row[0::2]
+    return swapped
+
+
+def native_row(row, bit_depth: int, sample_count: int):
+    # Converts a reconstructed PNG row to the layout of PNGPixelBuffer:
+    # one byte per sample below 8 bits and native endian 16 bit samples
+    if bit_depth < 8:
+        return unpack_samples(row, bit_depth, sample_count)
+
+    if bit_depth == 16 and byteorder == "little":
+        return swap_16_bit_row(row)
+
+    return row
+
+
+def png_row(row, bit_depth: int):
+    # Inverse of native_row, for rows about to be filtered and compressed
+    if bit_depth < 8:
+        return pack_samples(row, bit_depth)
+
+    if bit_depth == 16 and byteorder == "little":
+        return swap_16_bit_row(row)
+
+    return row
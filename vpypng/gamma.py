@@ -0,0 +1,177 @@
+from array import array
+from functools import lru_cache
+
+from .exceptions import PNGDecodeException
+from .filters import CHANNELS
+
+SRGB = "srgb"
+LINEAR = "linear"
+
+
+def source_transfer(image):
+    # sRGB takes precedence over gAMA, files with neither are left untouched
+    if image["srgb"] is not None:
+        return SRGB
+
+    if image["gama"]:
+        return image["gama"]
+
+    return None
+
+
+def _to_linear(value: float, source) -> float:
+    if source == SRGB:
+        if value <= 0.04045:
+            return value / 12.92
+        return ((value + 0.055) / 1.055) ** 2.4
+
+    if source == LINEAR:
+        return value
+
+    # gAMA stores the encoding exponent, e.g. 0.45455 for 1 / 2.2
+    return value ** (1 / source)
+
+
+def _from_linear(value: float, target) -> float:
+    if target == SRGB:
+        if value <= 0.0031308:
+            return value * 12.92
+        return 1.055 * value ** (1 / 2.4) - 0.055
+
+    if target == LINEAR:
+        return value
+
+    # A number is the display exponent, e.g. 2.2
+    return value ** (1 / target)
+
+
+def _check_target(target):
+    if target in (SRGB, LINEAR):
+        return
+
+    if isinstance(target, (int, float)) and target > 0:
+        return
+
+    raise ValueError(
+        "Gamma target must be 'srgb', 'linear' or a positive display exponent"
+    )
+
+
+@lru_cache(maxsize=32)
+def gamma_table(source, target, bit_depth: int):
+    # 256 entries up to 8 bits (as bytes, for bytes.translate), 65536 for 16 bits
+    _check_target(target)
+
+    max_value = (1 << bit_depth) - 1
+    entries = [
+        round(_from_linear(_to_linear(value / max_value, source), target) * max_value)
+        for value in range(max_value + 1)
+    ]
+
+    if bit_depth == 16:
+        return array("H", entries)
+
+    return bytes(entries + [0] * (256 - len(entries)))
+
+
+class GammaCorrection:
+    # Row stage that maps every color sample through gamma_table, leaving alpha as is
+    def __init__(self, table, channels: int, has_alpha: bool):
+        self.table = table
+        self.channels = channels
+        self.has_alpha = has_alpha
+
+    def __call__(self, row):
+        if isinstance(self.table, bytes):
+            corrected = bytearray(row.translate(self.table))
+
+            if self.has_alpha:
+                corrected[self.channels - 1 :: self.channels] = row[
+                    self.channels - 1 :: self.channels
+                ]
+
+            return corrected
+
+        samples = array("H", row)
+        table = self.table
+        corrected = array("H", [table[sample] for sample in samples])
+
+        if self.has_alpha:
+            corrected[self.channels - 1 :: self.channels] = samples[
+                self.channels - 1 :: self.channels
+            ]
+
+        return corrected
+
+
+def gamma_correct_palette(palette, source, target):
+    table = gamma_table(source, target, 8)
+    return tuple(tuple(table[sample] for sample in entry) for entry in palette)
+
+
+class PaletteGammaCorrection:
+    # Row stage for palette images: indices are expanded to the RGB (RGBA with tRNS)
+    # entries of the corrected palette. The corrected palette lives here, the image
+    # keeps the colors the file stores.
+    def __init__(self, palette, transparency):
+        self.palette = palette
+        transparency = list(transparency or [])
+
+        if transparency:
+            transparency += [255] * (len(palette) - len(transparency))
+            entries = [
+                bytes(color) + bytes([alpha])
+                for color, alpha in zip(palette, transparency)
+            ]
+        else:
+            entries = [bytes(color) for color in palette]
+
+        # Out of range indices map to black rather than failing halfway through
+        entries += [bytes(len(entries[0]))] * (256 - len(entries))
+
+        self.entries = entries
+        self.output_channels = len(entries[0])
+
+    def __call__(self, row):
+        entries = self.entries
+        return bytearray(b"".join([entries[index] for index in row]))
+
+
+def _is_identity(table, bit_depth: int) -> bool:
+    values = range(1 << bit_depth)
+
+    if bit_depth == 16:
+        return table == array("H", values)
+
+    return table[: len(values)] == bytes(values)
+
+
+def gamma_stage(image, target):
+    # Returns a row stage for the image, or None when no correction is needed. The
+    # source is a gAMA encoding exponent and the target a display exponent, so
+    # whether they cancel out is read from the table rather than compared directly.
+    _check_target(target)
+    source = source_transfer(image)
+
+    if source is None:
+        return None
+
+    color_type, bit_depth = image["color_type"], image["bit_depth"]
+
+    if color_type == 3:
+        if image["palette"] is None:
+            raise PNGDecodeException("PLTE chunk is missing")
+
+        if _is_identity(gamma_table(source, target, 8), 8):
+            return None
+
+        return PaletteGammaCorrection(
+            gamma_correct_palette(image["palette"], source, target), image["trns"]
+        )
+
+    table = gamma_table(source, target, bit_depth)
+
+    if _is_identity(table, bit_depth):
+        return None
+
+    return GammaCorrection(table, CHANNELS[color_type], color_type in [4, 6])
@@ -0,0 +1,54 @@
+import os
+from hashlib import sha256
+from pathlib import Path
+
+from .filters import CHANNELS
+from .lru import ByteBudgetLRU
+from .PNGCodec import PNGCodec
+
+DEFAULT_DECODED_IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _cache_key(file):
+    # Paths are keyed by their size and mtime, so a rewritten file is decoded again.
+    # Byte inputs are keyed by a hash of their content. Open files are not cached.
+    if isinstance(file, (str, Path)):
+        path = os.path.realpath(file)
+        stat = os.stat(path)
+        return ("path", path, stat.st_size, stat.st_mtime_ns)
+
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return ("sha256", sha256(file).digest())
+
+    return None
+
+
+def decoded_image_bytes(image) -> int:
+    # Size of the decoded pixels, computed from IHDR for images without pixel data
+    pixels = image["pixels"]
+
+    if pixels is not None:
+        return pixels.nbytes
+
+    if image["width"] is None:
+        return 0
+
+    itemsize = 2 if image["bit_depth"] == 16 else 1
+    return image["width"] * image["height"] * CHANNELS[image["color_type"]] * itemsize
+
+
+# Opt in LRU of decoded images in front of PNGCodec.decode, sized by the total bytes
+# of the cached pixel data. Cached images are shared between callers and must be
+# treated as read only.
+class DecodedImageCache(ByteBudgetLRU):
+    def __init__(self, max_bytes: int = DEFAULT_DECODED_IMAGE_CACHE_BYTES, decode=None):
+        super().__init__(max_bytes)
+        self._decode = decode or PNGCodec.decode
+
+    def decode(self, file):
+        key = _cache_key(file)
+
+        if key is None:
+            return self._decode(file)
+
+        return self.get_or_create(key, lambda: self._decode(file), decoded_image_bytes)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+# Thread safe LRU whose eviction is driven by the total size of the cached values,
+# not by the number of entries. Values are created outside the lock, so a slow
+# decode or inflate never blocks lookups of other keys; when two threads create the
+# same value, the first one stored wins and both callers get it.
+class ByteBudgetLRU:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get_or_create(self, key, create, size):
+        # create() makes the value on a miss and size(value) gives its cost in bytes.
+        # Values larger than the whole budget are returned without being cached.
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        value = create()
+        value_size = size(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+            if value_size <= self.max_bytes:
+                self._entries[key] = (value, value_size)
+                self.current_bytes += value_size
+                self._evict()
+
+        return value
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
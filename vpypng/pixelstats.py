@@ -0,0 +1,150 @@
+from array import array
+from collections import Counter
+
+from .exceptions import PNGDecodeException
+from .filters import CHANNELS
+
+# Names accepted by the decoder's statistics option
+STATISTICS = ("min", "max", "mean", "histogram", "transparent", "grayscale")
+
+# Statistics that are worked out from the per channel sample counts
+_COUNTED_STATISTICS = frozenset(["min", "max", "mean", "histogram", "transparent"])
+
+
+def check_statistics(requested) -> frozenset:
+    requested = frozenset(requested)
+    unknown = requested.difference(STATISTICS)
+
+    if unknown:
+        raise ValueError(
+            "Unknown statistics {}, expected some of {}".format(
+                ", ".join(sorted(unknown)), ", ".join(STATISTICS)
+            )
+        )
+
+    return requested
+
+
+def _count_key(row: bytes, key: bytes, pixel_bytes: int) -> int:
+    # Pixels of row equal to the tRNS color key
+    count, position = 0, row.find(key)
+
+    while position != -1:
+        if position % pixel_bytes == 0:
+            count += 1
+            position = row.find(key, position + pixel_bytes)
+        else:
+            position = row.find(key, position - position % pixel_bytes + pixel_bytes)
+
+    return count
+
+
+class PixelStatistics:
+    # Statistics of the samples stored in the file, gathered from each row as the
+    # decoder stores it (PNGPixelBuffer layout, before gamma, alpha or mode
+    # conversions), so the pixels are never walked a second time. Every statistic
+    # except grayscale comes from per channel sample counts. Palette images count
+    # indices and map them through the palette, and tRNS alpha, at the end, the same
+    # way hIST counts relate to the palette.
+    def __init__(
+        self, requested, color_type: int, bit_depth: int, palette=None, trns=None
+    ):
+        self.requested = check_statistics(requested)
+
+        if color_type == 3 and palette is None:
+            raise PNGDecodeException("Palette image without a PLTE chunk")
+
+        self.color_type = color_type
+        self.bit_depth = bit_depth
+        self.palette = palette
+        self.trns = trns
+        self.channels = CHANNELS[color_type]
+        self.itemsize = 2 if bit_depth == 16 else 1
+        self.pixel_count = 0
+        self.counting = not self.requested.isdisjoint(_COUNTED_STATISTICS) or (
+            color_type == 3 and "grayscale" in self.requested
+        )
+        self.counters = [Counter() for _ in range(self.channels)]
+        # Cleared by the first color row, palettes are checked at the end instead
+        self.is_grayscale = True
+        self.key = None
+        self.key_count = 0
+
+        if color_type == 2 and trns is not None and "transparent" in self.requested:
+            self.key = bytes(trns) if self.itemsize == 1 else array("H", trns).tobytes()
+
+    def add_row(self, row):
+        channels = self.channels
+        samples = row if self.itemsize == 1 else memoryview(row).cast("H")
+        self.pixel_count += len(samples) // channels
+
+        if self.counting:
+            for channel, counter in enumerate(self.counters):
+                counter.update(samples[channel::channels])
+
+        if self.color_type in [2, 6] and self.is_grayscale:
+            self.is_grayscale = (
+                samples[0::channels] == samples[1::channels] == samples[2::channels]
+            )
+
+        if self.key is not None:
+            self.key_count += _count_key(bytes(row), self.key, channels * self.itemsize)
+
+    def result(self) -> dict:
+        counters, max_value = self.counters, (1 << self.bit_depth) - 1
+
+        if self.color_type == 3:
+            counters, max_value = self._palette_counters(), 255
+
+        transparent = 0
+        if self.color_type in [4, 6] or (self.color_type == 3 and self.trns):
+            transparent = counters[-1][0]
+        elif self.color_type == 0 and self.trns is not None:
+            transparent = counters[0][self.trns[0]]
+        elif self.color_type == 2:
+            transparent = self.key_count
+
+        if self.color_type == 3:
+            self.is_grayscale = all(
+                self.palette[index][0]
+                == self.palette[index][1]
+                == self.palette[index][2]
+                for index in self.counters[0]
+                if index < len(self.palette)
+            )
+
+        values = {
+            "min": lambda: tuple(min(counter) for counter in counters),
+            "max": lambda: tuple(max(counter) for counter in counters),
+            "mean": lambda: tuple(
+                sum(value * count for value, count in counter.items())
+                / self.pixel_count
+                for counter in counters
+            ),
+            "histogram": lambda: [
+                [counter[value] for value in range(max_value + 1)]
+                for counter in counters
+            ],
+            "transparent": lambda: transparent / self.pixel_count,
+            "grayscale": lambda: self.is_grayscale,
+        }
+
+        return {name: values[name]() for name in STATISTICS if name in self.requested}
+
+    def _palette_counters(self):
+        # Index counts turned into counts of the R, G, B (and A with tRNS) samples;
+        # indices past the end of the palette count as transparent black
+        alphas = list(self.trns or [])
+        alphas += [255] * (len(self.palette) - len(alphas))
+        colors = [
+            tuple(color) + ((alpha,) if self.trns else ())
+            for color, alpha in zip(self.palette, alphas)
+        ]
+        counters = [Counter() for _ in colors[0]]
+
+        for index, count in self.counters[0].items():
+            color = colors[index] if index < len(colors) else (0,) * len(counters)
+            for counter, value in zip(counters, color):
+                counter[value] += count
+
+        return counters
@@ -0,0 +1,24 @@
+from .compression import inflate
+from .lru import ByteBudgetLRU
+
+DEFAULT_ICC_PROFILE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+# Process wide LRU of inflated iCCP profiles, keyed by a hash of the compressed bytes.
+# Every image that embeds the same profile gets the same (immutable) bytes object.
+class ICCProfileCache(ByteBudgetLRU):
+    def __init__(self, max_bytes: int = DEFAULT_ICC_PROFILE_CACHE_BYTES):
+        super().__init__(max_bytes)
+
+    def inflate(self, compressed_profile: bytes) -> bytes:
+        # hashlib is only imported once an image with an iCCP chunk is decoded
+        from hashlib import sha256
+
+        return self.get_or_create(
+            sha256(compressed_profile).digest(),
+            lambda: bytes(inflate(compressed_profile)),
+            len,
+        )
+
+
+ICC_PROFILE_CACHE = ICCProfileCache()
@@ -0,0 +1,145 @@
+from io import SEEK_CUR, SEEK_SET, BufferedIOBase, RawIOBase
+
+DEFAULT_READ_AHEAD_SIZE = 1 << 16
+
+
+class ReadAheadBuffer:
+    # Serves the decoder's many small reads (chunk length, type, data, CRC) from one
+    # reusable buffer that is filled with large reads. Reads that come back short, as
+    # they do on pipes, sockets and raw files, are retried until the requested size is
+    # there or the stream ends. Each fill takes only what the stream has ready, so the
+    # decoder never blocks waiting for data past the end of the image.
+    def __init__(self, file, buffer_size: int = DEFAULT_READ_AHEAD_SIZE):
+        self.file = file
+        self.buffer = bytearray(buffer_size)
+        self.start = 0
+        self.end = 0
+        # Raw streams return what is available from readinto, buffered ones need
+        # readinto1 for the same behaviour
+        self._readinto = getattr(file, "readinto1", None) or file.readinto
+
+    @staticmethod
+    def wrap(file):
+        # Buffered, seekable files (regular files, BytesIO) are already cheap to read
+        # from in small pieces
+        if isinstance(file, BufferedIOBase) and file.seekable():
+            return file
+
+        if not isinstance(file, (BufferedIOBase, RawIOBase)) and not hasattr(
+            file, "readinto"
+        ):
+            return file
+
+        return ReadAheadBuffer(file)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = bytes(self.buffer[self.start : self.end]) + self._read_rest()
+            self.start = self.end = 0
+            return data
+
+        if self.end - self.start < size:
+            if size > len(self.buffer):
+                return self._read_large(size)
+
+            self._fill(size)
+
+        size = min(size, self.end - self.start)
+        data = bytes(self.buffer[self.start : self.start + size])
+        self.start += size
+        return data
+
+    def _fill(self, size: int):
+        # Moves what is left to the front of the buffer, then reads until size bytes
+        # are buffered or the stream ends
+        buffer = self.buffer
+
+        if self.start:
+            remaining = self.end - self.start
+            buffer[:remaining] = buffer[self.start : self.end]
+            self.start, self.end = 0, remaining
+
+        view = memoryview(buffer)
+
+        while self.end < size:
+            count = self._readinto(view[self.end :])
+
+            if count is None:
+                raise BlockingIOError("Stream has no data available yet")
+
+            if count == 0:
+                break
+
+            self.end += count
+
+    def _read_large(self, size: int) -> bytes:
+        # Reads bigger than the buffer go straight into their own buffer
+        data = bytearray(size)
+        buffered = self.end - self.start
+        data[:buffered] = self.buffer[self.start : self.end]
+        self.start = self.end = 0
+
+        view, filled = memoryview(data), buffered
+
+        while filled < size:
+            count = self.file.readinto(view[filled:])
+
+            if count is None:
+                raise BlockingIOError("Stream has no data available yet")
+
+            if count == 0:
+                break
+
+            filled += count
+
+        del view
+        del data[filled:]
+        return bytes(data)
+
+    def _read_rest(self) -> bytes:
+        chunks = []
+
+        while True:
+            data = self.file.read(DEFAULT_READ_AHEAD_SIZE)
+
+            if not data:
+                return b"".join(chunks)
+
+            chunks.append(data)
+
+    def release(self) -> bytes:
+        # Hands the stream back at the position the decoder reached. Seekable streams
+        # are moved back over the bytes read ahead; for the others those bytes are
+        # returned, since they can't be put back.
+        unused = bytes(self.buffer[self.start : self.end])
+        self.start = self.end = 0
+
+        if unused and self.file.seekable():
+            self.file.seek(-len(unused), SEEK_CUR)
+            return b""
+
+        return unused
+
+    def seekable(self) -> bool:
+        return self.file.seekable()
+
+    def tell(self) -> int:
+        return self.file.tell() - (self.end - self.start)
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_CUR:
+            offset, whence = self.tell() + offset, SEEK_SET
+
+        # Seeks inside the buffered data don't touch the stream
+        if whence == SEEK_SET:
+            buffer_position = self.file.tell() - self.end
+
+            if buffer_position <= offset <= buffer_position + self.end:
+                self.start = offset - buffer_position
+                return offset
+
+        self.start = self.end = 0
+        return self.file.seek(offset, whence)
+
+    def fileno(self) -> int:
+        return self.file.fileno()
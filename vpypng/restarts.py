@@ -0,0 +1,234 @@
+import os
+from collections import deque
+from struct import iter_unpack, pack
+
+from .compression import get_backend
+from .exceptions import PNGDecodeException
+from .filters import (
+    FILTER_NONE,
+    FILTER_PAETH,
+    FILTER_SUB,
+    filter_row,
+    unfilter_row,
+)
+
+# Private, ancillary chunk that is not safe to copy: the offsets are only valid for the
+# exact image data they were written with
+RESTART_CHUNK_TYPE = b"vpRS"
+
+DEFAULT_RESTART_ROWS = 256
+
+# Filters whose first row in a block doesn't need the last row of the block before
+_BLOCK_START_FILTERS = (FILTER_NONE, FILTER_SUB)
+_ALL_FILTERS = tuple(range(FILTER_NONE, FILTER_PAETH + 1))
+
+
+def _filter_cost(filtered) -> int:
+    # Minimum sum of absolute differences, the usual heuristic for picking a filter
+    return sum(value if value < 128 else 256 - value for value in filtered)
+
+
+def _best_filtered_row(row, previous, unit: int, filter_types):
+    candidates = [
+        (filter_type, filter_row(filter_type, row, previous, unit))
+        for filter_type in filter_types
+    ]
+    filter_type, filtered = min(
+        candidates, key=lambda candidate: _filter_cost(candidate[1])
+    )
+    return bytes([filter_type]) + filtered
+
+
+def encode_image_data(
+    rows, unit: int, restart_rows: int = DEFAULT_RESTART_ROWS, level: int = 6
+):
+    # Filters and compresses non interlaced rows (PNG layout, without filter bytes)
+    # into one zlib stream, with a full flush before every block of restart_rows rows.
+    # Returns the stream and the restart points as (offset in stream, row) pairs.
+    backend = get_backend()
+    compressor = backend.compressobj(level)
+    stream = bytearray()
+    restart_points = []
+    previous = None
+
+    for y, row in enumerate(rows):
+        block_start = y % restart_rows == 0
+
+        if block_start and y > 0:
+            stream += compressor.flush(backend.Z_FULL_FLUSH)
+            restart_points.append((len(stream), y))
+
+        stream += compressor.compress(
+            _best_filtered_row(
+                row,
+                None if block_start else previous,
+                unit,
+                _BLOCK_START_FILTERS if block_start else _ALL_FILTERS,
+            )
+        )
+        previous = row
+
+    stream += compressor.flush()
+    return bytes(stream), restart_points
+
+
+def restart_chunk_data(restart_points) -> bytes:
+    return b"".join(pack(">II", offset, row) for offset, row in restart_points)
+
+
+def parse_restart_points(data: bytes):
+    if len(data) % 8 != 0:
+        return None
+
+    return list(iter_unpack(">II", data))
+
+
+def _valid_restart_points(restart_points, height: int) -> bool:
+    # Offsets and rows must both strictly increase inside the stream and the image,
+    # the offsets past the zlib header
+    previous_offset, previous_row = 2, 0
+
+    for offset, row in restart_points:
+        if not (previous_offset < offset and previous_row < row < height):
+            return False
+        previous_offset, previous_row = offset, row
+
+    return True
+
+
+def _inflate_block(segment, row_count: int, row_bytes: int, last: bool):
+    decompressor = get_backend().decompressobj(-15)
+
+    try:
+        data = decompressor.decompress(segment)
+    except Exception as e:
+        raise PNGDecodeException("Could not inflate image data") from e
+
+    if len(data) != row_count * (row_bytes + 1):
+        raise PNGDecodeException("Image data does not match its restart points")
+
+    if last and not decompressor.eof:
+        raise PNGDecodeException("Image data is incomplete")
+
+    return data
+
+
+class BlockInflater:
+    # Inflates the zlib stream of a non interlaced image in the blocks between its
+    # restart points. A block goes to a thread pool as soon as its compressed bytes
+    # have arrived, and zlib releases the GIL while inflating, so blocks inflate on
+    # several cores while the rest of the file is still being read. Unfiltering is
+    # Python code that would only contend for the GIL on the pool, so the inflated
+    # blocks are unfiltered in order by the thread reading the rows. At most two
+    # blocks per worker are in flight.
+    # Like PNGRowDecoder, decode() and flush() yield (y, row) pairs of reconstructed
+    # rows. They raise PNGDecodeException once the restart points turn out not to
+    # match the stream, possibly after some rows were yielded.
+    def __init__(
+        self, restart_points, height: int, row_bytes: int, unit: int, workers=None
+    ):
+        if not _valid_restart_points(restart_points, height):
+            raise PNGDecodeException("Restart points don't fit the image")
+
+        # (offset, row) where each block starts, then where the last one ends
+        self.bounds = [(2, 0)] + list(restart_points) + [(None, height)]
+        self.row_bytes = row_bytes
+        self.unit = unit
+        self.workers = min(len(self.bounds) - 1, workers or os.cpu_count() or 1)
+        self.executor = None
+        self.in_flight = deque()
+        self.next_block = 0
+        # Compressed bytes not handed to the pool yet, from stream offset pending_start
+        self.pending = bytearray()
+        self.pending_start = 0
+        self.checksum = 1
+        self.previous = None
+        self.y = 0
+
+    def decode(self, data):
+        self.pending += data
+        received = self.pending_start + len(self.pending)
+        consumed = 0
+
+        while self.next_block < len(self.bounds) - 2:
+            (start, row), (end, end_row) = self.bounds[
+                self.next_block : self.next_block + 2
+            ]
+
+            if end > received:
+                break
+
+            yield from self._collect(2 * self.workers - 1)
+            self._submit(
+                self.pending[start - self.pending_start : end - self.pending_start],
+                end_row - row,
+                False,
+            )
+            consumed = end - self.pending_start
+
+        del self.pending[:consumed]
+        self.pending_start += consumed
+
+        yield from self._collect(2 * self.workers)
+
+    def flush(self):
+        # Everything left is the last block and the adler32 trailer of the stream
+        if self.next_block != len(self.bounds) - 2:
+            raise PNGDecodeException("Image data does not match its restart points")
+
+        (start, row), (_, end_row) = self.bounds[-2:]
+        received = self.pending_start + len(self.pending)
+        if received <= start or received < 6:
+            raise PNGDecodeException("Image data is incomplete")
+
+        trailer = bytes(self.pending[-4:])
+        yield from self._collect(2 * self.workers - 1)
+        self._submit(self.pending[start - self.pending_start :], end_row - row, True)
+        self.pending = bytearray()
+        yield from self._collect(0)
+        self.close()
+
+        if trailer != self.checksum.to_bytes(4, "big"):
+            raise PNGDecodeException("Image data checksum does not match")
+
+    def close(self):
+        for future in self.in_flight:
+            future.cancel()
+        self.in_flight.clear()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def _submit(self, segment, row_count: int, last: bool):
+        if self.next_block == 0:
+            # The zlib header before the first block: deflate, no preset dictionary
+            if self.pending[0] & 0x0F != 8 or self.pending[1] & 0x20:
+                raise PNGDecodeException("Unknown compression method")
+
+        if self.executor is None:
+            # Slow to import, and only needed for files with restart points
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        self.in_flight.append(
+            self.executor.submit(
+                _inflate_block, segment, row_count, self.row_bytes, last
+            )
+        )
+        self.next_block += 1
+
+    def _collect(self, limit: int):
+        # Unfilters the oldest blocks until no more than limit are in flight
+        while len(self.in_flight) > limit:
+            data = self.in_flight.popleft().result()
+            self.checksum = get_backend().adler32(data, self.checksum)
+            row_bytes = self.row_bytes
+
+            for offset in range(0, len(data), row_bytes + 1):
+                row = bytearray(data[offset + 1 : offset + row_bytes + 1])
+                unfilter_row(data[offset], row, self.previous, self.unit)
+                yield self.y, row
+                self.previous = row
+                self.y += 1